@@ -0,0 +1,5 @@
+import sys
+
+from jmp_connection.cli import main
+
+sys.exit(main())
@@ -0,0 +1,386 @@
+import asyncio
+import collections
+import logging
+import time
+import traceback
+
+from jmp_connection.frame_decoder import FrameDecoder, encode_frame
+from jmp_connection.jmp_messages import JmpMessage, LoginMessage, create_message
+from jmp_connection.json_codec import JsonCodec, get_codec
+from jmp_connection.jnior_event import JniorEvent
+from jmp_connection.tls import get_default_tls_config
+
+"""
+An asyncio implementation of a JMP connection.  There is no reader thread.  Each connection is a task on the event
+loop so a single loop can drive thousands of JNIORs.
+"""
+
+
+class AsyncJMPConnection(object):
+
+    def __init__(self, receive_queue_size=1024, codec=None):
+        """
+        A JMP connection that is driven by asyncio streams.  The events and messages are the same as the threaded
+        JMPConnection.  Handlers added to the events are called on the event loop and must not block.
+
+        :param receive_queue_size: the most messages that receive() will hold.  the oldest are dropped when it is
+        full
+        :param codec: the JsonCodec, or the name of one, used to encode and decode messages
+        """
+        self.host = None
+        self.port = 9220  # default
+
+        self.reader = None
+        self.writer = None
+        self.reader_task = None
+        self.frame_decoder = FrameDecoder()
+        self.codec = codec if isinstance(codec, JsonCodec) else get_codec(codec)
+
+        self.username = None
+        self.password = None
+        self.attempted_credentials = False
+        self.authenticated = False
+        self.authentication_event = asyncio.Event()
+
+        # outstanding requests keyed by Meta Hash
+        self.pending_requests = {}
+
+        # messages waiting for receive() and the typed receivers waiting for a specific message
+        self.receive_queue = collections.deque(maxlen=receive_queue_size)
+        self.receive_event = asyncio.Event()
+        self.typed_receivers = {}
+        self.dropped_messages = 0
+
+        # Jnior Events
+        self.on_connection = JniorEvent()
+        self.on_auth = JniorEvent()
+        self.on_message_recv = JniorEvent()
+        self.message_type_handlers = {}
+
+    """
+    Connection Methods
+    """
+    async def connect(self, host=None, port=None, tls=False, ssl_context=None):
+        """
+        connects to a JMP server and starts the login handshake.  await wait_for_authentication() to know when the
+        connection is ready to use.
+
+        :param host: optional to specify a new client host
+        :param port: optional to specify a port other than the default 9220
+        :param tls: whether to upgrade the connection with STARTTLS before logging in
+        :param ssl_context: the context to use for the upgrade
+        :return: whether the connection was made
+        """
+        if host is not None:
+            self.host = host
+            if port is not None:
+                self.port = port
+
+        try:
+            if self.host is None:
+                raise Exception("host is not defined")
+
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+            if tls:
+                await self.start_tls(ssl_context)
+
+            self.on_connection(self, connected=True, socket=self.writer.get_extra_info('socket'))
+
+            self.reader_task = asyncio.get_running_loop().create_task(self._message_receive_loop())
+
+            # send an empty message so that we get an error - unauthenticated response with a
+            # Nonce to use in our login message
+            await self.send(JmpMessage())
+
+            return True
+        except Exception as err:
+            logging.error(f"unable to connect to {self.host}:{self.port} because {err}\n{traceback.format_exc()}")
+            await self._close_writer()
+            return False
+
+    async def start_tls(self, ssl_context=None, tls_config=None):
+        """
+        upgrades the connection to a secure connection.  must be called before the reader is started
+
+        :param ssl_context: the context to use.  the context of the TLSConfig is used if one is not given
+        :param tls_config: the TLSConfig that supplies the context and the acknowledgement timeout.  defaults to
+        the one shared by every connection
+        """
+        if tls_config is None:
+            tls_config = get_default_tls_config()
+
+        # tell the JNIOR that we wish to upgrade to TLS.  the handshake starts as soon as it acknowledges
+        self.writer.write(b'[STARTTLS]')
+        await self.writer.drain()
+        try:
+            ack = await asyncio.wait_for(self.reader.read(4096), tls_config.ack_timeout)
+            if not ack:
+                raise Exception("connection closed while waiting for the STARTTLS acknowledgement")
+        except asyncio.TimeoutError:
+            pass
+
+        if ssl_context is None:
+            ssl_context = tls_config.get_context()
+        start_time = time.perf_counter()
+        await self.writer.start_tls(ssl_context)
+        logging.info(f"{self.get_host_info()}: TLS handshake took {time.perf_counter() - start_time:.4f} s")
+
+    def get_host_info(self):
+        """
+        :return: a string with information about the connection that is being used
+        """
+        return f"('{self.host}', {self.port})"
+
+    def is_connected(self):
+        """
+        :return: whether the connection is connected
+        """
+        return self.writer is not None
+
+    async def close(self):
+        """
+        closes the connection and fails any requests that are still waiting for a reply
+        """
+        if self.reader_task is not None and self.reader_task is not asyncio.current_task():
+            self.reader_task.cancel()
+        self.reader_task = None
+
+        if self.writer is not None:
+            await self._close_writer()
+            self.authenticated = False
+            self.authentication_event.clear()
+
+            # alert listener handlers that the connection has been closed
+            self.on_connection(self, connected=False, socket=None)
+
+        for future in self.pending_requests.values():
+            if not future.done():
+                future.set_exception(Exception(f"connection to {self.host}:{self.port} closed"))
+        self.pending_requests.clear()
+
+    async def _close_writer(self):
+        writer = self.writer
+        self.writer = None
+        self.reader = None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    """
+    Authentication Methods
+    """
+    def is_authenticated(self):
+        """
+        :return: whether the connection is authenticated
+        """
+        return self.authenticated
+
+    def set_credentials(self, username, password):
+        self.username = username
+        self.password = password
+        self.attempted_credentials = False
+
+    async def wait_for_authentication(self, timeout=None):
+        """
+        waits for the login to be processed
+
+        :param timeout: seconds to wait.  None waits forever
+        :return: whether the connection is authenticated
+        """
+        try:
+            await asyncio.wait_for(self.authentication_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.authenticated
+
+    """
+    Event Handlers
+    """
+    def add_connection_handler(self, connection_event_handler):
+        self.on_connection += connection_event_handler
+
+    def remove_connection_handler(self, connection_event_handler):
+        self.on_connection -= connection_event_handler
+
+    def add_auth_handler(self, auth_event_handler):
+        self.on_auth += auth_event_handler
+
+    def remove_auth_handler(self, auth_event_handler):
+        self.on_auth -= auth_event_handler
+
+    def add_message_recv_handler(self, message_event_handler, message_type=None):
+        if message_type is None:
+            self.on_message_recv += message_event_handler
+            return
+
+        message_name = message_type if isinstance(message_type, str) else message_type.message_name
+        event = self.message_type_handlers.get(message_name)
+        if event is None:
+            event = self.message_type_handlers[message_name] = JniorEvent()
+        event += message_event_handler
+
+    def remove_message_recv_handler(self, message_event_handler, message_type=None):
+        if message_type is None:
+            self.on_message_recv -= message_event_handler
+            return
+
+        message_name = message_type if isinstance(message_type, str) else message_type.message_name
+        event = self.message_type_handlers.get(message_name)
+        if event is not None:
+            event -= message_event_handler
+            if 0 == len(event):
+                del self.message_type_handlers[message_name]
+
+    """
+    Sending and Receiving
+    """
+    async def send(self, jmp_message):
+        """
+        Used to send the JNIOR message object.  Waits for the transport to drain when its buffer is full.
+
+        :param jmp_message:
+        """
+        if self.writer is None:
+            raise Exception("connection is not open")
+
+        self.writer.write(encode_frame(self.codec.dumps(jmp_message.to_json())))
+        await self.writer.drain()
+
+    async def request(self, jmp_message, timeout=30.0):
+        """
+        sends the JNIOR message object and waits for the reply with the same Meta Hash
+
+        :param jmp_message: the message to send
+        :param timeout: seconds to wait for the reply.  None waits until the connection closes
+        :return: the reply message
+        """
+        meta_hash = jmp_message.meta_hash
+        if meta_hash is None:
+            raise Exception(f"{jmp_message} does not have a Meta Hash")
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending_requests[meta_hash] = future
+        try:
+            await self.send(jmp_message)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending_requests.pop(meta_hash, None)
+
+    async def receive(self, message_type=None, timeout=None):
+        """
+        waits for the next received message.  Replies to request() are not returned here.
+
+        :param message_type: only return the next message with this Message name, like "Monitor".  messages of
+        that type are handed to typed receivers instead of the general queue
+        :param timeout: seconds to wait.  None waits forever
+        :return: the message
+        """
+        if message_type is not None:
+            future = asyncio.get_running_loop().create_future()
+            self.typed_receivers.setdefault(message_type, []).append(future)
+            try:
+                return await asyncio.wait_for(future, timeout)
+            finally:
+                waiters = self.typed_receivers.get(message_type)
+                if waiters is not None and future in waiters:
+                    waiters.remove(future)
+
+        return await asyncio.wait_for(self._receive_next(), timeout)
+
+    async def _receive_next(self):
+        while not self.receive_queue:
+            self.receive_event.clear()
+            await self.receive_event.wait()
+        return self.receive_queue.popleft()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.is_connected() and not self.receive_queue:
+            raise StopAsyncIteration
+        return await self.receive()
+
+    async def _message_receive_loop(self):
+        """
+        private task used to read the incoming messages
+        """
+        try:
+            while True:
+                data = await self.reader.read(1024 * 64)
+                if not data:
+                    raise Exception("connection closed by the remote host")
+
+                for payload in self.frame_decoder.feed(data):
+                    await self._message_received(payload)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            if self.writer is not None:
+                logging.error(f"error while reading from {self.host}:{self.port} because {err}\n"
+                              f"{traceback.format_exc()}")
+                await self.close()
+
+    async def _message_received(self, payload):
+        """
+        Called when a message was received.
+        """
+        json_obj = self.codec.loads(payload)
+
+        jmp_message = create_message(json_obj)
+
+        future = self.pending_requests.pop(jmp_message.meta_hash, None) if jmp_message.meta else None
+        if future is not None and not future.done():
+            future.set_result(jmp_message)
+
+        if "Error" == jmp_message.message:
+            if "Unauthorized" in json_obj['Text']:
+
+                if not self.attempted_credentials:
+                    self.attempted_credentials = True
+                    await self.send(LoginMessage(self.username, self.password, json_obj['Nonce']))
+
+                else:
+                    self.on_auth(self, authorized=False, nonce=json_obj['Nonce'])
+
+        elif "Authenticated" == jmp_message.message:
+            self._authenticated()
+
+        else:
+            self._authenticated()
+
+            # alert the on_message handlers and then the handlers for this type of message
+            self.on_message_recv(self, jmp_message=jmp_message)
+            message_type_event = self.message_type_handlers.get(jmp_message.message)
+            if message_type_event is not None:
+                message_type_event(self, jmp_message=jmp_message)
+
+            if future is None:
+                self._deliver(jmp_message)
+
+    def _authenticated(self):
+        self.authentication_event.set()
+        if not self.authenticated:
+            self.authenticated = True
+            # alert the on_auth handlers and let them know that the connection has
+            # successfully been authenticated
+            self.on_auth(self, authorized=True)
+
+    def _deliver(self, jmp_message):
+        # a typed receiver takes priority over the general queue
+        waiters = self.typed_receivers.get(jmp_message.message)
+        while waiters:
+            future = waiters.pop(0)
+            if not future.done():
+                future.set_result(jmp_message)
+                return
+
+        if len(self.receive_queue) == self.receive_queue.maxlen:
+            self.dropped_messages += 1
+        self.receive_queue.append(jmp_message)
+        self.receive_event.set()
@@ -0,0 +1,287 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+from jmp_connection.frame_decoder import FrameDecoder, encode_frame
+from jmp_connection.jmp_connection import JMPConnection
+from jmp_connection.jmp_fleet import JMPFleet
+from jmp_connection.jmp_messages import JmpMessage, RegistryReadMessage
+from jmp_connection.jnior_simulator import JniorSimulator
+
+"""
+Benchmarks for jmp_connection that run against a JniorSimulator on the loopback interface.  The results are written
+as json so that runs can be compared to catch regressions.
+
+    python -m jmp_connection.benchmark --output results.json
+    python -m jmp_connection.benchmark --output new.json --compare results.json
+"""
+
+USERNAME = "jnior"
+PASSWORD = "jnior"
+
+# for each result, whether a bigger value is better.  used by --compare
+HIGHER_IS_BETTER = {
+    "frames_per_second": True,
+    "megabytes_per_second": True,
+    "requests_per_second": True,
+    "bytes_per_second": True,
+    "messages_per_second": True,
+    "p50": False,
+    "p99": False,
+    "max": False,
+    "seconds_to_authenticate": False,
+}
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def _wait_until(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise Exception("timed out waiting for the simulator")
+        time.sleep(0.001)
+
+
+def _connect(simulator, **connection_options):
+    connection = JMPConnection(**connection_options)
+    connection.set_credentials(USERNAME, PASSWORD)
+    connection.connect(*simulator.get_address())
+    if not connection.wait_for_authentication(10):
+        raise Exception("unable to log in to the simulator")
+    return connection
+
+
+def bench_decode(frames=100000):
+    """
+    measures how fast the FrameDecoder splits a buffer of Monitor messages
+    """
+    simulator = JniorSimulator()
+    frame = encode_frame(json.dumps(simulator.monitor_json()))
+    data = frame * frames
+
+    decoder = FrameDecoder()
+    start = time.perf_counter()
+    decoded, _ = decoder.decode(data)
+    elapsed = time.perf_counter() - start
+    assert len(decoded) == frames
+
+    # feeding in socket sized pieces includes the cost of carrying partial frames
+    decoder = FrameDecoder()
+    start = time.perf_counter()
+    count = 0
+    for offset in range(0, len(data), 1024 * 32):
+        count += len(decoder.feed(data[offset:offset + 1024 * 32]))
+    feed_elapsed = time.perf_counter() - start
+    assert count == frames
+
+    return {
+        "frames": frames,
+        "frame_size": len(frame),
+        "frames_per_second": frames / elapsed,
+        "megabytes_per_second": len(data) / elapsed / 1e6,
+        "feed": {
+            "frames_per_second": frames / feed_elapsed,
+            "megabytes_per_second": len(data) / feed_elapsed / 1e6,
+        },
+    }
+
+
+def bench_request_latency(simulator, requests=2000):
+    """
+    measures the round trip of one request at a time and of many pipelined requests
+    """
+    connection = _connect(simulator)
+    try:
+        # warm up
+        for _ in range(50):
+            connection.request(JmpMessage(), timeout=10).result()
+
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(requests):
+            sent = time.perf_counter()
+            connection.request(JmpMessage(), timeout=10).result()
+            latencies.append(time.perf_counter() - sent)
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+
+        start = time.perf_counter()
+        futures = [connection.request(RegistryReadMessage(["$serialnumber"]), timeout=30)
+                   for _ in range(requests)]
+        for future in futures:
+            future.result()
+        pipelined_elapsed = time.perf_counter() - start
+
+        return {
+            "requests": requests,
+            "sequential": {
+                "requests_per_second": requests / elapsed,
+                "p50": _percentile(latencies, 0.5),
+                "p99": _percentile(latencies, 0.99),
+                "max": latencies[-1],
+            },
+            "pipelined": {
+                "requests_per_second": requests / pipelined_elapsed,
+            },
+        }
+    finally:
+        connection.close()
+
+
+def bench_download(simulator, size=1024 * 1024 * 4):
+    """
+    measures the throughput of a windowed file download
+    """
+    simulator.files["/temp/benchmark.bin"] = os.urandom(size)
+    connection = _connect(simulator)
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            dest = os.path.join(folder, "benchmark.bin")
+            start = time.perf_counter()
+            stats = connection.download("/temp/benchmark.bin", dest)
+            elapsed = time.perf_counter() - start
+            assert os.path.getsize(dest) == size
+
+        return {
+            "size": size,
+            "bytes_per_second": size / elapsed,
+            "requests": stats["requests"],
+            "chunk_size": stats["chunk_size"],
+        }
+    finally:
+        connection.close()
+        del simulator.files["/temp/benchmark.bin"]
+
+
+def bench_scaling(simulator, counts=(1, 10, 100), monitor_pushes=20):
+    """
+    measures the time for N fleet connections to authenticate and the rate that Monitor pushes are delivered to
+    all of them
+    """
+    results = {}
+    for count in counts:
+        received = [0]
+        lock = threading.Lock()
+
+        def message_handler(connection, jmp_message):
+            with lock:
+                received[0] += 1
+
+        fleet = JMPFleet()
+        try:
+            start = time.perf_counter()
+            connections = [fleet.add(simulator.host, simulator.port, USERNAME, PASSWORD, message_handler)
+                           for _ in range(count)]
+            _wait_until(lambda: all(c.is_authenticated() for c in connections), 60)
+            auth_elapsed = time.perf_counter() - start
+
+            # the Monitor sent after the login may still be arriving
+            _wait_until(lambda: received[0] >= count, 10)
+            with lock:
+                received[0] = 0
+
+            start = time.perf_counter()
+            for i in range(monitor_pushes):
+                simulator.set_input(1, (i + 1) % 2)
+            expected = count * monitor_pushes
+            _wait_until(lambda: received[0] >= expected, 60)
+            push_elapsed = time.perf_counter() - start
+
+            results[str(count)] = {
+                "seconds_to_authenticate": auth_elapsed,
+                "messages_per_second": expected / push_elapsed,
+            }
+        finally:
+            fleet.close()
+    return results
+
+
+def run(scaling_counts=(1, 10, 100), requests=2000, download_size=1024 * 1024 * 4, decode_frames=100000):
+    """
+    runs every benchmark
+
+    :return: a dict of the results
+    """
+    simulator = JniorSimulator(username=USERNAME, password=PASSWORD)
+    simulator.start()
+    try:
+        return {
+            "timestamp": time.time(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "decode": bench_decode(decode_frames),
+            "request_latency": bench_request_latency(simulator, requests),
+            "download": bench_download(simulator, download_size),
+            "scaling": bench_scaling(simulator, scaling_counts),
+        }
+    finally:
+        simulator.stop()
+
+
+def compare(baseline, results, threshold=0.1, path=""):
+    """
+    compares two result dicts
+
+    :param baseline: the earlier results
+    :param results: the new results
+    :param threshold: the fraction a result may get worse before it is reported
+    :return: a list of (name, baseline value, new value) for the results that regressed
+    """
+    regressions = []
+    for key, value in results.items():
+        name = f"{path}.{key}" if path else key
+        old = baseline.get(key)
+        if isinstance(value, dict) and isinstance(old, dict):
+            regressions.extend(compare(old, value, threshold, name))
+        elif key in HIGHER_IS_BETTER and isinstance(old, (int, float)) and 0 < old:
+            change = (value - old) / old
+            if (HIGHER_IS_BETTER[key] and change < -threshold) or (not HIGHER_IS_BETTER[key] and change > threshold):
+                regressions.append((name, old, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="benchmarks jmp_connection against a simulated JNIOR")
+    parser.add_argument("--output", help="the json file to write the results to")
+    parser.add_argument("--compare", help="a json file of earlier results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="the fraction a result may get worse before --compare fails")
+    parser.add_argument("--connections", default="1,10,100", help="the connection counts for the scaling benchmark")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--download-size", type=int, default=1024 * 1024 * 4)
+    parser.add_argument("--decode-frames", type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    results = run(tuple(int(count) for count in args.connections.split(",")), args.requests, args.download_size,
+                  args.decode_frames)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        for name, old, new in regressions:
+            print(f"regression in {name}: {old:.6g} -> {new:.6g}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
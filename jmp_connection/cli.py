@@ -0,0 +1,264 @@
+import argparse
+import json
+import sys
+
+"""
+The command line tool, run with python -m jmp_connection.  A command is run against every device in an inventory at
+once, with a limit on how many devices are worked on at the same time, and one json result is written per device.
+
+    python -m jmp_connection --inventory devices.txt control close 1 --duration 1000
+    python -m jmp_connection --hosts 10.0.0.78,10.0.0.79 registry read "$Serial Number"
+
+Only argparse and json are imported until the arguments have been parsed so that --help and a bad command line
+return right away.  The connection modules are imported when a command runs.
+"""
+
+DEFAULT_PORT = 9220
+
+
+class Target(object):
+    __slots__ = ("name", "host", "port", "username", "password")
+
+    def __init__(self, host, port=DEFAULT_PORT, username=None, password=None, name=None):
+        """
+        a device to run a command against
+
+        :param name: the name in the results.  defaults to host:port
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.name = name if name is not None else f"{host}:{port}"
+
+
+def _split_address(address, default_port):
+    host, _, port = address.rpartition(":") if ":" in address else (address, None, None)
+    return host, int(port) if port else default_port
+
+
+def load_inventory(path, default_port=DEFAULT_PORT, username=None, password=None):
+    """
+    reads the devices to work on.  a .json file holds a list of "host:port" strings or objects with host, port,
+    username, password and name.  any other file has a device per line as host[:port] [username password].  blank
+    lines and lines starting with # are skipped
+
+    :param username: the username for devices that do not give one
+    :param password: the password for devices that do not give one
+    :return: a list of Targets
+    """
+    with open(path) as f:
+        text = f.read()
+
+    targets = []
+    if path.endswith(".json"):
+        for entry in json.loads(text):
+            if isinstance(entry, str):
+                entry = {"host": entry}
+            host, port = _split_address(entry["host"], entry.get("port", default_port))
+            targets.append(Target(host, port, entry.get("username", username), entry.get("password", password),
+                                  entry.get("name")))
+        return targets
+
+    for line in text.splitlines():
+        fields = line.split()
+        if not fields or fields[0].startswith("#"):
+            continue
+        host, port = _split_address(fields[0], default_port)
+        targets.append(Target(host, port, fields[1] if 1 < len(fields) else username,
+                              fields[2] if 2 < len(fields) else password))
+    return targets
+
+
+def _reply_json(reply):
+    return {name: value for name, value in reply.json.items() if "Meta" != name}
+
+
+def _request(connection, jmp_message, args):
+    reply = connection.request(jmp_message, args.timeout).result()
+    if "Error" == reply.message:
+        raise Exception(reply.json.get("Text", "the device returned an error"))
+    return reply
+
+
+def _control(connection, target, args):
+    from jmp_connection.jmp_messages import CloseMessage, OpenMessage, ToggleMessage
+    from jmp_connection.output_control import ACKNOWLEDGED, control_outputs
+
+    if "toggle" == args.action:
+        commands = [ToggleMessage(channel) for channel in args.channels]
+    else:
+        message_class = CloseMessage if "close" == args.action else OpenMessage
+        commands = [message_class(channel, args.duration) for channel in args.channels]
+
+    result = control_outputs([connection], commands, args.timeout, args.io_states)[connection]
+    if ACKNOWLEDGED != result.status:
+        raise Exception(f"{result.status}: {result.error}")
+    return {"status": result.status, "replies": [_reply_json(reply) for reply in result.replies]}
+
+
+def _post(connection, target, args):
+    from jmp_connection.jmp_messages import PostMessage
+    return _reply_json(_request(connection, PostMessage(args.number, json.loads(args.content)), args))
+
+
+def _file_list(connection, target, args):
+    from jmp_connection.jmp_messages import FileListMessage
+    return _reply_json(_request(connection, FileListMessage(args.folder), args))
+
+
+def _file_get(connection, target, args):
+    import os
+
+    # each device gets its own folder so that the same file from many devices does not collide
+    folder = os.path.join(args.dest, target.name.replace(":", "_"))
+    os.makedirs(folder, exist_ok=True)
+    dest = os.path.join(folder, os.path.basename(args.path.rstrip("/")))
+    stats = connection.download(args.path, dest, timeout=args.timeout)
+    return dict(stats, dest=dest)
+
+
+def _registry_read(connection, target, args):
+    from jmp_connection.jmp_messages import RegistryReadMessage
+    return _request(connection, RegistryReadMessage(args.keys), args).json.get("Keys")
+
+
+def _create_parser():
+    parser = argparse.ArgumentParser(prog="python -m jmp_connection",
+                                     description="runs a JMP command against many JNIORs at once")
+    devices = parser.add_mutually_exclusive_group(required=True)
+    devices.add_argument("--inventory", help="a file of devices.  see load_inventory()")
+    devices.add_argument("--hosts", help="a comma separated list of host[:port]")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="the port for devices that do not give one")
+    parser.add_argument("--username", default="jnior", help="the username for devices that do not give one")
+    parser.add_argument("--password", default="jnior", help="the password for devices that do not give one")
+    parser.add_argument("--concurrency", type=int, default=16, help="the most devices worked on at the same time")
+    parser.add_argument("--timeout", type=float, default=10.0,
+                        help="seconds to wait for a device to log in and for each reply")
+    parser.add_argument("--tls", action="store_true", help="upgrade each connection with STARTTLS")
+    parser.add_argument("--format", choices=("jsonl", "json", "text"), default="jsonl",
+                        help="jsonl writes each result as it finishes.  json writes one list at the end")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="log connection activity.  -vv for "
+                                                                           "every message")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    control = commands.add_parser("control", help="close, open or toggle outputs")
+    control.add_argument("action", choices=("close", "open", "toggle"))
+    control.add_argument("channels", type=int, nargs="+")
+    control.add_argument("--duration", type=int, help="milliseconds to pulse the outputs for")
+    control.set_defaults(handler=_control)
+
+    post = commands.add_parser("post", help="post a message to the applications on the device")
+    post.add_argument("number", type=int, help="the message number")
+    post.add_argument("content", help="the message content as json")
+    post.set_defaults(handler=_post)
+
+    file_parser = commands.add_parser("file", help="list or download files")
+    file_commands = file_parser.add_subparsers(dest="file_command", required=True)
+    file_list = file_commands.add_parser("list", help="list a folder")
+    file_list.add_argument("folder", nargs="?", default="/")
+    file_list.set_defaults(handler=_file_list)
+    file_get = file_commands.add_parser("get", help="download a file from every device")
+    file_get.add_argument("path")
+    file_get.add_argument("--dest", default=".", help="the folder to download into.  each device gets a subfolder")
+    file_get.set_defaults(handler=_file_get)
+
+    registry = commands.add_parser("registry", help="read registry keys")
+    registry_commands = registry.add_subparsers(dest="registry_command", required=True)
+    registry_read = registry_commands.add_parser("read", help="read keys")
+    registry_read.add_argument("keys", nargs="+")
+    registry_read.set_defaults(handler=_registry_read)
+
+    return parser
+
+
+def _run_target(pool, target, args):
+    import time
+
+    start_time = time.monotonic()
+    result = {"name": target.name, "host": target.host, "port": target.port}
+    try:
+        with pool.connection(target.host, target.port, target.username, target.password) as connection:
+            result["result"] = args.handler(connection, target, args)
+        result["ok"] = True
+    except Exception as err:
+        result["ok"] = False
+        result["error"] = str(err)
+    result["elapsed"] = round(time.monotonic() - start_time, 6)
+    return result
+
+
+def _write_result(result, output_format, out):
+    if "text" == output_format:
+        outcome = json.dumps(result["result"]) if result["ok"] else f"error: {result['error']}"
+        out.write(f"{result['name']}\t{'ok' if result['ok'] else 'failed'}\t{result['elapsed']:.3f}s\t{outcome}\n")
+    else:
+        out.write(json.dumps(result) + "\n")
+    out.flush()
+
+
+def run(args, targets, out=None):
+    """
+    runs the parsed command against every target
+
+    :param out: where the results are written.  defaults to the sys.stdout of the time of the call
+    :return: the list of results in target order
+    """
+    if out is None:
+        out = sys.stdout
+    import concurrent.futures
+    import logging
+
+    from jmp_connection.connection_pool import JMPConnectionPool
+
+    # failures are reported in the results.  the log is only wanted when asked for
+    logging.basicConfig(level=(logging.CRITICAL, logging.INFO, logging.DEBUG)[min(args.verbose, 2)])
+
+    on_create = None
+    if args.handler is _control:
+        from jmp_connection.io_state import IOStateStore
+
+        # the outputs are confirmed from the Monitor messages.  the store is attached before the login so that the
+        # state is known and a command that leaves an output as it was can be confirmed
+        args.io_states = {}
+
+        def on_create(connection):
+            store = args.io_states[connection] = IOStateStore()
+            store.attach(connection)
+
+    pool = JMPConnectionPool(max_size=1, max_idle_time=None, connect_timeout=args.timeout, on_create=on_create,
+                             use_tls=args.tls)
+    results = [None] * len(targets)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(args.concurrency, len(targets)))) as executor:
+            futures = {executor.submit(_run_target, pool, target, args): index for index, target in enumerate(targets)}
+            for future in concurrent.futures.as_completed(futures):
+                result = results[futures[future]] = future.result()
+                if "json" != args.format:
+                    _write_result(result, args.format, out)
+    finally:
+        pool.close()
+
+    if "json" == args.format:
+        out.write(json.dumps(results, indent=2) + "\n")
+    return results
+
+
+def main(argv=None):
+    args = _create_parser().parse_args(argv)
+
+    if args.inventory:
+        try:
+            targets = load_inventory(args.inventory, args.port, args.username, args.password)
+        except (OSError, ValueError, KeyError) as err:
+            print(f"unable to read the inventory {args.inventory} because {err}", file=sys.stderr)
+            return 2
+    else:
+        targets = []
+        for address in args.hosts.split(","):
+            if address.strip():
+                host, port = _split_address(address.strip(), args.port)
+                targets.append(Target(host, port, args.username, args.password))
+
+    results = run(args, targets)
+    return 0 if all(result["ok"] for result in results) else 1
@@ -1,11 +1,13 @@
+import logging
 import threading
+import time
 import traceback
 from abc import abstractmethod, ABC
-from datetime import datetime
 import socket
 
 from jmp_connection.jnior_event import JniorEvent
 from jmp_connection.jmp_messages import JmpMessage
+from jmp_connection.metrics import ConnectionMetrics
 
 
 class ConnectionBase(ABC):
@@ -16,6 +18,7 @@ class ConnectionBase(ABC):
         """
 
         self.socket = None
+        self.socket_input_stream = None
         self.host = None
 
         # we set this to zero because it should be overridden with the correct default port by the
@@ -26,7 +29,9 @@ class ConnectionBase(ABC):
         self.password = None
         self.attempted_credentials = False
 
-        self.authentication_wait_event = threading.Condition()
+        # set once the login succeeds and when the connection closes.  an Event stays set so a waiter that arrives
+        # after the login is not missed
+        self.authentication_wait_event = threading.Event()
         self.authenticated = False
 
         # Jnior Events
@@ -34,6 +39,19 @@ class ConnectionBase(ABC):
         self.on_auth = JniorEvent()
         self.on_message_recv = JniorEvent()
 
+        # JMP Message name -> JniorEvent for the handlers that only want that type of message
+        self.message_type_handlers = {}
+
+        # None until enable_metrics() is called.  the hot paths only check this attribute when disabled
+        self.metrics = None
+        self.connected_time = None
+
+        # the thread started by _start_receiving()
+        self.receive_thread = None
+        # the reader, the writer and the caller may all close the connection at once.  only one of them closes the
+        # socket
+        self.close_lock = threading.Lock()
+
     """
     Get and set methods for the socket
     """
@@ -78,12 +96,12 @@ class ConnectionBase(ABC):
 
             return True
         except Exception as err:
-            print(f"{str(datetime.now())[:-3]}: unable to connect to {self.host}:{self.port} "
-                  f"because {err}\n{traceback.format_exc()}")
+            logging.error(f"unable to connect to {self.host}:{self.port} because {err}\n{traceback.format_exc()}")
             # close and nullify our socket
             if self.socket is not None:
                 self.socket.close()
                 self.socket = None
+            self.authentication_wait_event.set()
 
             return False
 
@@ -97,10 +115,25 @@ class ConnectionBase(ABC):
         """
         closes and nullifies the socket
         """
-        self.socket_input_stream.close()
-        if self.socket is not None:
-            self.socket.close()
+        if self.socket_input_stream is not None:
+            self.socket_input_stream.close()
+        with self.close_lock:
+            sock = self.socket
             self.socket = None
+        if sock is not None:
+            try:
+                # wake the reader and let it finish before the descriptor is released.  a TLS reader that is still
+                # in recv would otherwise read from whatever socket reuses the descriptor next
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            receive_thread = self.receive_thread
+            if receive_thread is not None and receive_thread is not threading.current_thread():
+                receive_thread.join(1.0)
+            sock.close()
+            self.authenticated = False
+            # wake anyone waiting for a login that will not happen now
+            self.authentication_wait_event.set()
 
             # alert listener handlers that the connection has been closed
             self.on_connection(self, connected=False, socket=self.socket)
@@ -111,6 +144,30 @@ class ConnectionBase(ABC):
         """
         return self.socket is not None
 
+    """
+    Metrics
+    """
+    def enable_metrics(self, metrics=None):
+        """
+        starts collecting metrics for this connection
+
+        :param metrics: a ConnectionMetrics to collect into.  one is created if not given
+        :return: the ConnectionMetrics
+        """
+        if metrics is None:
+            metrics = ConnectionMetrics()
+        self.metrics = metrics
+        return metrics
+
+    def disable_metrics(self):
+        self.metrics = None
+
+    def get_metrics(self):
+        """
+        :return: a dict of the collected metrics or None if metrics are not enabled
+        """
+        return self.metrics.to_dict() if self.metrics is not None else None
+
     """
     Event Handlers
     """
@@ -138,34 +195,70 @@ class ConnectionBase(ABC):
         """
         self.on_auth -= auth_event_handler
 
-    def add_message_recv_handler(self, message_event_handler):
+    def add_message_recv_handler(self, message_event_handler, message_type=None):
         """
-        adds a given event handler to the on_message JniorEvent object
+        adds a given event handler to the on_message JniorEvent object.  if a message type is given then the
+        handler is only called for messages of that type
+
+        :param message_event_handler: the handler
+        :param message_type: optional JMP Message name, like "Monitor", or a registered JmpMessage class
         """
-        self.on_message_recv += message_event_handler
+        if message_type is None:
+            self.on_message_recv += message_event_handler
+            return
 
-    def remove_message_recv_handler(self, message_event_handler):
+        message_name = message_type if isinstance(message_type, str) else message_type.message_name
+        event = self.message_type_handlers.get(message_name)
+        if event is None:
+            event = self.message_type_handlers[message_name] = JniorEvent()
+        event += message_event_handler
+
+    def remove_message_recv_handler(self, message_event_handler, message_type=None):
         """
         removed a given event handler to the on_message JniorEvent object
         """
-        self.on_message_recv -= message_event_handler
+        if message_type is None:
+            self.on_message_recv -= message_event_handler
+            return
+
+        message_name = message_type if isinstance(message_type, str) else message_type.message_name
+        event = self.message_type_handlers.get(message_name)
+        if event is not None:
+            event -= message_event_handler
+            if 0 == len(event):
+                del self.message_type_handlers[message_name]
 
     def connected(self):
         """
         Called when we are either given a currently established socket or after a new socket
         that we create has been successfully connected.
         """
+        self.connected_time = time.perf_counter()
+        # a new connection gets a new nonce so the stored credentials may be tried again
+        self.attempted_credentials = False
+        self.authentication_wait_event.clear()
+        if self.metrics is not None:
+            self.metrics.connects += 1
+
         # alert listener handlers that we have a valid connection
         self.on_connection(self, connected=True, socket=self.socket)
 
-        # start a new thread to handle incoming messages
-        c_thread = threading.Thread(target=self._message_receive_loop, args=(), daemon=True)
-        c_thread.start()
+        # start receiving incoming messages
+        self._start_receiving()
 
         # send an empty message so that we get an error - unauthenticated response with a
         # Nonce to use in our login message
         self.send(JmpMessage())
 
+    def _start_receiving(self):
+        """
+        starts a new thread to handle incoming messages.  overridden when the socket is serviced by
+        something other than a dedicated thread
+        """
+        c_thread = threading.Thread(target=self._message_receive_loop, args=(), daemon=True)
+        self.receive_thread = c_thread
+        c_thread.start()
+
     @abstractmethod
     def _message_receive_loop(self):
         pass
@@ -0,0 +1,338 @@
+import collections
+import contextlib
+import logging
+import threading
+import time
+
+from jmp_connection.jmp_connection import JMPConnection
+
+"""
+A pool of connections that are already logged in.  A short job checks out a connection, uses it and gives it back
+so that it does not pay for the connect and the login handshake every time.
+"""
+
+
+class PoolExhausted(Exception):
+    """
+    raised by acquire() when every connection for a device is in use and none was released in time
+    """
+    pass
+
+
+class _PoolEntry(object):
+    __slots__ = ("idle", "in_use", "creating")
+
+    def __init__(self):
+        # (connection, time it was released).  the most recently used is on the right
+        self.idle = collections.deque()
+        self.in_use = set()
+        self.creating = 0
+
+    def size(self):
+        return len(self.idle) + len(self.in_use) + self.creating
+
+
+class JMPConnectionPool(object):
+    def __init__(self, max_size=4, max_idle_time=300.0, connect_timeout=10.0, health_check=None,
+                 eviction_interval=30.0, on_create=None, **connection_options):
+        """
+        Pooled connections keyed by host, port and credentials.
+
+        :param max_size: the most connections to one device with the same credentials, in use and idle
+        :param max_idle_time: seconds an unused connection is kept open.  None keeps them until close()
+        :param connect_timeout: seconds to wait for a new connection to log in
+        :param health_check: optional callable(connection) that returns whether an idle connection may be handed
+        out.  connections that are closed or not authenticated are never handed out
+        :param eviction_interval: seconds between the sweeps that close connections idle longer than max_idle_time
+        :param on_create: optional callable(connection) called with each new connection before it connects.  handlers
+        added here see the messages the device sends at login, like the first Monitor message
+        :param connection_options: other keyword arguments for the JMPConnection constructor
+        """
+        self.max_size = max_size
+        self.max_idle_time = max_idle_time
+        self.connect_timeout = connect_timeout
+        self.health_check = health_check
+        self.eviction_interval = eviction_interval
+        self.on_create = on_create
+        self.connection_options = connection_options
+
+        self.condition = threading.Condition()
+        self.entries = {}
+        # connection -> its pool key
+        self.keys = {}
+        self.closed = False
+
+        self.eviction_thread = None
+        self.stop_event = threading.Event()
+
+        # statistics
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.evicted = 0
+        self.waits = 0
+
+    def acquire(self, host, port=9220, username=None, password=None, timeout=None):
+        """
+        checks out an authenticated connection.  an idle one is returned if there is one, otherwise a new one is
+        made.  give it back with release()
+
+        :param host: the device host
+        :param port: the JMP port
+        :param username: the login username
+        :param password: the login password
+        :param timeout: seconds to wait for a connection when max_size are in use.  None waits forever
+        :return: a JMPConnection
+        """
+        key = (host, port, username, password)
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            with self.condition:
+                if self.closed:
+                    raise Exception("the connection pool is closed")
+                entry = self.entries.get(key)
+                if entry is None:
+                    entry = self.entries[key] = _PoolEntry()
+
+                connection = self._take_idle(entry)
+                if connection is None:
+                    if entry.size() < self.max_size:
+                        entry.creating += 1
+                        break
+
+                    self.waits += 1
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise PoolExhausted(f"all {self.max_size} connections to {host}:{port} are in use")
+                    self.condition.wait(remaining)
+                    continue
+
+                # the connection is counted as in use while it is checked so that max_size holds
+                entry.in_use.add(connection)
+                if self.health_check is None:
+                    self.reused += 1
+                    return connection
+
+            # the health check is usually a round trip to the device.  it runs outside the lock so that a slow device
+            # does not hold up the other devices in the pool
+            if self._healthy(connection):
+                with self.condition:
+                    self.reused += 1
+                return connection
+
+            with self.condition:
+                entry.in_use.discard(connection)
+                self.keys.pop(connection, None)
+                self.discarded += 1
+                self.condition.notify()
+            threading.Thread(target=connection.close, daemon=True).start()
+
+        # connect outside the lock so that other devices are not held up
+        try:
+            connection = self._create(key)
+        except Exception:
+            with self.condition:
+                entry.creating -= 1
+                self.condition.notify()
+            raise
+
+        with self.condition:
+            entry.creating -= 1
+            entry.in_use.add(connection)
+            self.keys[connection] = key
+            self.created += 1
+        self._start_eviction()
+        return connection
+
+    def release(self, connection, discard=False):
+        """
+        gives a connection back to the pool
+
+        :param connection: a connection from acquire()
+        :param discard: whether to close the connection instead of keeping it, for example after an error
+        """
+        with self.condition:
+            key = self.keys.get(connection)
+            entry = self.entries.get(key)
+            if entry is None or connection not in entry.in_use:
+                return
+            entry.in_use.discard(connection)
+
+            keep = not discard and not self.closed and connection.is_connected() and connection.is_authenticated()
+            if keep:
+                entry.idle.append((connection, time.monotonic()))
+            else:
+                del self.keys[connection]
+                self.discarded += 1
+            self.condition.notify()
+
+        if not keep:
+            connection.close()
+
+    @contextlib.contextmanager
+    def connection(self, host, port=9220, username=None, password=None, timeout=None):
+        """
+        checks out a connection for a with block.  the connection is discarded if the block raises
+
+            with pool.connection("10.0.0.78", username="jnior", password="jnior") as connection:
+                connection.send(CloseMessage(1, 1000))
+        """
+        connection = self.acquire(host, port, username, password, timeout)
+        try:
+            yield connection
+        except Exception:
+            self.release(connection, discard=True)
+            raise
+        self.release(connection)
+
+    def warm(self, host, port=9220, username=None, password=None, count=1):
+        """
+        opens connections ahead of time so that the first acquire() does not wait for a login
+
+        :param count: the number of idle connections to have ready
+        """
+        connections = []
+        try:
+            for _ in range(min(count, self.max_size)):
+                connections.append(self.acquire(host, port, username, password, timeout=0))
+        except PoolExhausted:
+            pass
+        finally:
+            for connection in connections:
+                self.release(connection)
+
+    def evict_idle(self):
+        """
+        closes the connections that have been idle longer than max_idle_time or are no longer healthy
+
+        :return: the number of connections that were closed
+        """
+        now = time.monotonic()
+        closing = []
+        with self.condition:
+            for entry in self.entries.values():
+                kept = collections.deque()
+                for connection, released_time in entry.idle:
+                    expired = self.max_idle_time is not None and now - released_time > self.max_idle_time
+                    if expired or not connection.is_connected():
+                        closing.append(connection)
+                        self.keys.pop(connection, None)
+                    else:
+                        kept.append((connection, released_time))
+                entry.idle = kept
+            self.evicted += len(closing)
+            if closing:
+                self.condition.notify_all()
+
+        for connection in closing:
+            connection.close()
+        return len(closing)
+
+    def close(self):
+        """
+        closes every idle connection.  connections that are checked out are closed when they are released
+        """
+        self.stop_event.set()
+        with self.condition:
+            self.closed = True
+            closing = [connection for entry in self.entries.values() for connection, _ in entry.idle]
+            for entry in self.entries.values():
+                entry.idle.clear()
+            for connection in closing:
+                self.keys.pop(connection, None)
+            self.condition.notify_all()
+
+        for connection in closing:
+            connection.close()
+
+    def get_stats(self):
+        """
+        :return: a dict of the pool counters and the idle and in use connection counts
+        """
+        with self.condition:
+            return {
+                "idle": sum(len(entry.idle) for entry in self.entries.values()),
+                "in_use": sum(len(entry.in_use) for entry in self.entries.values()),
+                "created": self.created,
+                "reused": self.reused,
+                "discarded": self.discarded,
+                "evicted": self.evicted,
+                "waits": self.waits,
+            }
+
+    def _take_idle(self, entry):
+        """
+        pops the most recently used idle connection that is still logged in.  the others are closed.  the health
+        check is left to the caller.  called with the lock held
+        """
+        while entry.idle:
+            connection, _ = entry.idle.pop()
+            if connection.is_connected() and connection.is_authenticated():
+                return connection
+            self.keys.pop(connection, None)
+            self.discarded += 1
+            # close on another thread so that a slow close does not hold the lock
+            threading.Thread(target=connection.close, daemon=True).start()
+        return None
+
+    def _healthy(self, connection):
+        try:
+            return self.health_check(connection)
+        except Exception as err:
+            logging.warning(f"health check of {connection.get_host_info()} failed because {err}")
+            return False
+
+    def _create(self, key):
+        host, port, username, password = key
+
+        # set when the login succeeds, is refused or the connection closes.  a refused login should fail now rather
+        # than at connect_timeout
+        settled = threading.Event()
+        refused = threading.Event()
+
+        def auth_handler(connection, authorized, nonce=None):
+            if not authorized:
+                refused.set()
+            settled.set()
+
+        def connection_handler(connection, connected, socket=None):
+            if not connected:
+                settled.set()
+
+        connection = JMPConnection(**self.connection_options)
+        if username is not None:
+            connection.set_credentials(username, password)
+        connection.add_auth_handler(auth_handler)
+        connection.add_connection_handler(connection_handler)
+        if self.on_create is not None:
+            self.on_create(connection)
+        try:
+            if not connection.connect(host, port):
+                raise Exception(f"unable to connect to {host}:{port}")
+
+            settled.wait(self.connect_timeout)
+            if not connection.is_authenticated():
+                if refused.is_set():
+                    raise Exception(f"the login to {host}:{port} was refused")
+                raise Exception(f"unable to log in to {host}:{port}")
+        except Exception:
+            connection.close()
+            raise
+        finally:
+            connection.remove_auth_handler(auth_handler)
+            connection.remove_connection_handler(connection_handler)
+        return connection
+
+    def _start_eviction(self):
+        if self.max_idle_time is None or self.eviction_thread is not None:
+            return
+        with self.condition:
+            if self.eviction_thread is not None:
+                return
+            self.eviction_thread = threading.Thread(target=self._eviction_loop, daemon=True, name="jmp-pool-evict")
+        self.eviction_thread.start()
+
+    def _eviction_loop(self):
+        while not self.stop_event.wait(self.eviction_interval):
+            self.evict_idle()
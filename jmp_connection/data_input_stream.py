@@ -1,76 +1,226 @@
 """
 Reading from Java DataInputStream format.
+
+The stream is read straight out of a bytes, bytearray, memoryview or mmap buffer.  File objects are memory mapped
+when they can be so that a multi-megabyte log or backup is never copied.  The big endian values are read with
+precompiled Structs and the read_*s() methods decode whole arrays of values at once.
 """
-import io
+import array
+import mmap
 import struct
+import sys
+
+_BOOLEAN = struct.Struct('?')
+_BYTE = struct.Struct('b')
+_UNSIGNED_BYTE = struct.Struct('B')
+_SHORT = struct.Struct('>h')
+_UNSIGNED_SHORT = struct.Struct('>H')
+_INT = struct.Struct('>i')
+_UNSIGNED_INT = struct.Struct('>I')
+_LONG = struct.Struct('>q')
+_UNSIGNED_LONG = struct.Struct('>Q')
+_FLOAT = struct.Struct('>f')
+_DOUBLE = struct.Struct('>d')
+
+# the array typecodes are sized by the platform so find the ones with the Java sizes
+_SIGNED_TYPECODES = {array.array(code).itemsize: code for code in 'qlihb'}
+_UNSIGNED_TYPECODES = {array.array(code).itemsize: code for code in 'QLIHB'}
+
+_SWAP = 'little' == sys.byteorder
 
 
 class DataInputStream:
     def __init__(self, stream):
+        """
+        :param stream: a bytes like object, an mmap or a file object.  a file object is read from its current
+        position
+        """
+        self.mmap = None
+        if isinstance(stream, (bytes, bytearray, memoryview, mmap.mmap)):
+            self.view = memoryview(stream).cast('B')
+        else:
+            self.view = self._map_file(stream)
         self.stream = stream
-
-        cur_pos = self.stream.tell()
-        stream.seek(0, io.SEEK_END)
-        self.length = stream.tell()
-        stream.seek(cur_pos)
+        self.pos = 0
+        self.length = len(self.view)
+
+    def _map_file(self, stream):
+        offset = stream.tell()
+        try:
+            self.mmap = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError):
+            # not a real file, or an empty one.  read what is left of it
+            return memoryview(stream.read())
+        return memoryview(self.mmap)[offset:]
+
+    def close(self):
+        """
+        releases the memory map of a file.  views returned by read_view() must no longer be used
+        """
+        self.view.release()
+        if self.mmap is not None:
+            self.mmap.close()
+            self.mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def _advance(self, size):
+        """
+        :return: the position of the next size bytes.  raises EOFError if there are not that many
+        """
+        pos = self.pos
+        end = pos + size
+        if end > self.length or size < 0:
+            raise EOFError(f"{size} bytes wanted at {pos} but the stream is {self.length} bytes")
+        self.pos = end
+        return pos
+
+    def _unpack(self, unpacker):
+        return unpacker.unpack_from(self.view, self._advance(unpacker.size))[0]
 
     def read_boolean(self):
-        return struct.unpack('?', self.stream.read(1))[0]
+        return self._unpack(_BOOLEAN)
 
     def read_byte(self):
-        return struct.unpack('b', self.stream.read(1))[0]
+        return self._unpack(_BYTE)
 
     def read_unsigned_byte(self):
-        return struct.unpack('B', self.stream.read(1))[0]
+        return self.view[self._advance(1)]
 
     def read_char(self):
-        return chr(struct.unpack('b', self.stream.read(1))[0])
+        return chr(self._unpack(_BYTE))
 
     def read_double(self):
-        return struct.unpack('>d', self.stream.read(8))[0]
+        return self._unpack(_DOUBLE)
 
     def read_float(self):
-        return struct.unpack('>f', self.stream.read(4))[0]
+        return self._unpack(_FLOAT)
 
     def read_short(self):
-        return struct.unpack('>h', self.stream.read(2))[0]
+        return self._unpack(_SHORT)
 
     def read_unsigned_short(self):
-        return struct.unpack('>H', self.stream.read(2))[0]
+        return self._unpack(_UNSIGNED_SHORT)
 
     def read_int(self):
-        return struct.unpack('>i', self.stream.read(4))[0]
+        return self._unpack(_INT)
 
     def read_unsigned_int(self):
-        return struct.unpack('>I', self.stream.read(4))[0]
+        return self._unpack(_UNSIGNED_INT)
 
     def read_long(self):
-        return struct.unpack('>q', self.stream.read(8))[0]
+        return self._unpack(_LONG)
 
     def read_unsigned_long(self):
-        return struct.unpack('>Q', self.stream.read(8))[0]
-
-    def read_string(self):
-        utf_length = struct.unpack('>B', self.stream.read(1))[0]
-        return str(self.stream.read(utf_length), 'ascii')
+        return self._unpack(_UNSIGNED_LONG)
 
     def read_string(self):
-        utf_length = struct.unpack('>B', self.stream.read(1))[0]
-        return str(self.stream.read(utf_length), 'ascii')
+        utf_length = self.read_unsigned_byte()
+        return str(self.read_view(utf_length), 'ascii')
 
     def read_string2(self):
         utf_length = self.read_short()
-        return str(self.stream.read(utf_length), 'ascii')
+        return str(self.read_view(utf_length), 'ascii')
 
     def read_utf(self):
-        utf_length = struct.unpack('>H', self.stream.read(2))[0]
-        return str(self.stream.read(utf_length), 'utf')
+        utf_length = self.read_unsigned_short()
+        return str(self.read_view(utf_length), 'utf')
 
     def read_bytes(self, length):
-        return self.stream.read(length)
+        return bytes(self.read_view(length))
+
+    def read_view(self, length):
+        """
+        :return: the next length bytes as a memoryview of the buffer.  nothing is copied
+        """
+        pos = self._advance(length)
+        return self.view[pos:pos + length]
 
     def read_remaining(self):
-        return self.stream.read()
+        return self.read_bytes(self.length - self.pos)
+
+    def _read_array(self, typecode, count):
+        values = array.array(typecode)
+        pos = self._advance(values.itemsize * count)
+        values.frombytes(self.view[pos:self.pos])
+        if _SWAP and 1 < values.itemsize:
+            values.byteswap()
+        return values
+
+    def read_unsigned_bytes(self, count):
+        """
+        :return: an array of count unsigned bytes
+        """
+        return self._read_array(_UNSIGNED_TYPECODES[1], count)
+
+    def read_shorts(self, count):
+        """
+        :return: an array of count big endian signed shorts
+        """
+        return self._read_array(_SIGNED_TYPECODES[2], count)
+
+    def read_unsigned_shorts(self, count):
+        return self._read_array(_UNSIGNED_TYPECODES[2], count)
+
+    def read_ints(self, count):
+        """
+        :return: an array of count big endian signed ints
+        """
+        return self._read_array(_SIGNED_TYPECODES[4], count)
+
+    def read_unsigned_ints(self, count):
+        return self._read_array(_UNSIGNED_TYPECODES[4], count)
+
+    def read_longs(self, count):
+        """
+        :return: an array of count big endian signed longs
+        """
+        return self._read_array(_SIGNED_TYPECODES[8], count)
+
+    def read_unsigned_longs(self, count):
+        return self._read_array(_UNSIGNED_TYPECODES[8], count)
+
+    def read_floats(self, count):
+        """
+        :return: an array of count big endian floats
+        """
+        return self._read_array('f', count)
+
+    def read_doubles(self, count):
+        """
+        :return: an array of count big endian doubles
+        """
+        return self._read_array('d', count)
+
+    def read_structs(self, unpacker, count):
+        """
+        reads count records laid out one after another
+
+        :param unpacker: a struct.Struct for one record, like struct.Struct('>qiH')
+        :return: a list of the unpacked tuples
+        """
+        pos = self._advance(unpacker.size * count)
+        return list(unpacker.iter_unpack(self.view[pos:self.pos]))
+
+    def skip_bytes(self, length):
+        """
+        :return: the number of bytes skipped.  fewer than length at the end of the stream
+        """
+        skipped = max(0, min(length, self.length - self.pos))
+        self.pos += skipped
+        return skipped
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, pos):
+        if not 0 <= pos <= self.length:
+            raise EOFError(f"position {pos} is outside the {self.length} byte stream")
+        self.pos = pos
 
     def get_remaining_length(self):
-        return self.length - self.stream.tell()
+        return self.length - self.pos
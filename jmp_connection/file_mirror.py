@@ -0,0 +1,211 @@
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+import time
+
+from jmp_connection.file_transfer import FileDownloader, FileTransferError
+from jmp_connection.jmp_messages import FileListMessage
+
+"""
+Mirrors JNIOR file systems to a local folder.  Folders are listed concurrently with File List requests and the
+listing is compared with the one cached by the previous run so that only new or changed files are downloaded.
+"""
+
+MANIFEST_FILENAME = ".jmp_mirror.json"
+
+# manifest filename -> the lock held while it is merged.  runs that mirror different folders of one device into the
+# same destination share a manifest
+_manifest_locks = {}
+_manifest_locks_lock = threading.Lock()
+
+
+def _get_manifest_lock(manifest_filename):
+    with _manifest_locks_lock:
+        lock = _manifest_locks.get(manifest_filename)
+        if lock is None:
+            lock = _manifest_locks[manifest_filename] = threading.Lock()
+        return lock
+
+
+def parse_file_entry(entry):
+    """
+    pulls the name, type, size and modification time out of an entry in a File List Response Content.  see
+    FileListResponseMessage.contents
+
+    :param entry: a dict from the Content list
+    :return: a tuple of (name, is_folder, size, modified)
+    """
+    return entry["Name"], "Folder" == entry.get("Type"), entry.get("Size"), entry.get("Modified")
+
+
+class FileMirror(object):
+    def __init__(self, dest_root, max_concurrency=8, list_timeout=30.0, **downloader_options):
+        """
+        Mirrors the files of one or more JNIORs.  Each device is written to its own folder under dest_root.
+
+        :param dest_root: the local folder to mirror into
+        :param max_concurrency: the most listings and downloads that may run at once across every device
+        :param list_timeout: seconds to wait for a File List response
+        :param downloader_options: options for the FileDownloader used for each file
+        """
+        self.dest_root = dest_root
+        self.max_concurrency = max_concurrency
+        self.list_timeout = list_timeout
+        self.downloader_options = downloader_options
+
+    def mirror(self, connection, folder="/", dest=None):
+        """
+        mirrors a folder of one device
+
+        :param connection: an authenticated JMPConnection
+        :param folder: the folder on the JNIOR to mirror, recursively
+        :param dest: the local folder.  defaults to dest_root/host
+        :return: a dict of the mirror statistics
+        """
+        return self.mirror_many([(connection, folder, dest)])[0]
+
+    def mirror_many(self, jobs):
+        """
+        mirrors several devices and folders at once under the global concurrency limit
+
+        :param jobs: a list of (connection, folder) or (connection, folder, dest) tuples
+        :return: a list with the statistics dict of each job
+        """
+        with concurrent.futures.ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="jmp-mirror") as executor:
+            runs = [_MirrorRun(self, executor, *job) for job in jobs]
+            for run in runs:
+                run.start()
+            for run in runs:
+                run.wait()
+        return [run.stats for run in runs]
+
+
+class _MirrorRun(object):
+    def __init__(self, mirror, executor, connection, folder="/", dest=None):
+        """
+        the state of mirroring one folder of one device
+        """
+        self.mirror = mirror
+        self.executor = executor
+        self.connection = connection
+        self.folder = folder if folder.endswith('/') else folder + '/'
+        self.dest = dest if dest is not None else os.path.join(mirror.dest_root, str(connection.host))
+
+        self.manifest_filename = os.path.join(self.dest, MANIFEST_FILENAME)
+        self.previous = self._load_manifest()
+        self.current = {}
+
+        self.lock = threading.Lock()
+        self.outstanding = 0
+        self.finished = threading.Event()
+
+        self.stats = {
+            "host": connection.host,
+            "folder": self.folder,
+            "folders": 0,
+            "files": 0,
+            "downloaded": 0,
+            "skipped": 0,
+            "bytes": 0,
+            "errors": [],
+            "elapsed": 0.0,
+        }
+        self.start_time = None
+
+    def start(self):
+        self.start_time = time.monotonic()
+        self._submit(self._list, self.folder)
+
+    def wait(self):
+        self.finished.wait()
+        self.stats["elapsed"] = time.monotonic() - self.start_time
+        self._save_manifest()
+
+    def _submit(self, task, *args):
+        with self.lock:
+            self.outstanding += 1
+        self.executor.submit(self._run_task, task, *args)
+
+    def _run_task(self, task, *args):
+        try:
+            task(*args)
+        except Exception as err:
+            logging.error(f"mirror of {self.connection.get_host_info()} failed at {args[0]} because {err}")
+            with self.lock:
+                self.stats["errors"].append(f"{args[0]}: {err}")
+        finally:
+            with self.lock:
+                self.outstanding -= 1
+                if 0 == self.outstanding:
+                    self.finished.set()
+
+    def _list(self, folder):
+        response = self.connection.request(FileListMessage(folder), self.mirror.list_timeout).result()
+        if "Error" == response.message:
+            # a refused listing is not an empty folder.  the error keeps the records of this folder in the manifest
+            raise FileTransferError(f"unable to list {folder}: {response.json.get('Text')}")
+        with self.lock:
+            self.stats["folders"] += 1
+
+        for entry in response.contents:
+            name, is_folder, size, modified = parse_file_entry(entry)
+            if not name or name in ('.', '..'):
+                continue
+
+            path = folder + name
+            if is_folder:
+                self._submit(self._list, path + '/')
+                continue
+
+            with self.lock:
+                self.stats["files"] += 1
+            record = {"size": size, "modified": modified}
+            local_filename = self._local_filename(path)
+
+            if self.previous.get(path) == record and os.path.exists(local_filename):
+                with self.lock:
+                    self.current[path] = record
+                    self.stats["skipped"] += 1
+                continue
+
+            self._submit(self._download, path, record)
+
+    def _download(self, path, record):
+        local_filename = self._local_filename(path)
+        os.makedirs(os.path.dirname(local_filename), exist_ok=True)
+
+        result = FileDownloader(self.connection, **self.mirror.downloader_options).download(path, local_filename)
+        with self.lock:
+            # only a completed download is recorded so that a failed one is retried next time
+            self.current[path] = record
+            self.stats["downloaded"] += 1
+            self.stats["bytes"] += result["bytes"]
+
+    def _local_filename(self, path):
+        # never let a name from the device climb out of the destination folder
+        return os.path.join(self.dest, *[part for part in path.split('/') if part not in ('', '.', '..')])
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_filename, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self):
+        with _get_manifest_lock(self.manifest_filename):
+            # another run may have saved the records of its own folder since we loaded the manifest
+            manifest = self._load_manifest()
+            if not self.stats["errors"]:
+                # the files under our folder that are gone from the device are forgotten.  with errors the records
+                # of files we could not reach are kept so that they are not downloaded again
+                manifest = {path: record for path, record in manifest.items() if not path.startswith(self.folder)}
+            manifest.update(self.current)
+
+            os.makedirs(self.dest, exist_ok=True)
+            temp_filename = self.manifest_filename + ".tmp"
+            with open(temp_filename, 'w') as f:
+                json.dump(manifest, f)
+            os.replace(temp_filename, self.manifest_filename)
@@ -0,0 +1,193 @@
+import base64
+import concurrent.futures
+import os
+import time
+
+from jmp_connection.jmp_messages import FileReadMessage
+
+"""
+High level file transfers built on the File Read message.  A download keeps several offset reads outstanding on the
+connection at once instead of waiting a full round trip for every chunk.
+"""
+
+
+def decode_file_data(jmp_message):
+    """
+    returns the bytes of a File Read response.  the JNIOR sends the file content base64 encoded
+
+    :param jmp_message: the File Read response
+    :return: the bytes
+    """
+    data = jmp_message.json.get("Data")
+    if data is None:
+        return b''
+    return base64.b64decode(data)
+
+
+class FileTransferError(Exception):
+    """
+    raised when the JNIOR refuses a file request
+    """
+    pass
+
+
+class FileDownloader(object):
+    def __init__(self, connection, window=4, chunk_size=1024 * 16, min_chunk_size=1024 * 4,
+                 max_chunk_size=1024 * 64, target_rtt=0.25, timeout=30.0, progress_callback=None,
+                 data_decoder=decode_file_data):
+        """
+        Downloads files over an authenticated JMPConnection.
+
+        :param connection: the connection to read from
+        :param window: how many reads may be outstanding at once
+        :param chunk_size: the starting Limit for each read
+        :param min_chunk_size: the smallest Limit the chunk size will shrink to
+        :param max_chunk_size: the largest Limit the chunk size will grow to
+        :param target_rtt: the chunk size grows while reads complete faster than half of this and shrinks when they
+            take more than twice this
+        :param timeout: seconds to wait for any one read
+        :param progress_callback: called with the stats dict after every chunk is written
+        :param data_decoder: turns a File Read response into bytes
+        """
+        self.connection = connection
+        self.window = window
+        self.chunk_size = chunk_size
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.target_rtt = target_rtt
+        self.timeout = timeout
+        self.progress_callback = progress_callback
+        self.data_decoder = data_decoder
+
+    def download(self, path, dest):
+        """
+        downloads a file.  chunks are written in order as they arrive so the file is never held in memory.  when
+        dest is a filename the data is written to dest.part and renamed once it is complete
+
+        :param path: the path of the file on the JNIOR
+        :param dest: a filename or a writable binary file object
+        :return: a dict with the size, elapsed time, throughput and request counts
+        """
+        if hasattr(dest, 'write'):
+            return self._download(path, dest)
+
+        part_filename = f"{dest}.part"
+        try:
+            with open(part_filename, 'wb') as f:
+                stats = self._download(path, f)
+            os.replace(part_filename, dest)
+            return stats
+        except BaseException:
+            if os.path.exists(part_filename):
+                os.remove(part_filename)
+            raise
+
+    def _download(self, path, f):
+        chunk_size = self.chunk_size
+        # start from the round trip time the connection has already measured instead of growing from scratch
+        rtt_estimator = getattr(self.connection, "rtt", None)
+        srtt = rtt_estimator.srtt if rtt_estimator is not None else None
+        if srtt is not None:
+            while chunk_size != self._adapt_chunk_size(chunk_size, srtt):
+                chunk_size = self._adapt_chunk_size(chunk_size, srtt)
+        start_time = time.monotonic()
+        stats = {
+            "file": path,
+            "size": None,
+            "bytes": 0,
+            "requests": 0,
+            "elapsed": 0.0,
+            "bytes_per_second": 0.0,
+            "chunk_size": chunk_size,
+            "rtt": srtt,
+        }
+
+        # outstanding reads: future -> (offset, limit, sent time)
+        in_flight = {}
+        # chunks that arrived ahead of the write position
+        arrived = {}
+        # ranges that still need to be read, used when a read returns less than was asked for
+        retries = []
+
+        size = None
+        write_offset = 0
+        next_offset = 0
+
+        def send_read(offset, limit):
+            future = self.connection.request(FileReadMessage(path, offset, limit), self.timeout)
+            in_flight[future] = (offset, limit, time.monotonic())
+            stats["requests"] += 1
+
+        try:
+            # the first read tells us the size of the file
+            send_read(0, chunk_size)
+            next_offset = chunk_size
+
+            while in_flight:
+                done, _ = concurrent.futures.wait(list(in_flight), return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    offset, limit, sent_time = in_flight.pop(future)
+                    response = future.result()
+                    rtt = time.monotonic() - sent_time
+
+                    if "Succeed" != response.json.get("Status"):
+                        raise FileTransferError(f"unable to read {path}: {response.json.get('Status')}")
+
+                    if size is None:
+                        size = int(response.json["Size"])
+                        stats["size"] = size
+
+                    data = self.data_decoder(response)
+                    if not data and offset < size:
+                        # the file shrank or the device stopped sending.  asking again would never end
+                        raise FileTransferError(f"{path} returned no data at offset {offset} of {size} bytes")
+                    if data:
+                        arrived[offset] = data
+                    if len(data) < limit and offset + len(data) < size:
+                        # a short read.  ask for the rest of this range
+                        retries.append((offset + len(data), limit - len(data)))
+
+                    stats["rtt"] = rtt if stats["rtt"] is None else stats["rtt"] * 0.8 + rtt * 0.2
+                    chunk_size = self._adapt_chunk_size(chunk_size, stats["rtt"])
+                    stats["chunk_size"] = chunk_size
+
+                # write everything that is now contiguous with what has been written
+                while write_offset in arrived:
+                    data = arrived.pop(write_offset)
+                    f.write(data)
+                    write_offset += len(data)
+                    stats["bytes"] = write_offset
+                    self._update_rates(stats, start_time)
+                    if self.progress_callback is not None:
+                        self.progress_callback(stats)
+
+                # keep the window full
+                while retries and len(in_flight) < self.window:
+                    send_read(*retries.pop(0))
+                while size is not None and next_offset < size and len(in_flight) < self.window:
+                    limit = min(chunk_size, size - next_offset)
+                    send_read(next_offset, limit)
+                    next_offset += limit
+
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+        if size is not None and write_offset != size:
+            raise FileTransferError(f"{path} downloaded {write_offset} of {size} bytes")
+
+        self._update_rates(stats, start_time)
+        return stats
+
+    def _adapt_chunk_size(self, chunk_size, rtt):
+        if rtt < self.target_rtt / 2 and chunk_size < self.max_chunk_size:
+            return min(chunk_size * 2, self.max_chunk_size)
+        if rtt > self.target_rtt * 2 and chunk_size > self.min_chunk_size:
+            return max(chunk_size // 2, self.min_chunk_size)
+        return chunk_size
+
+    @staticmethod
+    def _update_rates(stats, start_time):
+        stats["elapsed"] = time.monotonic() - start_time
+        if 0 < stats["elapsed"]:
+            stats["bytes_per_second"] = stats["bytes"] / stats["elapsed"]
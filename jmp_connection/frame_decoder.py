@@ -0,0 +1,121 @@
+"""
+Incremental decoder for the JMP wire format.  Each JMP message is framed as [length,json] where length is the
+number of bytes in the json payload.  The decoder works directly over a bytearray or memoryview so that a receive
+loop can hand it everything that has arrived and get back every complete frame in one call.
+"""
+
+RIGHT_BRACKET = ord(']')
+
+# the length prefix is a plain decimal number.  anything longer than this cannot be a valid JMP frame
+MAX_LENGTH_DIGITS = 10
+
+
+class FrameDecodeError(Exception):
+    """
+    raised when the data in the buffer cannot be a JMP frame
+    """
+    pass
+
+
+class FrameDecoder(object):
+    def __init__(self, max_frame_size=None):
+        """
+        A JMP frame decoder.  decode() is stateless and can be run over any buffer.  feed() keeps its own
+        bytearray for transports that receive data in arbitrary chunks.
+
+        :param max_frame_size: optional limit on the length a frame may declare
+        """
+        self.max_frame_size = max_frame_size
+        self.pending = bytearray()
+
+    def decode(self, buffer, start=0, end=None, copy=True):
+        """
+        finds every complete frame in buffer[start:end]
+
+        :param buffer: a bytearray, bytes or memoryview holding received data
+        :param start: where to start looking for the next frame
+        :param end: the end of the valid data in the buffer
+        :param copy: when False the payloads are returned as memoryview slices of the buffer.  they are only valid
+            until the buffer is modified
+        :return: a tuple of the list of payloads and the position just past the last byte that was consumed
+        """
+        if end is None:
+            end = len(buffer)
+
+        # bytearray and bytes have a native find.  a memoryview does not so we search the object it wraps
+        with memoryview(buffer) as view:
+            search = buffer
+            if isinstance(buffer, memoryview):
+                search = buffer.obj if buffer.nbytes == len(buffer.obj) else bytes(buffer)
+
+            frames = []
+            pos = start
+            while pos < end:
+                left_bracket = search.find(b'[', pos, end)
+                if left_bracket < 0:
+                    # nothing but noise left in the buffer.  it can all be discarded
+                    pos = end
+                    break
+
+                comma = search.find(b',', left_bracket + 1, min(end, left_bracket + 2 + MAX_LENGTH_DIGITS))
+                if comma < 0:
+                    if end - left_bracket > MAX_LENGTH_DIGITS + 1:
+                        raise FrameDecodeError("comma expected")
+                    # the length prefix has not fully arrived yet
+                    pos = left_bracket
+                    break
+
+                length_bytes = bytes(view[left_bracket + 1:comma])
+                if not length_bytes.isdigit():
+                    raise FrameDecodeError("comma expected")
+                length = int(length_bytes)
+
+                if self.max_frame_size is not None and length > self.max_frame_size:
+                    raise FrameDecodeError(f"frame length {length} exceeds {self.max_frame_size}")
+
+                payload_start = comma + 1
+                payload_end = payload_start + length
+                if payload_end >= end:
+                    # wait for the rest of the frame
+                    pos = left_bracket
+                    break
+
+                if view[payload_end] != RIGHT_BRACKET:
+                    raise FrameDecodeError("right bracket expected")
+
+                payload = view[payload_start:payload_end]
+                frames.append(bytes(payload) if copy else payload)
+                pos = payload_end + 1
+
+        return frames, pos
+
+    def feed(self, data):
+        """
+        appends the given data to the internal buffer and returns every frame that is now complete
+
+        :param data: bytes that were just received
+        :return: a list of payloads
+        """
+        self.pending += data
+        frames, consumed = self.decode(self.pending)
+        if consumed:
+            del self.pending[:consumed]
+        return frames
+
+    def reset(self):
+        """
+        discards any partial frame that has been buffered
+        """
+        self.pending.clear()
+
+
+def encode_frame(payload):
+    """
+    formats the given payload in the JMP format [length,payload]
+
+    :param payload: a str or bytes payload
+    :return: the framed bytes
+    """
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    return b'[%d,%b]' % (len(payload), payload)
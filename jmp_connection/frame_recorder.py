@@ -0,0 +1,354 @@
+import array
+import bisect
+import collections
+import mmap
+import os
+import struct
+import threading
+import time
+
+from jmp_connection.frame_decoder import encode_frame
+
+"""
+Records the JMP frames a connection sends and receives and plays them back.  A recording is an append-only log of
+records and an index file next to it that holds the offset and time of every record.  Recordings are read with mmap
+so that a long capture can be replayed through the decode and dispatch path of a JMPConnection without devices.
+"""
+
+INBOUND = 0
+OUTBOUND = 1
+
+# the file starts with a magic and a version
+_MAGIC = b"JMPREC\x00\x01"
+
+# timestamp, direction, payload length.  the payload follows
+_RECORD = struct.Struct("<dBI")
+
+# offset of the record in the log, timestamp
+_INDEX = struct.Struct("<Qd")
+
+RecordedFrame = collections.namedtuple("RecordedFrame", ["timestamp", "direction", "payload"])
+
+
+def _index_path(path):
+    return path + ".idx"
+
+
+class FrameRecorder(object):
+    def __init__(self, path, buffer_size=1024 * 64):
+        """
+        Appends frames to a recording.  An existing recording is added to.
+
+            recorder = FrameRecorder("capture.jmprec")
+            connection = JMPConnection(recorder=recorder)
+
+        :param path: the log file.  the index is written to path + ".idx"
+        :param buffer_size: bytes buffered before they are written to the files.  see flush()
+        """
+        self.path = path
+        self.lock = threading.Lock()
+
+        self.log_file = open(path, "ab", buffering=buffer_size)
+        self.index_file = open(_index_path(path), "ab", buffering=buffer_size)
+        if 0 == self.log_file.tell():
+            self.log_file.write(_MAGIC)
+        self.offset = self.log_file.tell()
+
+        # statistics
+        self.frames = 0
+        self.bytes = 0
+
+    def record(self, direction, payload, timestamp=None):
+        """
+        appends one frame
+
+        :param direction: INBOUND or OUTBOUND
+        :param payload: the json of the frame as bytes or str, without the [length, prefix
+        :param timestamp: the time the frame was seen.  defaults to now
+        """
+        self.record_many(direction, (payload,), timestamp)
+
+    def record_many(self, direction, payloads, timestamp=None):
+        """
+        appends frames that were seen at the same time, like the frames of one receive
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        with self.lock:
+            if self.log_file is None:
+                return
+            for payload in payloads:
+                if isinstance(payload, str):
+                    payload = payload.encode("utf-8")
+                length = len(payload)
+                self.index_file.write(_INDEX.pack(self.offset, timestamp))
+                self.log_file.write(_RECORD.pack(timestamp, direction, length))
+                self.log_file.write(payload)
+                self.offset += _RECORD.size + length
+                self.frames += 1
+                self.bytes += length
+
+    def flush(self):
+        """
+        writes the buffered records to the files
+        """
+        with self.lock:
+            if self.log_file is not None:
+                # the log goes first so that the index never points past it
+                self.log_file.flush()
+                self.index_file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.log_file is None:
+                return
+            self.log_file.close()
+            self.index_file.close()
+            self.log_file = None
+            self.index_file = None
+
+    def get_stats(self):
+        """
+        :return: a dict of the frames and payload bytes recorded
+        """
+        return {"path": self.path, "frames": self.frames, "bytes": self.bytes}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+class FrameRecording(object):
+    def __init__(self, path):
+        """
+        A recording opened for reading.  The payloads are memoryview slices of the mapped file and are only
+        valid until close().
+
+        :param path: the log file written by a FrameRecorder
+        """
+        self.path = path
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        if size < len(_MAGIC):
+            self.file.close()
+            raise ValueError(f"{path} is not a frame recording")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if _MAGIC != self.map[:len(_MAGIC)]:
+            self.close()
+            raise ValueError(f"{path} is not a frame recording")
+        self.view = memoryview(self.map)
+
+        self.offsets = array.array("Q")
+        self.timestamps = array.array("d")
+        self._load_index()
+
+    def _load_index(self):
+        """
+        reads the index.  records past the end of the index, from a recorder that did not flush it, are found by
+        walking the log
+        """
+        try:
+            with open(_index_path(self.path), "rb") as index_file:
+                index = index_file.read()
+        except FileNotFoundError:
+            index = b""
+
+        end = len(self.map)
+        usable = len(index) - len(index) % _INDEX.size
+        for offset, timestamp in _INDEX.iter_unpack(memoryview(index)[:usable]):
+            # an entry is only trusted when its whole payload is in the log
+            if offset < len(_MAGIC) or offset + _RECORD.size > end or \
+                    offset + _RECORD.size + _RECORD.unpack_from(self.map, offset)[2] > end:
+                break
+            self.offsets.append(offset)
+            self.timestamps.append(timestamp)
+
+        if self.offsets:
+            offset = self.offsets[-1]
+            offset += _RECORD.size + _RECORD.unpack_from(self.map, offset)[2]
+        else:
+            offset = len(_MAGIC)
+
+        while offset + _RECORD.size <= end:
+            timestamp, _, length = _RECORD.unpack_from(self.map, offset)
+            if offset + _RECORD.size + length > end:
+                # a record that was cut off by a crash
+                break
+            self.offsets.append(offset)
+            self.timestamps.append(timestamp)
+            offset += _RECORD.size + length
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        """
+        :return: the RecordedFrame at index
+        """
+        offset = self.offsets[index]
+        timestamp, direction, length = _RECORD.unpack_from(self.map, offset)
+        start = offset + _RECORD.size
+        return RecordedFrame(timestamp, direction, self.view[start:start + length])
+
+    def frames(self, start=0, end=None, direction=None):
+        """
+        iterates over the recorded frames
+
+        :param start: the index of the first frame
+        :param end: the index after the last frame.  defaults to the end of the recording
+        :param direction: INBOUND or OUTBOUND to only return frames in one direction
+        """
+        if end is None:
+            end = len(self.offsets)
+        unpack_from = _RECORD.unpack_from
+        header_size = _RECORD.size
+        for offset in self.offsets[start:end]:
+            timestamp, frame_direction, length = unpack_from(self.map, offset)
+            if direction is None or direction == frame_direction:
+                yield RecordedFrame(timestamp, frame_direction, self.view[offset + header_size:
+                                                                          offset + header_size + length])
+
+    def find_time(self, timestamp):
+        """
+        :return: the index of the first frame recorded at or after timestamp
+        """
+        return bisect.bisect_left(self.timestamps, timestamp)
+
+    def get_start_time(self):
+        return self.timestamps[0] if self.timestamps else None
+
+    def get_duration(self):
+        """
+        :return: seconds between the first and the last frame
+        """
+        return self.timestamps[-1] - self.timestamps[0] if self.timestamps else 0.0
+
+    def close(self):
+        view = getattr(self, "view", None)
+        if view is not None:
+            try:
+                view.release()
+            except BufferError:
+                # payloads are still referenced.  the map is released when they are
+                return
+        if self.map is not None and not self.map.closed:
+            try:
+                self.map.close()
+            except BufferError:
+                return
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+def replay(recording, connection=None, speed=None, direction=INBOUND, start=0, end=None, batch_size=64,
+           wait=True):
+    """
+    feeds recorded frames to a connection as if they had just been received.  the frames are framed again and run
+    through the connection's frame decoder and dispatcher so its handlers see them the same way they would from a
+    device
+
+        with FrameRecording("capture.jmprec") as recording:
+            stats = replay(recording, connection)
+
+    :param recording: a FrameRecording
+    :param connection: the JMPConnection whose handlers receive the frames.  a connection that is not connected is
+        treated as logged in so that a recorded login is not answered
+    :param speed: None replays as fast as possible.  1.0 keeps the recorded timing, 2.0 replays twice as fast
+    :param direction: the frames to replay.  INBOUND, OUTBOUND or None for both
+    :param start: the index of the first frame
+    :param end: the index after the last frame
+    :param batch_size: the most frames decoded together when replaying as fast as possible
+    :param wait: whether to wait for the dispatcher to handle every replayed frame before returning.  other traffic
+        on a shared dispatcher is not waited for
+    :return: a dict with the frames and bytes replayed, the elapsed seconds and the frame rate
+    """
+    temporary = connection is None
+    if temporary:
+        from jmp_connection.jmp_connection import JMPConnection
+        connection = JMPConnection()
+    try:
+        return _replay(recording, connection, speed, direction, start, end, batch_size, wait)
+    finally:
+        if temporary:
+            # stops the dispatcher worker the connection created
+            connection.close()
+
+
+class _HandledCounter(object):
+    def __init__(self):
+        """
+        counts the replayed frames the dispatcher has handled
+        """
+        self.condition = threading.Condition()
+        self.handled = 0
+
+    def __call__(self):
+        with self.condition:
+            self.handled += 1
+            self.condition.notify_all()
+
+
+def _replay(recording, connection, speed, direction, start, end, batch_size, wait):
+    if not connection.is_connected():
+        connection.authenticated = True
+        connection.attempted_credentials = True
+
+    dispatcher = connection.dispatcher
+    decoder = connection.frame_decoder
+    counter = _HandledCounter()
+    dropped_before = dispatcher.dropped
+    if end is None:
+        end = len(recording)
+
+    frame_count = 0
+    byte_count = 0
+    start_time = time.perf_counter()
+
+    first_timestamp = None
+    batch = bytearray()
+    batch_frames = 0
+    for timestamp, _, payload in recording.frames(start, end, direction):
+        if speed is not None:
+            if first_timestamp is None:
+                first_timestamp = timestamp
+            delay = (timestamp - first_timestamp) / speed - (time.perf_counter() - start_time)
+            if 0 < delay:
+                time.sleep(delay)
+
+        batch += encode_frame(payload)
+        batch_frames += 1
+        byte_count += len(payload)
+        if speed is not None or batch_frames >= batch_size:
+            frame_count += _feed(connection, decoder, batch, counter)
+            batch.clear()
+            batch_frames = 0
+    if batch:
+        frame_count += _feed(connection, decoder, batch, counter)
+
+    if wait:
+        with counter.condition:
+            # a frame dropped by a full dispatcher is never handled
+            while counter.handled + dispatcher.dropped - dropped_before < frame_count:
+                counter.condition.wait(0.1)
+
+    elapsed = time.perf_counter() - start_time
+    return {
+        "frames": frame_count,
+        "bytes": byte_count,
+        "elapsed": elapsed,
+        "frames_per_second": frame_count / elapsed if 0 < elapsed else 0.0,
+    }
+
+
+def _feed(connection, decoder, buffer, counter):
+    frames, _ = decoder.decode(buffer)
+    for payload in frames:
+        connection._dispatch(payload, counter)
+    return len(frames)
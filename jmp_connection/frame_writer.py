@@ -0,0 +1,149 @@
+import collections
+import select
+import sys
+import threading
+
+from jmp_connection.socket_input_stream import would_block
+
+"""
+Writes encoded JMP frames to a socket from a queue.  Frames that are queued while a write is in progress are joined
+into one buffer and written with a single sendall so that a burst of commands costs one syscall instead of one per
+message.
+"""
+
+
+def send_all(sock, data):
+    """
+    writes all of the data to a socket.  a non-blocking socket, like one serviced by a JMPFleet, is waited on until
+    it can take more
+
+    :param sock: a socket or SSLSocket
+    :param data: the bytes to write
+    """
+    if 0.0 != sock.gettimeout():
+        sock.sendall(data)
+        return
+
+    with memoryview(data) as view:
+        sent = 0
+        while sent < len(view):
+            try:
+                sent += sock.send(view[sent:])
+            except Exception as err:
+                if not would_block(err):
+                    raise
+                # a TLS write may need to read first
+                ssl = sys.modules.get("ssl")
+                want_read = ssl is not None and isinstance(err, ssl.SSLWantReadError)
+                select.select([sock] if want_read else [], [] if want_read else [sock], [])
+
+
+class FrameWriter(object):
+    def __init__(self, connection, max_batch_bytes=1024 * 64):
+        """
+        A write queue for a connection.  The writer thread is started by the first write.
+
+        :param connection: the connection whose socket is written to.  the socket is looked up for every batch so
+        that a TLS upgrade is picked up
+        :param max_batch_bytes: the most bytes that will be coalesced into a single write
+        """
+        self.connection = connection
+        self.max_batch_bytes = max_batch_bytes
+
+        self.frames = collections.deque()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.running = False
+        self.writing = False
+
+        # a stopped writer thread may still be finishing a write when a new one is started.  the generation
+        # lets the old thread know that it should exit
+        self.generation = 0
+
+        # statistics
+        self.frames_written = 0
+        self.bytes_written = 0
+        self.writes = 0
+
+    def write(self, frame):
+        """
+        queues an encoded frame
+
+        :param frame: the bytes to write
+        """
+        with self.condition:
+            self.frames.append(frame)
+            if not self.running:
+                self.running = True
+                self.generation += 1
+                self.thread = threading.Thread(target=self._run, args=[self.generation], daemon=True,
+                                               name="jmp-writer")
+                self.thread.start()
+            self.condition.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        waits for the queued frames to be written
+
+        :param timeout: seconds to wait.  None waits forever
+        :return: whether the queue was drained
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.frames and not self.writing, timeout)
+
+    def stop(self):
+        """
+        discards the queued frames and lets the writer thread exit
+        """
+        with self.condition:
+            self.frames.clear()
+            self.running = False
+            self.condition.notify_all()
+
+    def pending_count(self):
+        return len(self.frames)
+
+    def _run(self, generation):
+        while True:
+            with self.condition:
+                while self.running and generation == self.generation and not self.frames:
+                    self.condition.wait()
+                if not self.running or generation != self.generation:
+                    return
+
+                # take everything that is waiting, up to the batch limit
+                batch = [self.frames.popleft()]
+                size = len(batch[0])
+                while self.frames and size + len(self.frames[0]) <= self.max_batch_bytes:
+                    frame = self.frames.popleft()
+                    batch.append(frame)
+                    size += len(frame)
+                self.writing = True
+
+            try:
+                sock = self.connection.socket
+                if sock is None:
+                    raise Exception("socket is not open")
+                send_all(sock, batch[0] if 1 == len(batch) else b''.join(batch))
+
+                self.frames_written += len(batch)
+                self.bytes_written += size
+                self.writes += 1
+            except Exception as err:
+                self.stop()
+                self.connection._send_failed(err, f"{len(batch)} queued frames")
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
+
+    def get_stats(self):
+        """
+        :return: a dict of the write counters.  frames_written / writes is the average coalescing factor
+        """
+        return {
+            "queue_depth": len(self.frames),
+            "frames_written": self.frames_written,
+            "bytes_written": self.bytes_written,
+            "writes": self.writes,
+        }
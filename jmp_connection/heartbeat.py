@@ -0,0 +1,118 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+"""
+Round trip time estimation and the timer that drives connection heartbeats.  The estimate follows the TCP
+retransmission timer (RFC 6298) so that a timeout derived from it adapts to each device and network.
+"""
+
+
+class RttEstimator(object):
+    ALPHA = 0.125
+    BETA = 0.25
+
+    def __init__(self, min_timeout=1.0, max_timeout=60.0, default_timeout=30.0):
+        """
+        A smoothed round trip time and its variation
+
+        :param min_timeout: the smallest timeout timeout() returns
+        :param max_timeout: the largest timeout timeout() returns
+        :param default_timeout: the timeout before any round trip has been measured
+        """
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.default_timeout = default_timeout
+
+        self.srtt = None
+        self.rttvar = None
+        self.last = None
+        self.min = None
+        self.samples = 0
+
+    def observe(self, rtt):
+        """
+        adds a measured round trip in seconds
+        """
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+        self.last = rtt
+        if self.min is None or rtt < self.min:
+            self.min = rtt
+        self.samples += 1
+
+    def timeout(self):
+        """
+        :return: seconds to wait for a reply before giving up.  srtt + 4 * rttvar within the configured bounds
+        """
+        if self.srtt is None:
+            return self.default_timeout
+        return min(self.max_timeout, max(self.min_timeout, self.srtt + 4 * self.rttvar))
+
+    def to_dict(self):
+        return {
+            "srtt": self.srtt,
+            "rttvar": self.rttvar,
+            "last": self.last,
+            "min": self.min,
+            "samples": self.samples,
+            "timeout": self.timeout(),
+        }
+
+
+class _HeartbeatScheduler(object):
+    def __init__(self):
+        """
+        a single daemon thread that runs the heartbeats of every connection in the process
+        """
+        self.heap = []
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def schedule(self, delay, callback):
+        """
+        runs callback after delay seconds.  the callback returns the delay until it should run again or None
+
+        :param delay: seconds until the first run
+        :param callback: a callable that takes no arguments
+        """
+        with self.condition:
+            heapq.heappush(self.heap, (time.monotonic() + delay, next(self.sequence), callback))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True, name="jmp-heartbeat")
+                self.thread.start()
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.heap:
+                    self.condition.wait()
+                due, _, callback = self.heap[0]
+                remaining = due - time.monotonic()
+                if 0 < remaining:
+                    self.condition.wait(remaining)
+                    continue
+                heapq.heappop(self.heap)
+
+            try:
+                delay = callback()
+            except Exception as err:
+                logging.error(f"heartbeat failed because {err}")
+                delay = None
+            if delay is not None:
+                self.schedule(delay, callback)
+
+
+_scheduler = _HeartbeatScheduler()
+
+
+def schedule_heartbeat(delay, callback):
+    _scheduler.schedule(delay, callback)
@@ -0,0 +1,292 @@
+import array
+import bisect
+import math
+import threading
+import time
+
+"""
+A bounded history of the I/O of one device for analytics, like how long an output was closed today or how many
+input transitions there were each hour.  A sample of the input and output masks and the input counters is kept for
+every change in preallocated columns that are used as a ring buffer.  The columns are NumPy arrays when NumPy is
+installed and the queries are then vectorized.  Otherwise they are arrays from the array module.
+"""
+
+# NumPy takes a while to import so it is only imported when the first history is created.  the queries below only run
+# against a history so they see the result
+numpy = None
+_numpy_imported = False
+
+
+def _import_numpy():
+    global numpy, _numpy_imported
+    if not _numpy_imported:
+        try:
+            import numpy as module
+        except ImportError:
+            module = None
+        numpy = module
+        _numpy_imported = True
+    return numpy
+
+
+INPUT = "input"
+OUTPUT = "output"
+
+# the masks are stored as unsigned 64 bit values
+MAX_CHANNELS = 64
+_MASK = (1 << MAX_CHANNELS) - 1
+
+TRANSITIONS = "transitions"
+ON_TIME = "on_time"
+DUTY_CYCLE = "duty_cycle"
+COUNT = "count"
+
+
+class IOHistory(object):
+    def __init__(self, capacity=4096, count_channels=8):
+        """
+        :param capacity: the most samples kept.  the oldest is overwritten first so memory never grows
+        :param count_channels: the input counters kept with each sample
+        """
+        self.capacity = capacity
+        self.count_channels = count_channels
+        self.lock = threading.Lock()
+
+        if _import_numpy() is not None:
+            self.times = numpy.zeros(capacity, numpy.float64)
+            self.inputs = numpy.zeros(capacity, numpy.uint64)
+            self.outputs = numpy.zeros(capacity, numpy.uint64)
+            self.counts = numpy.zeros((capacity, count_channels), numpy.uint64)
+        else:
+            self.times = array.array('d', bytes(8 * capacity))
+            self.inputs = array.array('Q', bytes(8 * capacity))
+            self.outputs = array.array('Q', bytes(8 * capacity))
+            # row major.  the counters of sample i start at i * count_channels
+            self.counts = array.array('Q', bytes(8 * capacity * count_channels))
+
+        # where the next sample is written and the number of samples kept
+        self.head = 0
+        self.size = 0
+        self.recorded = 0
+
+    def record(self, inputs, outputs, counts=None, timestamp=None):
+        """
+        adds a sample.  IOStateStore calls this for every change when it is given the history
+
+        :param inputs: the input mask.  bit (channel - 1) is the state of the channel
+        :param outputs: the output mask
+        :param counts: the input counters in channel order
+        :param timestamp: when the state was seen.  defaults to now
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        with self.lock:
+            row = self.head
+            self.times[row] = timestamp
+            self.inputs[row] = inputs & _MASK
+            self.outputs[row] = outputs & _MASK
+            if counts is not None:
+                width = min(len(counts), self.count_channels)
+                if numpy is not None:
+                    self.counts[row, :width] = counts[:width]
+                else:
+                    start = row * self.count_channels
+                    self.counts[start:start + width] = array.array('Q', counts[:width])
+            self.head = (row + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+            self.recorded += 1
+
+    def __len__(self):
+        return self.size
+
+    def _columns(self):
+        """
+        :return: copies of the times, the inputs, the outputs and the counters, oldest first
+        """
+        with self.lock:
+            size = self.size
+            first = (self.head - size) % self.capacity
+            order = [(first, first + size)] if first + size <= self.capacity else \
+                [(first, self.capacity), (0, self.head)]
+
+            if numpy is not None:
+                return tuple(numpy.concatenate([column[start:end] for start, end in order])
+                             for column in (self.times, self.inputs, self.outputs, self.counts))
+
+            width = self.count_channels
+            columns = []
+            for column in (self.times, self.inputs, self.outputs):
+                columns.append(sum((column[start:end] for start, end in order), array.array(column.typecode)))
+            columns.append(sum((self.counts[start * width:end * width] for start, end in order), array.array('Q')))
+            return tuple(columns)
+
+    def _states(self, kind, channel):
+        """
+        :return: the times and the 0 or 1 state of a channel at each sample
+        """
+        times, inputs, outputs, counts = self._columns()
+        masks = outputs if OUTPUT == kind else inputs
+        if numpy is not None:
+            return times, ((masks >> numpy.uint64(channel - 1)) & numpy.uint64(1)).astype(numpy.float64)
+        return times, [(mask >> (channel - 1)) & 1 for mask in masks]
+
+    def _window(self, times, start, end):
+        if end is None:
+            end = time.time()
+        if start is None:
+            start = times[0] if len(times) else end
+        return start, end
+
+    def on_time(self, kind, channel, start=None, end=None):
+        """
+        :param kind: INPUT or OUTPUT
+        :param channel: the channel number starting at 1
+        :param start: the start of the window.  defaults to the first sample
+        :param end: the end of the window.  defaults to now.  the last sample is taken to hold until then
+        :return: the seconds the channel was on within the window
+        """
+        times, states = self._states(kind, channel)
+        start, end = self._window(times, start, end)
+        on_times = _integrate(times, states, [start, end], end)
+        return float(on_times[1] - on_times[0])
+
+    def duty_cycle(self, kind, channel, start=None, end=None):
+        """
+        :return: the fraction of the window, from 0 to 1, that the channel was on.  time before the first sample
+        is not counted
+        """
+        times, states = self._states(kind, channel)
+        start, end = self._window(times, start, end)
+        if not len(times):
+            return 0.0
+        observed = end - max(start, times[0])
+        if observed <= 0:
+            return 0.0
+        on_times = _integrate(times, states, [start, end], end)
+        return float(on_times[1] - on_times[0]) / observed
+
+    def transition_count(self, kind, channel, start=None, end=None):
+        """
+        :return: the number of times the channel changed state within the window
+        """
+        times, states = self._states(kind, channel)
+        start, end = self._window(times, start, end)
+        change_times = _change_times(times, states)
+        return bisect.bisect_left(change_times, end) - bisect.bisect_left(change_times, start)
+
+    def count_delta(self, channel, start=None, end=None):
+        """
+        :return: how much the counter of an input went up within the window
+        """
+        times, _, _, counts = self._columns()
+        start, end = self._window(times, start, end)
+        values = _counter_at(times, counts, self.count_channels, channel, [start, end])
+        return int(values[1]) - int(values[0])
+
+    def aggregate(self, kind, channel, interval, value=TRANSITIONS, start=None, end=None):
+        """
+        splits a window into buckets and computes a value for each one
+
+            starts, transitions = history.aggregate(INPUT, 1, 3600, TRANSITIONS, start=midnight)
+
+        :param kind: INPUT or OUTPUT.  ignored for COUNT
+        :param channel: the channel number starting at 1
+        :param interval: the seconds in each bucket
+        :param value: TRANSITIONS, ON_TIME, DUTY_CYCLE or COUNT
+        :param start: the start of the first bucket.  defaults to the first sample
+        :param end: the end of the window.  defaults to now
+        :return: a tuple of the bucket start times and the values.  NumPy arrays when NumPy is installed,
+        otherwise lists
+        """
+        times, inputs, outputs, counts = self._columns()
+        start, end = self._window(times, start, end)
+        buckets = max(1, int(math.ceil((end - start) / interval)))
+        if numpy is not None:
+            edges = start + interval * numpy.arange(buckets + 1, dtype=numpy.float64)
+        else:
+            edges = [start + interval * index for index in range(buckets + 1)]
+
+        if COUNT == value:
+            return edges[:-1], _diff(_counter_at(times, counts, self.count_channels, channel, edges))
+
+        masks = outputs if OUTPUT == kind else inputs
+        if numpy is not None:
+            states = ((masks >> numpy.uint64(channel - 1)) & numpy.uint64(1)).astype(numpy.float64)
+        else:
+            states = [(mask >> (channel - 1)) & 1 for mask in masks]
+
+        if TRANSITIONS == value:
+            change_times = _change_times(times, states)
+            if numpy is not None:
+                return edges[:-1], numpy.diff(numpy.searchsorted(change_times, edges))
+            return edges[:-1], _diff([bisect.bisect_left(change_times, edge) for edge in edges])
+
+        on_times = _diff(_integrate(times, states, edges, end))
+        if ON_TIME == value:
+            return edges[:-1], on_times
+        if DUTY_CYCLE != value:
+            raise ValueError(f"unknown value {value}")
+
+        # the part of each bucket that the history covers
+        first = times[0] if len(times) else end
+        if numpy is not None:
+            covered = numpy.diff(numpy.clip(edges, first, end))
+            return edges[:-1], numpy.divide(on_times, covered, out=numpy.zeros_like(on_times), where=0 < covered)
+        covered = _diff([min(max(edge, first), end) for edge in edges])
+        return edges[:-1], [on / span if 0 < span else 0.0 for on, span in zip(on_times, covered)]
+
+
+def _diff(values):
+    if numpy is not None:
+        return numpy.diff(values)
+    return [values[index + 1] - values[index] for index in range(len(values) - 1)]
+
+
+def _integrate(times, states, points, end):
+    """
+    :return: the seconds a channel was on from the first sample until each point.  each sample holds until the
+    next one and the last holds until end
+    """
+    if numpy is not None:
+        points = numpy.clip(numpy.asarray(points, numpy.float64), None, end)
+        if not len(times):
+            return numpy.zeros(len(points))
+        held = numpy.diff(numpy.append(times, max(end, times[-1])))
+        on_before = numpy.concatenate(([0.0], numpy.cumsum(states * held)))
+        rows = numpy.searchsorted(times, points, 'right') - 1
+        safe_rows = numpy.maximum(rows, 0)
+        on_times = on_before[safe_rows] + states[safe_rows] * (points - times[safe_rows])
+        return numpy.where(0 <= rows, on_times, 0.0)
+
+    on_before = [0.0]
+    for index, state in enumerate(states):
+        until = times[index + 1] if index + 1 < len(times) else max(end, times[index])
+        on_before.append(on_before[-1] + state * (until - times[index]))
+    on_times = []
+    for point in points:
+        point = min(point, end)
+        row = bisect.bisect_right(times, point) - 1
+        on_times.append(on_before[row] + states[row] * (point - times[row]) if 0 <= row else 0.0)
+    return on_times
+
+
+def _change_times(times, states):
+    """
+    :return: the sorted times at which the state changed
+    """
+    if numpy is not None:
+        return times[1:][numpy.diff(states) != 0]
+    return [times[index] for index in range(1, len(states)) if states[index] != states[index - 1]]
+
+
+def _counter_at(times, counts, width, channel, points):
+    """
+    :return: the value of an input counter just before each point so that a change at the edge of two windows is
+    counted in the later one.  before the first sample the first value is used
+    """
+    if not len(times) or channel > width:
+        return numpy.zeros(len(points), numpy.int64) if numpy is not None else [0] * len(points)
+    if numpy is not None:
+        rows = numpy.maximum(numpy.searchsorted(times, points, 'left') - 1, 0)
+        return counts[rows, channel - 1].astype(numpy.int64)
+    return [counts[max(bisect.bisect_left(times, point) - 1, 0) * width + channel - 1] for point in points]
@@ -0,0 +1,205 @@
+import array
+import threading
+
+from jmp_connection.io_history import IOHistory
+from jmp_connection.jnior_event import JniorEvent
+
+"""
+Keeps the I/O state of JNIORs from their Monitor messages.  The states are held as bitmasks and the input counters
+in an array.  Each Monitor message is compared with the previous state and events are only fired for the channels
+that changed.
+"""
+
+
+def _channel_items(channels):
+    """
+    yields (channel number, channel dict) for the Inputs or Outputs of a Monitor message.  the channels may be a
+    dict keyed by the channel number or a list in channel order
+    """
+    if isinstance(channels, dict):
+        for key, value in channels.items():
+            try:
+                yield int(key), value
+            except ValueError:
+                continue
+    elif isinstance(channels, list):
+        for index, value in enumerate(channels):
+            yield index + 1, value
+
+
+def _channel_state(value):
+    if isinstance(value, dict):
+        return 1 if value.get("State") else 0
+    return 1 if value else 0
+
+
+class IOStateStore(object):
+    def __init__(self, name=None, history=None):
+        """
+        The I/O state of one device.  Channel numbers start at 1 and bit (channel - 1) of a mask is the state of
+        that channel.
+
+        :param name: a name for the device.  defaults to the host of the connection it is attached to
+        :param history: an optional IOHistory that a sample is added to whenever the state or a counter changes
+        """
+        self.name = name
+        self.history = history
+        self.lock = threading.Lock()
+
+        self.inputs = 0
+        self.outputs = 0
+        self.input_counts = array.array('Q')
+        self.timestamp = None
+        self.updates = 0
+        self.initialized = False
+
+        # Jnior Events
+        self.on_input_change = JniorEvent()
+        self.on_output_change = JniorEvent()
+
+        self.connection = None
+
+    def attach(self, connection):
+        """
+        starts updating this store from the Monitor messages received on the connection
+
+        :param connection: a JMPConnection
+        """
+        if self.name is None:
+            self.name = connection.host
+        self.connection = connection
+        connection.add_message_recv_handler(self._message_recv_handler, "Monitor")
+
+    def detach(self):
+        if self.connection is not None:
+            self.connection.remove_message_recv_handler(self._message_recv_handler, "Monitor")
+            self.connection = None
+
+    def _message_recv_handler(self, connection, jmp_message):
+        self.update(jmp_message.json)
+
+    def update(self, monitor_json):
+        """
+        applies a Monitor message and fires the change events for the channels that changed.  the first message
+        only initializes the store.
+
+        :param monitor_json: the json of a Monitor message
+        :return: a tuple of the changed input mask and the changed output mask
+        """
+        input_changes = []
+        output_changes = []
+
+        with self.lock:
+            inputs = self.inputs
+            counts = self.input_counts
+            if "Inputs" in monitor_json:
+                inputs = 0
+                for channel, value in _channel_items(monitor_json["Inputs"]):
+                    if _channel_state(value):
+                        inputs |= 1 << (channel - 1)
+                    count = value.get("Count") if isinstance(value, dict) else None
+                    if count is not None:
+                        if channel > len(counts):
+                            counts.extend([0] * (channel - len(counts)))
+                        if counts[channel - 1] != count:
+                            if self.initialized and not (self.inputs ^ inputs) >> (channel - 1) & 1:
+                                # the counter moved without a state change so report it as a change
+                                input_changes.append(channel)
+                            counts[channel - 1] = count
+
+            outputs = self.outputs
+            if "Outputs" in monitor_json:
+                outputs = 0
+                for channel, value in _channel_items(monitor_json["Outputs"]):
+                    if _channel_state(value):
+                        outputs |= 1 << (channel - 1)
+
+            changed_inputs = (inputs ^ self.inputs) if self.initialized else 0
+            changed_outputs = (outputs ^ self.outputs) if self.initialized else 0
+            if self.history is not None and (not self.initialized or changed_inputs or changed_outputs or
+                                             input_changes):
+                self.history.record(inputs, outputs, counts)
+            self.inputs = inputs
+            self.outputs = outputs
+            self.timestamp = monitor_json.get("Timestamp", self.timestamp)
+            self.updates += 1
+            self.initialized = True
+
+            input_changes.extend(_bits(changed_inputs))
+            output_changes.extend(_bits(changed_outputs))
+
+        for channel in sorted(set(input_changes)):
+            count = self.input_counts[channel - 1] if channel <= len(self.input_counts) else None
+            self.on_input_change(self, channel=channel, state=(inputs >> (channel - 1)) & 1, count=count)
+        for channel in output_changes:
+            self.on_output_change(self, channel=channel, state=(outputs >> (channel - 1)) & 1)
+
+        return changed_inputs, changed_outputs
+
+    def get_input(self, channel):
+        return (self.inputs >> (channel - 1)) & 1
+
+    def get_output(self, channel):
+        return (self.outputs >> (channel - 1)) & 1
+
+    def get_count(self, channel):
+        return self.input_counts[channel - 1] if channel <= len(self.input_counts) else None
+
+    def snapshot(self):
+        """
+        :return: a tuple of (inputs mask, outputs mask, a copy of the input counts, timestamp)
+        """
+        with self.lock:
+            return self.inputs, self.outputs, array.array('Q', self.input_counts), self.timestamp
+
+
+def _bits(mask):
+    """
+    yields the 1 based channel numbers of the set bits in a mask
+    """
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length()
+        mask ^= low_bit
+
+
+class IOStateRegistry(object):
+    def __init__(self):
+        """
+        The I/O state stores of a fleet of devices
+        """
+        self.stores = {}
+        self.lock = threading.Lock()
+
+    def attach(self, connection, name=None, history_capacity=None):
+        """
+        creates a store for the connection and starts updating it
+
+        :param connection: a JMPConnection
+        :param name: the name for the device.  defaults to the connection host
+        :param history_capacity: the samples to keep in an IOHistory for the device.  None keeps no history
+        :return: the IOStateStore
+        """
+        history = IOHistory(history_capacity) if history_capacity is not None else None
+        store = IOStateStore(name, history)
+        store.attach(connection)
+        with self.lock:
+            self.stores[store.name] = store
+        return store
+
+    def detach(self, name):
+        with self.lock:
+            store = self.stores.pop(name, None)
+        if store is not None:
+            store.detach()
+
+    def get(self, name):
+        return self.stores.get(name)
+
+    def snapshot(self):
+        """
+        :return: a dict of device name to (inputs mask, outputs mask) for every device.  no json is walked
+        """
+        with self.lock:
+            stores = list(self.stores.items())
+        return {name: (store.inputs, store.outputs) for name, store in stores}
@@ -1,17 +1,20 @@
 import logging
-from datetime import datetime
-
-import io
-import json
+import random
 import socket
-import ssl
 import threading
 import time
 import traceback
 
-from jmp_connection.data_input_stream import DataInputStream
 from jmp_connection.connection_base import ConnectionBase
-from jmp_connection.jmp_messages import JmpMessage, LoginMessage
+from jmp_connection.file_transfer import FileDownloader
+from jmp_connection.frame_decoder import FrameDecoder, encode_frame
+from jmp_connection.frame_recorder import INBOUND, OUTBOUND
+from jmp_connection.frame_writer import FrameWriter, send_all
+from jmp_connection.heartbeat import RttEstimator, schedule_heartbeat
+from jmp_connection.jmp_messages import JmpMessage, LoginMessage, RegistryReadMessage, create_message
+from jmp_connection.json_codec import JsonCodec, create_lazy_message, get_codec, peek_message_name, peek_meta_hash
+from jmp_connection.message_dispatcher import MessageDispatcher, ORDER_MESSAGE_TYPE
+from jmp_connection.request_tracker import RequestTimeout, RequestTracker
 from jmp_connection.socket_input_stream import SocketInputStream
 # from jmp_connection.console_session import ConsoleSession
 
@@ -20,52 +23,175 @@ Handles a JMP connection.  The JMP "JuMP" protocol is a JSON based protocol that
 JNIOR protocol.
 """
 
+# what happens to the requests that are waiting for a reply when the connection is lost and reconnect is enabled
+REQUESTS_FAIL = "fail"
+REQUESTS_REPLAY = "replay"
+
 
 class JMPConnection(ConnectionBase):
 
-    def __init__(self):
+    def __init__(self, receive_buffer_size=1024 * 32, max_receive_buffer_size=1024 * 1024 * 4, dispatcher=None,
+                 coalesce_writes=True, tcp_nodelay=True, codec=None, lazy_decode=False, reconnect=False,
+                 reconnect_min_delay=0.5, reconnect_max_delay=30.0, reconnect_max_attempts=None,
+                 request_policy=REQUESTS_FAIL, use_tls=False, tls_config=None, heartbeat_interval=None,
+                 heartbeat_misses=2, heartbeat_message=None, tcp_keepalive=None, recorder=None):
         """
         A socket is provided to the constructor of the JMP class.
 
         :param socket: only provided if we are going to treat a currently connected socket as a
         JMP connection.  This is most likely the case when implementing a server where accepted
         clients will now act as a JMP client.
+        :param receive_buffer_size: the initial size of the receive buffer
+        :param max_receive_buffer_size: the most memory the receive buffer may use.  a frame larger than this will
+        close the connection
+        :param dispatcher: the MessageDispatcher that runs the message handlers.  it may be shared by many
+        connections.  by default each connection gets a single worker that handles its messages in order
+        :param coalesce_writes: whether sends are queued for a writer thread that batches them into one write.
+        without it each send writes to the socket on the calling thread
+        :param tcp_nodelay: whether TCP_NODELAY is set on the socket
+        :param codec: the JsonCodec, or the name of one, used to encode and decode messages.  defaults to the
+        stdlib json module
+        :param lazy_decode: whether received messages are only parsed when their json is used.  handlers that
+        only look at the Message name never pay for the parse
+        :param reconnect: whether the connection is made again after it is lost.  the stored credentials are used
+        to log in again and the TLS upgrade is repeated
+        :param reconnect_min_delay: seconds before the first reconnect attempt
+        :param reconnect_max_delay: the most seconds between reconnect attempts.  the delay doubles after each
+        failed attempt and is randomized so that a fleet does not reconnect all at once
+        :param reconnect_max_attempts: the attempts before giving up.  None tries forever
+        :param request_policy: REQUESTS_FAIL fails the requests that are waiting for a reply when the connection
+        is lost.  REQUESTS_REPLAY sends them again once the connection is authenticated.  they still fail at their
+        timeout.  messages queued with send() are always discarded
+        :param use_tls: whether the connection is upgraded with STARTTLS as soon as it is connected
+        :param tls_config: the TLSConfig with the SSLContext and TLS sessions to use.  connections share a default
+        one when this is not given
+        :param heartbeat_interval: seconds of silence from the JNIOR before a heartbeat request is sent.  None
+        disables heartbeats
+        :param heartbeat_misses: the heartbeats in a row that may go unanswered, with nothing else received, before
+        the connection is treated as lost
+        :param heartbeat_message: a callable that returns the request to send as a heartbeat.  defaults to a
+        Registry Read with no keys
+        :param tcp_keepalive: seconds of idle before the operating system starts TCP keepalive probes.  None leaves
+        keepalive off
+        :param recorder: a FrameRecorder that every frame sent and received is written to.  see set_recorder()
         """
         ConnectionBase.__init__(self)
 
         self.port = 9220  # default
 
-        self.incoming_stream = io.BytesIO()
-        self.next_read_pos = 0
-        self.end_of_stream_pos = 0
+        self.receive_buffer_size = receive_buffer_size
+        self.max_receive_buffer_size = max_receive_buffer_size
         self.socket_input_stream = None
+        self.frame_decoder = FrameDecoder(max_frame_size=max_receive_buffer_size)
+        # a dispatcher we create is ours to shut down.  a shared one is left running for its other connections
+        self.owns_dispatcher = dispatcher is None
+        self.dispatcher = dispatcher if dispatcher is not None else MessageDispatcher(workers=1)
+        self.request_tracker = RequestTracker()
+        self.codec = codec if isinstance(codec, JsonCodec) else get_codec(codec)
+        self.lazy_decode = lazy_decode
+
+        self.frame_writer = FrameWriter(self) if coalesce_writes else None
+        self.send_lock = threading.Lock()
+        self.tcp_nodelay = tcp_nodelay
+
+        # set when the socket is serviced by a JMPFleet instead of our own reader thread
+        self.fleet = None
+        self.fleet_io_thread = None
+
+        self.use_tls = use_tls
+        self.tls_config = tls_config
+        self.tls_stats = None
+
+        self.reconnect_enabled = reconnect
+        self.reconnect_min_delay = reconnect_min_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.reconnect_max_attempts = reconnect_max_attempts
+        self.request_policy = request_policy
+        self.reconnect_lock = threading.Lock()
+        self.reconnect_thread = None
+        self.reconnect_stop_event = threading.Event()
+        self.reconnect_attempts = 0
+        # Meta Hash -> the message of each outstanding request so that it can be replayed
+        self.replay_messages = {}
+
+        # the round trip time of every request.  used for heartbeat timeouts and download chunk sizing
+        self.rtt = RttEstimator()
+        self.last_receive_time = time.monotonic()
+
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_misses = heartbeat_misses
+        self.heartbeat_message = heartbeat_message if heartbeat_message is not None else self._heartbeat_request
+        self.tcp_keepalive = tcp_keepalive
+        # counts the sockets this connection has had.  a heartbeat or a message from an earlier socket sees that the
+        # generation has changed
+        self.connection_generation = 0
+        self.heartbeat_future = None
+        self.missed_heartbeats = 0
+
+        self.recorder = recorder
 
         self.console_session = None
 
+    def connect(self, host=None, port=None):
+        """
+        connects to a JMP server.  see ConnectionBase.connect()
+
+        :return: whether the connection was made
+        """
+        # a connection that was closed may be connected again
+        self.reconnect_stop_event.clear()
+        return ConnectionBase.connect(self, host, port)
+
     def start_tls(self):
         """
         start_tls
 
-        called to upgrade the connection to a secure connection
+        called to upgrade the connection to a secure connection.  the handshake starts as soon as the JNIOR
+        acknowledges the request and resumes the last TLS session with this JNIOR when there is one
         """
 
-        print(f"{str(datetime.now())[:-3]}: upgrading socket to TLS")
-        tls_start_time = time.time()
+        logging.info(f"{self.get_host_info()}: upgrading socket to TLS")
+        tls_start_time = time.perf_counter()
+        tls_config = self._get_tls_config()
 
-        # tell the JNIOR that we wish to upgrade to TLS.  Must sleep briefly before performing
-        # the upgrade
-        self.socket.send(b'[STARTTLS]')
-        time.sleep(.2)
+        # anything already queued must go out before the upgrade
+        self.flush()
+
+        # tell the JNIOR that we wish to upgrade to TLS and wait for it to be ready
+        self.socket.sendall(b'[STARTTLS]')
+        acknowledged = tls_config.wait_for_ack(self.socket)
+        ack_time = time.perf_counter() - tls_start_time
 
         # create a ssl socket to use and tell it to perform the handshake before continuing
-        context = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
-        ssl_socket = context.wrap_socket(self.socket)
+        ssl_socket, tls_stats = tls_config.wrap(self.socket, self.host, self.port)
 
         # reassign our socket
         self.socket = ssl_socket
-
-        tls_elapsed = time.time() - tls_start_time
-        print(f"{str(datetime.now())[:-3]}: upgrading socket to TLS took {tls_elapsed}")
+        # a reconnect upgrades the new connection too
+        self.use_tls = True
+
+        tls_stats["acknowledged"] = acknowledged
+        tls_stats["ack_time"] = ack_time
+        tls_stats["total_time"] = time.perf_counter() - tls_start_time
+        self.tls_stats = tls_stats
+        if self.metrics is not None:
+            self.metrics.tls_handshake_time.observe(tls_stats["handshake_time"])
+
+        logging.info(f"{self.get_host_info()}: upgrading socket to TLS took {tls_stats['total_time']:.4f} s, "
+                     f"handshake {tls_stats['handshake_time']:.4f} s, session reused {tls_stats['session_reused']}")
+
+    def _get_tls_config(self):
+        if self.tls_config is not None:
+            return self.tls_config
+        # ssl is only imported by connections that use it
+        from jmp_connection.tls import get_default_tls_config
+        return get_default_tls_config()
+
+    def get_tls_stats(self):
+        """
+        :return: the timing of the last TLS upgrade or None if the connection has not been upgraded
+        """
+        return self.tls_stats
 
     """
     Authentication Methods
@@ -81,130 +207,460 @@ class JMPConnection(ConnectionBase):
         self.password = password
         self.attempted_credentials = False
 
-    def wait_for_authentication(self):
+    def wait_for_authentication(self, timeout=None):
         """
-        sends the login and waits for the login to be processed
+        waits for the login to succeed.  returns immediately if it already has.  a refused login keeps waiting
+        because an auth handler may send another LoginMessage
 
-        :return:
+        :param timeout: seconds to wait.  None waits until the login succeeds or the connection closes
+        :return: whether the connection is authenticated
         """
-        self.authentication_wait_event.acquire()
-        self.authentication_wait_event.wait(1000)
-        self.authentication_wait_event.release()
+        self.authentication_wait_event.wait(timeout)
+        return self.authenticated
 
-    def _message_receive_loop(self):
+    def _start_receiving(self):
         """
-        private method used to monitor the socket for incoming messages
+        hands the socket to our fleet if we belong to one, otherwise starts our own reader thread
         """
+        if self.fleet is not None:
+            self._create_input_stream()
+            self.fleet._register(self)
+        else:
+            ConnectionBase._start_receiving(self)
 
-        self.socket_input_stream = SocketInputStream(self.socket)
+    def _create_input_stream(self):
+        self.socket_input_stream = SocketInputStream(self.socket, self.receive_buffer_size,
+                                                     self.max_receive_buffer_size)
 
-        # define our data input stream.  this makes reading the input stream nicer
-        data_input_stream = DataInputStream(self.socket_input_stream)
+    def _message_receive_loop(self):
+        """
+        private method used to monitor the socket for incoming messages
+        """
+        self._create_input_stream()
 
         while True:
             try:
-                self.socket_input_stream.read_available()
+                self._receive_available()
+
+            except Exception as err:
+
+                # if the socket has already been nullified then it was gracefully closed
+                if self.socket_input_stream.is_closed():
+                    break
+
+                self._receive_failed(err)
+                break
 
-                # now try to process as many messages as there are in our stream
-                while self.socket_input_stream.data_available():
-                    # # seek to our next read position
-                    # self.incoming_stream.seek(self.next_read_pos)
+    def _receive_available(self):
+        """
+        receives the data that is available on the socket and dispatches every complete message.  blocks if no
+        data is available.
+        """
+        stream = self.socket_input_stream
+        count = stream.fill()
+        self.last_receive_time = time.monotonic()
+
+        # process every complete message that is now in our stream.  the frames are decoded in place
+        metrics = self.metrics
+        if metrics is None:
+            frames, end_pos = self.frame_decoder.decode(stream.buffer, stream.read_pos, stream.write_pos)
+        else:
+            start_time = time.perf_counter()
+            frames, end_pos = self.frame_decoder.decode(stream.buffer, stream.read_pos, stream.write_pos)
+            metrics.decode_time.observe(time.perf_counter() - start_time)
+            metrics.bytes_in += count
+            metrics.frames_in += len(frames)
+        stream.consume(end_pos - stream.read_pos)
 
-                    # do we have an opening '['
-                    left_bracket = data_input_stream.read_char()
-                    if left_bracket != '[':
-                        #
-                        # we dont need to throw an exception here.  we should just ignore this byte and try the next one
-                        # raise Exception('left bracket expected')
-                        continue
+        recorder = self.recorder
+        if recorder is not None and frames:
+            recorder.record_many(INBOUND, frames)
 
-                    length_string = ""
-                    while True:
-                        next_char = data_input_stream.read_char()
-                        if '0' <= next_char <= '9':
-                            length_string = length_string + next_char
-                        else:
-                            break
-                    length = int(length_string)
+        for payload in frames:
+            self._dispatch(payload)
 
-                    # next char should be a comma
-                    if ',' != next_char:
-                        raise Exception("comma expected")
+    def _receive_failed(self, err):
+        """
+        called when reading from the socket failed.  closes the connection.
+        """
+        if self.metrics is not None:
+            self.metrics.errors += 1
+        logging.error(f"error while reading from {self.host}:{self.port} because {err}\n"
+                      f"{traceback.format_exc()}")
+        # closing alerts the listener handlers that we have lost our connection
+        self._connection_lost()
+
+    def _dispatch(self, payload, on_handled=None):
+        """
+        hands a received message to the dispatcher.  this blocks or raises when the dispatcher queue is full
+        depending on its policy
 
-                    self.next_read_pos = self.incoming_stream.tell()
+        :param payload: the bytes of the message
+        :param on_handled: optional callable run on the worker once the message has been handled
+        """
+        jmp_message = None
+
+        # replies to outstanding requests are completed here on the reader so that a handler waiting on a
+        # request future can never block the reply it is waiting for
+        if self.request_tracker.has_pending():
+            meta_hash = peek_meta_hash(payload, self.codec)
+            if meta_hash is not None and self.request_tracker.is_pending(meta_hash):
+                jmp_message = self._create_message(payload)
+                self.request_tracker.resolve(meta_hash, jmp_message)
+
+        message_type = None
+        if ORDER_MESSAGE_TYPE == self.dispatcher.ordering:
+            message_type = jmp_message.message if jmp_message is not None else peek_message_name(payload)
+
+        if on_handled is None:
+            self.dispatcher.submit(self._message_received, [payload, jmp_message, self.connection_generation],
+                                   connection=self, message_type=message_type)
+        else:
+            self.dispatcher.submit(self._message_received_then, [on_handled, payload, jmp_message,
+                                                                 self.connection_generation],
+                                   connection=self, message_type=message_type)
 
-                    # read the data based on the received length
-                    message_bytes = data_input_stream.read_bytes(length)
+    def _create_message(self, payload):
+        """
+        creates the message object for a received payload.  in lazy mode the payload is not parsed until the
+        json is used
+        """
+        if self.lazy_decode:
+            return create_lazy_message(payload, self.codec)
 
-                    right_bracket = data_input_stream.read_char()
-                    if right_bracket != ']':
-                        raise Exception('right bracket expected')
+        if self.metrics is None:
+            return create_message(self.codec.loads(payload))
 
-                    message = str(message_bytes, 'ascii')
+        start_time = time.perf_counter()
+        jmp_message = create_message(self.codec.loads(payload))
+        self.metrics.parse_time.observe(time.perf_counter() - start_time)
+        return jmp_message
 
-                    # kick a new thread to handle the received message
-                    c_thread = threading.Thread(target=self._message_received, args=[message], daemon=True)
-                    c_thread.start()
+    def get_dispatcher_stats(self):
+        """
+        :return: the queue depth and handler latency of the dispatcher used by this connection
+        """
+        return self.dispatcher.get_stats()
 
-            except Exception as err:
+    def enable_metrics(self, metrics=None):
+        """
+        starts collecting metrics for this connection.  the dispatcher queue depth and the write queue depth are
+        reported as gauges
 
-                # if the socket has already been nullified then it was gracefully closed
-                if self.socket_input_stream.is_closed():
-                    break
+        :param metrics: a ConnectionMetrics to collect into.  one is created if not given
+        :return: the ConnectionMetrics
+        """
+        metrics = ConnectionBase.enable_metrics(self, metrics)
+        metrics.add_gauge("dispatch_queue_depth", self.dispatcher.queue_depth)
+        metrics.add_gauge("pending_requests", self.request_tracker.pending_count)
+        metrics.add_gauge("srtt", lambda: self.rtt.srtt or 0.0)
+        if self.frame_writer is not None:
+            metrics.add_gauge("write_queue_depth", self.frame_writer.pending_count)
+        return metrics
+
+    def get_receive_buffer_stats(self):
+        """
+        :return: the high-water marks and counters of the receive buffer or None if we have not connected
+        """
+        return self.socket_input_stream.get_stats() if self.socket_input_stream is not None else None
 
-                logging.error(f"error while reading from {self.host}:{self.port} because {err}\n"
-                              f"{traceback.format_exc()}")
-                self.close()
-                # alert listener handlers that we have lost our connection
-                self.on_connection(self, connected=False)
+    def _message_received_then(self, on_handled, payload, jmp_message=None, generation=None):
+        try:
+            self._message_received(payload, jmp_message, generation)
+        finally:
+            on_handled()
 
-    def _message_received(self, message):
+    def _message_received(self, payload, jmp_message=None, generation=None):
         """
         Called when a message was received.
-        """
 
-        # get the json object from the message
-        json_obj = json.loads(message)
+        :param payload: the bytes of the message
+        :param jmp_message: the message object if the reader has already created it
+        :param generation: the connection_generation of the socket it was read from.  a message still queued from a
+        socket that has since been lost must not log in or mark the connection as authenticated
+        """
+        if jmp_message is None:
+            jmp_message = self._create_message(payload)
 
-        # create a MonitorMessage object
-        jmp_message = JmpMessage()
-        jmp_message.from_json(json_obj)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(f"jmp_connection: {self.get_host_info()}, recv message: {str(payload, 'ascii', 'replace')}")
 
-        print(f"jmp_connection: {self.get_host_info()}, recv message: {jmp_message.to_json()}")
+        current = self.is_connected() and (generation is None or generation == self.connection_generation)
 
         if "Error" == jmp_message.message:
-            if "Unauthorized" in json_obj['Text']:
+            json_obj = jmp_message.json
+            if current and "Unauthorized" in json_obj['Text']:
 
                 if not self.attempted_credentials:
                     self.send(LoginMessage(self.username, self.password, json_obj['Nonce']))
                     self.attempted_credentials = True
 
                 else:
+                    if self.metrics is not None:
+                        self.metrics.auth_failures += 1
                     self.on_auth(self, authorized=False, nonce=json_obj['Nonce'])
 
         elif "Authenticated" == jmp_message.message:
-            #
-            # now we are ready to use the logged in connection.  see if we have an authentication_wait_event to notify
-            if self.authentication_wait_event and self.authentication_wait_event is not None:
-                self.authentication_wait_event.acquire()
-                self.authentication_wait_event.notify()
-                self.authentication_wait_event.release()
-
-            if not self.authenticated:
-                self.authenticated = True
-                # alert the on_auth handlers and let them know that the connection has
-                # successfully been authenticated
-                self.on_auth(self, authorized=True)
+            if current:
+                self._authenticated()
 
         else:
-            if not self.authenticated:
-                self.authenticated = True
-                # alert the on_auth handlers and let them know that the connection has
-                # successfully been authenticated
-                self.on_auth(self, authorized=True)
+            if current:
+                self._authenticated()
+
+            # alert the on_message handlers and then the handlers for this type of message
+            metrics = self.metrics
+            start_time = time.perf_counter() if metrics is not None else 0.0
 
-            # alert the on_message handlers
             self.on_message_recv(self, jmp_message=jmp_message)
+            message_type_event = self.message_type_handlers.get(jmp_message.message)
+            if message_type_event is not None:
+                message_type_event(self, jmp_message=jmp_message)
+
+            if metrics is not None:
+                metrics.handler_time.observe(time.perf_counter() - start_time)
+
+    def _authenticated(self):
+        """
+        called for the Authenticated message and for any message that shows we are logged in
+        """
+        if not self.authenticated:
+            self.authenticated = True
+            #
+            # now we are ready to use the logged in connection.  wake anyone in wait_for_authentication()
+            self.authentication_wait_event.set()
+            if self.metrics is not None and self.connected_time is not None:
+                self.metrics.auth_latency.observe(time.perf_counter() - self.connected_time)
+            # alert the on_auth handlers and let them know that the connection has
+            # successfully been authenticated
+            self.on_auth(self, authorized=True)
+
+            # TLS 1.3 sends the session ticket after the handshake so keep the session again now that data has
+            # been received
+            sock = self.socket
+            if self.tls_stats is not None and hasattr(sock, "session"):
+                self._get_tls_config().save_session(self.host, self.port, sock.session)
+
+            # requests that were waiting when the last connection was lost are sent again
+            for meta_hash, replay_message in list(self.replay_messages.items()):
+                if self.request_tracker.is_pending(meta_hash):
+                    self.send(replay_message)
+
+    def request(self, jmp_message, timeout=30.0):
+        """
+        Sends the JNIOR message object and returns a future for its reply.  The reply is the message that comes
+        back with the same Meta Hash.  Any number of requests may be outstanding at once.
+
+        :param jmp_message: the message to send
+        :param timeout: seconds to wait for the reply before the future fails with RequestTimeout.  None waits
+        until the connection is closed
+        :return: a concurrent.futures.Future.  cancel() it to stop waiting for the reply
+        """
+        meta_hash = jmp_message.meta_hash
+        if meta_hash is None:
+            raise Exception(f"{jmp_message} does not have a Meta Hash")
+
+        # register before sending so that a fast reply cannot beat us
+        future = self.request_tracker.register(meta_hash, timeout)
+        if REQUESTS_REPLAY == self.request_policy:
+            self.replay_messages[meta_hash] = jmp_message
+            future.add_done_callback(lambda f: self.replay_messages.pop(meta_hash, None))
+        future.add_done_callback(self._request_done_callback(self.rtt, self.metrics, time.perf_counter()))
+        self.send(jmp_message)
+        return future
+
+    @staticmethod
+    def _request_done_callback(rtt, metrics, sent_time):
+        def on_done(future):
+            if future.cancelled():
+                return
+            if future.exception() is None:
+                elapsed = time.perf_counter() - sent_time
+                rtt.observe(elapsed)
+                if metrics is not None:
+                    metrics.request_rtt.observe(elapsed)
+            elif metrics is not None and isinstance(future.exception(), RequestTimeout):
+                metrics.request_timeouts += 1
+        return on_done
+
+    def get_adaptive_timeout(self):
+        """
+        :return: seconds to wait for a reply based on the measured round trip times of this connection
+        """
+        return self.rtt.timeout()
+
+    def get_rtt_stats(self):
+        """
+        :return: a dict with the smoothed round trip time, its variation and the adaptive timeout
+        """
+        return self.rtt.to_dict()
+
+    """
+    Heartbeat
+    """
+    @staticmethod
+    def _heartbeat_request():
+        return RegistryReadMessage([])
+
+    def _start_heartbeat(self):
+        self.missed_heartbeats = 0
+        self.heartbeat_future = None
+        if self.heartbeat_interval is not None:
+            generation = self.connection_generation
+            schedule_heartbeat(self.heartbeat_interval, lambda: self._heartbeat(generation))
+
+    def _heartbeat(self, generation):
+        """
+        runs on the heartbeat thread.  sends a heartbeat when nothing has been received for heartbeat_interval
+
+        :return: the seconds until the next check or None to stop
+        """
+        if generation != self.connection_generation or not self.is_connected():
+            return None
+
+        idle = time.monotonic() - self.last_receive_time
+        if idle < self.heartbeat_interval:
+            return self.heartbeat_interval - idle
+
+        if self.authenticated and (self.heartbeat_future is None or self.heartbeat_future.done()):
+            sent_time = time.monotonic()
+            future = self.request(self.heartbeat_message(), self._heartbeat_timeout())
+            future.add_done_callback(lambda f: self._heartbeat_done(f, generation, sent_time))
+            self.heartbeat_future = future
+        return self.heartbeat_interval
+
+    def _heartbeat_timeout(self):
+        """
+        :return: seconds to wait for a heartbeat reply.  until a round trip has been measured the adaptive timeout is
+        only its default, so a device that goes silent right after login is judged by the heartbeat interval instead
+        """
+        if self.rtt.samples:
+            return self.get_adaptive_timeout()
+        return min(self.get_adaptive_timeout(), max(self.rtt.min_timeout, 2 * self.heartbeat_interval))
+
+    def _heartbeat_done(self, future, generation, sent_time):
+        if future.cancelled() or generation != self.connection_generation:
+            return
+        if future.exception() is None or self.last_receive_time > sent_time:
+            # anything received since the heartbeat was sent shows that the connection is alive
+            self.missed_heartbeats = 0
+            return
+        if not isinstance(future.exception(), RequestTimeout):
+            return
+
+        self.missed_heartbeats += 1
+        if self.metrics is not None:
+            self.metrics.heartbeats_missed += 1
+        if self.missed_heartbeats >= self.heartbeat_misses:
+            logging.error(f"{self.get_host_info()}: no reply to {self.missed_heartbeats} heartbeats.  the "
+                          f"connection is lost")
+            # we are on the thread that expires the requests of every connection.  the teardown runs the connection
+            # handlers and waits for the reader so it is done elsewhere
+            threading.Thread(target=self._connection_lost, daemon=True, name="jmp-heartbeat-lost").start()
+
+    def set_keepalive(self, idle):
+        """
+        turns on TCP keepalive so that the operating system detects a peer that has gone away
+
+        :param idle: seconds of idle before the first probe.  None turns keepalive off
+        """
+        self.tcp_keepalive = idle
+        if self.socket is None:
+            return
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 0 if idle is None else 1)
+        if idle is not None:
+            # the options are not available on every platform
+            if hasattr(socket, "TCP_KEEPIDLE"):
+                self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, max(1, int(idle)))
+            if hasattr(socket, "TCP_KEEPINTVL"):
+                self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, int(idle) // 3))
+            if hasattr(socket, "TCP_KEEPCNT"):
+                self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
+
+    async def request_async(self, jmp_message, timeout=30.0):
+        """
+        awaitable version of request() for use from an asyncio event loop
+
+        :return: the reply message
+        """
+        import asyncio
+        return await asyncio.wrap_future(self.request(jmp_message, timeout))
+
+    def download(self, path, dest, **options):
+        """
+        Downloads a file from the JNIOR with several File Read requests in flight at once.  See FileDownloader
+        for the options.
+
+        :param path: the path of the file on the JNIOR
+        :param dest: a filename or a writable binary file object
+        :return: a dict with the size, elapsed time and throughput of the download
+        """
+        return FileDownloader(self, **options).download(path, dest)
+
+    def close(self):
+        """
+        closes the connection and fails any requests that are still waiting for a reply.  a reconnect that is in
+        progress is stopped.  the worker of a dispatcher that this connection created exits once the messages
+        already queued have been handled.  it is started again if the connection is reconnected
+        """
+        self.reconnect_stop_event.set()
+        self._close_socket()
+        self.request_tracker.fail_all(Exception(f"connection to {self.host}:{self.port} closed"))
+        if self.owns_dispatcher:
+            self.dispatcher.shutdown(wait=False)
+
+    def _close_socket(self):
+        if self.fleet is not None and self.socket is not None:
+            self.fleet._unregister(self)
+        if self.frame_writer is not None:
+            self.frame_writer.stop()
+        ConnectionBase.close(self)
+
+    def _connection_lost(self):
+        """
+        called when the socket failed.  closes the socket and starts reconnecting if reconnect is enabled
+        """
+        if not self.reconnect_enabled or self.reconnect_stop_event.is_set():
+            self.close()
+            return
+
+        self._close_socket()
+        if REQUESTS_FAIL == self.request_policy:
+            self.request_tracker.fail_all(Exception(f"connection to {self.host}:{self.port} lost"))
+
+        with self.reconnect_lock:
+            if self.reconnect_thread is not None and self.reconnect_thread.is_alive():
+                return
+            self.reconnect_thread = threading.Thread(target=self._reconnect_loop, daemon=True, name="jmp-reconnect")
+            self.reconnect_thread.start()
+
+    def _reconnect_delay(self, attempt):
+        """
+        :return: the seconds to wait before the given attempt.  exponential backoff with jitter
+        """
+        delay = min(self.reconnect_max_delay, self.reconnect_min_delay * (2 ** attempt))
+        return random.uniform(self.reconnect_min_delay, max(self.reconnect_min_delay, delay))
+
+    def _reconnect_loop(self):
+        attempt = 0
+        while not self.reconnect_stop_event.is_set():
+            if self.reconnect_max_attempts is not None and attempt >= self.reconnect_max_attempts:
+                logging.error(f"giving up reconnecting to {self.host}:{self.port} after {attempt} attempts")
+                self.close()
+                return
+
+            if self.reconnect_stop_event.wait(self._reconnect_delay(attempt)):
+                return
+
+            attempt += 1
+            self.reconnect_attempts += 1
+            logging.info(f"{self.get_host_info()}: reconnect attempt {attempt}")
+
+            # the connection may have been lost again while the login was being sent
+            if ConnectionBase.connect(self) and self.is_connected():
+                if self.metrics is not None:
+                    self.metrics.reconnects += 1
+                return
 
     def send(self, jmp_message) -> None:
         """
@@ -214,26 +670,97 @@ class JMPConnection(ConnectionBase):
         :return: None
         """
         try:
-            # get the json object as a string
-            jmp_message_json_string = json.dumps(jmp_message.to_json())
-
-            # format the message in the JMP format [length, message]
-            jmp_formatted_string = f"[{len(jmp_message_json_string)},{jmp_message_json_string}]"
+            self._write(self._encode(jmp_message), 1)
+        except Exception as err:
+            self._send_failed(err, jmp_message)
 
-            if self.socket is None:
-                raise Exception("socket is not open")
+    def send_many(self, jmp_messages) -> None:
+        """
+        Used to send several JNIOR message objects.  The messages are encoded into one buffer and written
+        together.
 
-            # send to our connection
-            self.socket.send(bytes(jmp_formatted_string, 'utf-8'))
-            print(f"{str(datetime.now())[:-3]}:     sent: {jmp_message_json_string}")
+        :param jmp_messages: a list of messages
+        :return: None
+        """
+        try:
+            self._write(b''.join(self._encode(jmp_message) for jmp_message in jmp_messages), len(jmp_messages))
         except Exception as err:
-            print(f"{str(datetime.now())[:-3]}: "
-                  f"unable to send {jmp_message} to {self.host}:{self.port} because {err}\n"
-                  f"{traceback.format_exc()}")
-            # close and nullify our socket
-            self.close()
-            # alert listener handlers that we have lost our connection
-            self.on_connection(self, connected=False)
+            self._send_failed(err, f"{len(jmp_messages)} messages")
+
+    def _encode(self, jmp_message):
+        # get the json object as ascii bytes
+        payload = self.codec.dumps(jmp_message.to_json())
+        if self.recorder is not None:
+            self.recorder.record(OUTBOUND, payload)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(f"{self.get_host_info()} sent: {str(payload, 'ascii')}")
+
+        # the JMP format [length,message]
+        return encode_frame(payload)
+
+    def _write(self, frame, frame_count):
+        if self.socket is None:
+            raise Exception("socket is not open")
+
+        if self.metrics is not None:
+            self.metrics.frames_out += frame_count
+            self.metrics.bytes_out += len(frame)
+
+        if self.frame_writer is not None:
+            self.frame_writer.write(frame)
+        else:
+            with self.send_lock:
+                send_all(self.socket, frame)
+
+    def _send_failed(self, err, what):
+        """
+        called when a write to the socket failed.  closes the connection.
+        """
+        if self.metrics is not None:
+            self.metrics.errors += 1
+        logging.error(f"unable to send {what} to {self.host}:{self.port} because {err}\n"
+                      f"{traceback.format_exc()}")
+        # close and nullify our socket.  closing alerts the listener handlers that we have lost our connection
+        self._connection_lost()
+
+    def set_recorder(self, recorder):
+        """
+        starts or stops recording the frames of this connection
+
+        :param recorder: a FrameRecorder or None to stop recording
+        """
+        self.recorder = recorder
+
+    def flush(self, timeout=None):
+        """
+        waits for the queued messages to be written to the socket
+
+        :param timeout: seconds to wait.  None waits forever
+        :return: whether everything was written
+        """
+        return self.frame_writer.flush(timeout) if self.frame_writer is not None else True
+
+    def set_no_delay(self, no_delay):
+        """
+        sets TCP_NODELAY on the socket.  with it set each write is sent immediately.  the write queue already
+        coalesces bursts so this is the default.
+
+        :param no_delay: whether to disable Nagle's algorithm
+        """
+        self.tcp_nodelay = no_delay
+        if self.socket is not None:
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1 if no_delay else 0)
+
+    def connected(self):
+        self.connection_generation += 1
+        self.set_no_delay(self.tcp_nodelay)
+        if self.tcp_keepalive is not None:
+            self.set_keepalive(self.tcp_keepalive)
+        self.last_receive_time = time.monotonic()
+        self._start_heartbeat()
+        if self.use_tls:
+            self.start_tls()
+        ConnectionBase.connected(self)
 
     def get_console_session(self):
         """
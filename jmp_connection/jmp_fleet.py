@@ -0,0 +1,287 @@
+import selectors
+import socket
+import threading
+import time
+
+from jmp_connection.jmp_connection import JMPConnection
+from jmp_connection.message_dispatcher import MessageDispatcher
+from jmp_connection.output_control import control_outputs
+from jmp_connection.socket_input_stream import would_block
+
+"""
+Multiplexes many JMP connections over a few selector driven I/O threads.  Without a fleet every connection owns a
+reader thread.  With a fleet the sockets are registered with a selector and read only when data has arrived, and the
+received messages are handled by one shared MessageDispatcher.
+"""
+
+
+class _IOThread(object):
+    def __init__(self, fleet, index):
+        """
+        a selector and the thread that services it
+        """
+        self.fleet = fleet
+        self.selector = selectors.DefaultSelector()
+        self.connections = set()
+        self.lock = threading.Lock()
+        self.pending = []
+
+        # writing to the waker interrupts select so that registrations from other threads take effect
+        self.waker_recv, self.waker_send = socket.socketpair()
+        self.waker_recv.setblocking(False)
+        self.selector.register(self.waker_recv, selectors.EVENT_READ, None)
+
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True, name=f"jmp-fleet-io-{index}")
+        self.thread.start()
+
+    def register(self, connection):
+        with self.lock:
+            self.connections.add(connection)
+            self.pending.append((True, connection, connection.socket))
+        self._wake()
+
+    def unregister(self, connection):
+        with self.lock:
+            self.connections.discard(connection)
+            self.pending.append((False, connection, connection.socket))
+        if threading.current_thread() is self.thread:
+            self._apply_pending()
+        else:
+            self._wake()
+
+    def stop(self):
+        self.running = False
+        self._wake()
+
+    def _wake(self):
+        try:
+            self.waker_send.send(b'\0')
+        except OSError:
+            pass
+
+    def _apply_pending(self):
+        with self.lock:
+            pending = self.pending
+            self.pending = []
+
+        for add, connection, sock in pending:
+            # the connection may have failed and closed its socket before we got here.  an error must not stop the
+            # thread that services every other socket
+            try:
+                if add:
+                    if sock is not None and 0 <= sock.fileno():
+                        self.selector.register(sock, selectors.EVENT_READ, connection)
+                else:
+                    self.selector.unregister(sock)
+            except (ValueError, KeyError, OSError):
+                pass
+
+    def _run(self):
+        while self.running:
+            self._apply_pending()
+
+            for key, _ in self.selector.select():
+                connection = key.data
+                if connection is None:
+                    try:
+                        self.waker_recv.recv(1024)
+                    except BlockingIOError:
+                        pass
+                    continue
+
+                self._service(connection, key.fileobj)
+
+        self.selector.close()
+        self.waker_recv.close()
+        self.waker_send.close()
+
+    def _service(self, connection, sock):
+        try:
+            connection._receive_available()
+
+            # a TLS socket may hold decrypted data that the selector cannot see
+            while connection.socket is sock and hasattr(sock, 'pending') and 0 < sock.pending():
+                connection._receive_available()
+
+        except Exception as err:
+            # the selector reports a TLS socket readable when only part of a record has arrived
+            if would_block(err) or connection.socket_input_stream.is_closed():
+                return
+            connection._receive_failed(err)
+
+
+class JMPFleet(object):
+    def __init__(self, io_threads=1, dispatcher=None):
+        """
+        A manager for many JNIOR connections.
+
+        :param io_threads: the number of selector threads to spread the sockets over
+        :param dispatcher: the MessageDispatcher that handles the messages for every device.  a four worker
+        dispatcher that keeps each connection in order is created if one is not given
+        """
+        self.dispatcher = dispatcher if dispatcher is not None else MessageDispatcher(workers=4)
+        self.io_threads = [_IOThread(self, i) for i in range(io_threads)]
+        self.connections = {}
+        self.lock = threading.Lock()
+
+        # statistics
+        self.auth_failures = 0
+        self.connects = 0
+        self.disconnects = 0
+        self.last_stats_time = time.monotonic()
+        self.last_bytes_received = 0
+
+    def add(self, host, port=9220, username=None, password=None, message_handler=None, auth_handler=None,
+            connection_handler=None, **connection_options):
+        """
+        creates a connection for a device, adds it to the fleet and connects it
+
+        :param host: the device host
+        :param port: the JMP port
+        :param username: the login username
+        :param password: the login password
+        :param message_handler: optional handler for this device's on_message_recv event
+        :param auth_handler: optional handler for this device's on_auth event
+        :param connection_handler: optional handler for this device's on_connection event
+        :param connection_options: other keyword arguments for the JMPConnection constructor
+        :return: the JMPConnection
+        """
+        # a writer thread per device would defeat the purpose of the fleet.  sends are written on the caller
+        connection_options.setdefault('coalesce_writes', False)
+        connection = JMPConnection(dispatcher=self.dispatcher, **connection_options)
+        if username is not None:
+            connection.set_credentials(username, password)
+        if message_handler is not None:
+            connection.add_message_recv_handler(message_handler)
+        if auth_handler is not None:
+            connection.add_auth_handler(auth_handler)
+        if connection_handler is not None:
+            connection.add_connection_handler(connection_handler)
+
+        self.add_connection(connection)
+        connection.connect(host, port)
+        return connection
+
+    def add_connection(self, connection):
+        """
+        adds a connection that has not been connected yet.  when it connects its socket will be serviced by the
+        fleet instead of a reader thread
+
+        :param connection: a JMPConnection
+        """
+        if connection.is_connected():
+            raise Exception("the connection must be added to the fleet before it is connected")
+
+        connection.fleet = self
+        connection.add_auth_handler(self._auth_handler)
+        connection.add_connection_handler(self._connection_handler)
+        with self.lock:
+            self.connections[id(connection)] = connection
+
+    def remove(self, connection):
+        """
+        closes a connection and removes it from the fleet
+
+        :param connection: a JMPConnection that was added to this fleet
+        """
+        with self.lock:
+            if self.connections.pop(id(connection), None) is None:
+                return
+
+        connection.close()
+        connection.remove_auth_handler(self._auth_handler)
+        connection.remove_connection_handler(self._connection_handler)
+        connection.fleet = None
+
+    def get_connections(self):
+        with self.lock:
+            return list(self.connections.values())
+
+    def find(self, host):
+        """
+        :return: the connections to the given host
+        """
+        return [connection for connection in self.get_connections() if connection.host == host]
+
+    def control(self, commands, connections=None, deadline=5.0, stores=None):
+        """
+        sends output commands to the devices in parallel and waits for the outputs to reach the commanded states.
+        see control_outputs()
+
+        :param commands: a list of ControlOutputMessages, like CloseMessage, OpenMessage or ToggleMessage
+        :param connections: the connections to control.  defaults to every connection in the fleet
+        :param deadline: seconds by which every device must have carried out the commands
+        :param stores: an optional dict of connection to the IOStateStore attached to it
+        :return: a dict of connection to ControlResult
+        """
+        return control_outputs(self.get_connections() if connections is None else connections, commands, deadline,
+                               stores)
+
+    def close(self):
+        """
+        closes every connection and stops the I/O threads
+        """
+        for connection in self.get_connections():
+            self.remove(connection)
+        for io_thread in self.io_threads:
+            io_thread.stop()
+
+    def _register(self, connection):
+        # the I/O thread with the fewest sockets gets the new one
+        io_thread = min(self.io_threads, key=lambda t: len(t.connections))
+        # a read that would block, like one for the rest of a TLS record, must not stall the other sockets of the
+        # I/O thread
+        connection.socket.setblocking(False)
+        connection.fleet_io_thread = io_thread
+        io_thread.register(connection)
+
+    def _unregister(self, connection):
+        io_thread = connection.fleet_io_thread
+        if io_thread is not None:
+            connection.fleet_io_thread = None
+            io_thread.unregister(connection)
+
+    def _auth_handler(self, connection, authorized, nonce=None):
+        if not authorized:
+            with self.lock:
+                self.auth_failures += 1
+
+    def _connection_handler(self, connection, connected, socket=None):
+        with self.lock:
+            if connected:
+                self.connects += 1
+            else:
+                self.disconnects += 1
+
+    def get_stats(self):
+        """
+        :return: a dict of aggregate statistics for the fleet.  the byte rate is measured since the last call
+        """
+        connections = self.get_connections()
+        now = time.monotonic()
+
+        bytes_received = 0
+        for connection in connections:
+            stream = connection.socket_input_stream
+            if stream is not None:
+                bytes_received += stream.bytes_received
+
+        with self.lock:
+            elapsed = now - self.last_stats_time
+            rate = (bytes_received - self.last_bytes_received) / elapsed if 0 < elapsed else 0.0
+            self.last_stats_time = now
+            self.last_bytes_received = bytes_received
+
+            return {
+                "devices": len(connections),
+                "connected": sum(1 for c in connections if c.is_connected()),
+                "authenticated": sum(1 for c in connections if c.is_authenticated()),
+                "auth_failures": self.auth_failures,
+                "connects": self.connects,
+                "disconnects": self.disconnects,
+                "bytes_received": bytes_received,
+                "bytes_per_second": max(rate, 0.0),
+                "queue_depth": self.dispatcher.queue_depth(),
+                "io_threads": len(self.io_threads),
+            }
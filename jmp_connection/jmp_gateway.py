@@ -0,0 +1,372 @@
+import collections
+import concurrent.futures
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from jmp_connection.frame_decoder import FrameDecoder, FrameDecodeError, encode_frame
+from jmp_connection.frame_writer import FrameWriter
+from jmp_connection.jmp_connection import JMPConnection
+from jmp_connection.jmp_messages import JmpMessage, compute_auth_digest
+from jmp_connection.json_codec import JsonCodec, get_codec
+
+"""
+A JMP gateway holds one authenticated connection to a JNIOR and lets many JMP clients share it.  Clients connect to
+the gateway as if it were the JNIOR.  Monitor messages from the device are sent to every client, requests are
+forwarded with their Meta Hash rewritten so that each reply goes back to the client that asked, and repeated reads
+are answered from a cache.
+"""
+
+# requests whose replies can be served from the cache
+CACHEABLE_MESSAGES = ("Registry Read", "File List", "File Read")
+
+# requests that change what the cacheable requests return.  forwarding one clears the cache
+INVALIDATING_MESSAGES = ("Registry Write", "File Write", "File Delete", "File Rename")
+
+
+class JMPGateway(object):
+    def __init__(self, host, port=9220, username=None, password=None, listen_host="127.0.0.1", listen_port=9220,
+                 client_username=None, client_password=None, cache_ttl=5.0, max_cache_entries=1024,
+                 request_timeout=30.0, broadcast_messages=("Monitor",), codec=None, **connection_options):
+        """
+        A gateway for one device.  Run a gateway per device to share several devices.
+
+        :param host: the device host
+        :param port: the device JMP port
+        :param username: the login username for the device
+        :param password: the login password for the device
+        :param listen_host: the address the gateway accepts clients on
+        :param listen_port: the port the gateway accepts clients on.  0 picks a free port, see get_address()
+        :param client_username: the username clients must log in to the gateway with.  defaults to username
+        :param client_password: the password clients must log in to the gateway with.  defaults to password
+        :param cache_ttl: seconds a cached reply is served.  0 disables the cache
+        :param max_cache_entries: the most replies to cache.  the least recently used is evicted first
+        :param request_timeout: seconds to wait for the device to reply to a forwarded request
+        :param broadcast_messages: the unsolicited message types that are sent to every client
+        :param codec: the JsonCodec, or the name of one, used for the client connections
+        :param connection_options: other keyword arguments for the upstream JMPConnection
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.listen_host = listen_host
+        self.listen_port = listen_port
+        self.client_username = client_username if client_username is not None else username
+        self.client_password = client_password if client_password is not None else password
+        self.cache_ttl = cache_ttl
+        self.max_cache_entries = max_cache_entries
+        self.request_timeout = request_timeout
+        self.broadcast_messages = tuple(broadcast_messages)
+        self.codec = codec if isinstance(codec, JsonCodec) else get_codec(codec)
+        self.connection_options = connection_options
+
+        self.upstream = None
+        self.server_socket = None
+        self.running = False
+
+        self.lock = threading.Lock()
+        self.clients = set()
+        # cache key -> (reply json, expire time)
+        self.cache = collections.OrderedDict()
+        # cache key -> the (client, meta) pairs waiting for the reply of the request that is in flight
+        self.in_flight = {}
+        # the last broadcast frame of each type so that a new client starts with the current state
+        self.last_broadcast = {}
+
+        # statistics
+        self.forwarded = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.broadcasts = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def start(self):
+        """
+        connects to the device and starts accepting clients
+
+        :return: the (host, port) the gateway is listening on
+        """
+        self.upstream = JMPConnection(**self.connection_options)
+        if self.username is not None:
+            self.upstream.set_credentials(self.username, self.password)
+        for message_name in self.broadcast_messages:
+            self.upstream.add_message_recv_handler(self._broadcast_handler, message_name)
+        self.upstream.connect(self.host, self.port)
+
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.listen_host, self.listen_port))
+        self.server_socket.listen(128)
+        self.listen_port = self.server_socket.getsockname()[1]
+        self.running = True
+
+        threading.Thread(target=self._accept_loop, daemon=True, name="jmp-gateway-accept").start()
+        return self.get_address()
+
+    def stop(self):
+        """
+        closes every client and the device connection
+        """
+        self.running = False
+        if self.server_socket is not None:
+            try:
+                # shutdown wakes the accept thread
+                self.server_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.server_socket.close()
+            self.server_socket = None
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            client.close()
+        if self.upstream is not None:
+            self.upstream.close()
+
+    def get_address(self):
+        return self.listen_host, self.listen_port
+
+    def invalidate(self):
+        """
+        clears the reply cache
+        """
+        with self.lock:
+            self.cache.clear()
+
+    def get_stats(self):
+        """
+        :return: a dict of the client count and request counters
+        """
+        with self.lock:
+            return {
+                "clients": len(self.clients),
+                "authenticated_clients": sum(1 for client in self.clients if client.authenticated),
+                "upstream_authenticated": self.upstream is not None and self.upstream.is_authenticated(),
+                "forwarded": self.forwarded,
+                "cache_hits": self.cache_hits,
+                "coalesced": self.coalesced,
+                "cache_entries": len(self.cache),
+                "broadcasts": self.broadcasts,
+                "timeouts": self.timeouts,
+                "failures": self.failures,
+            }
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                sock, _ = self.server_socket.accept()
+            except OSError:
+                break
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = _GatewayClient(self, sock)
+            with self.lock:
+                self.clients.add(client)
+            threading.Thread(target=client.run, daemon=True, name="jmp-gateway-client").start()
+
+    def _remove_client(self, client):
+        with self.lock:
+            self.clients.discard(client)
+            # replies still in flight for this client are dropped when they arrive
+            for waiters in self.in_flight.values():
+                waiters[:] = [waiter for waiter in waiters if waiter[0] is not client]
+
+    def _client_authenticated(self, client):
+        with self.lock:
+            frames = list(self.last_broadcast.values())
+        for frame in frames:
+            client.write(frame)
+
+    def _broadcast_handler(self, connection, jmp_message):
+        frame = encode_frame(self.codec.dumps(jmp_message.json))
+        with self.lock:
+            self.last_broadcast[jmp_message.message] = frame
+            clients = [client for client in self.clients if client.authenticated]
+            self.broadcasts += 1
+        for client in clients:
+            client.write(frame)
+
+    def _forward(self, client, request):
+        """
+        forwards a request from an authenticated client to the device
+        """
+        message_name = request.get("Message")
+        meta = request.get("Meta")
+        meta_hash = meta.get("Hash") if isinstance(meta, dict) else None
+
+        if message_name in INVALIDATING_MESSAGES:
+            self.invalidate()
+
+        if meta_hash is None:
+            # nothing can be routed back so just pass it on
+            with self.lock:
+                self.forwarded += 1
+            self.upstream.send(_raw_message(request))
+            return
+
+        key = None
+        if 0 < self.cache_ttl and message_name in CACHEABLE_MESSAGES:
+            key = json.dumps({name: value for name, value in request.items() if "Meta" != name}, sort_keys=True)
+
+        reply = None
+        with self.lock:
+            if key is not None:
+                entry = self.cache.get(key)
+                if entry is not None and entry[1] > time.monotonic():
+                    self.cache.move_to_end(key)
+                    self.cache_hits += 1
+                    reply = entry[0]
+                elif key in self.in_flight:
+                    # the same read is already on its way to the device
+                    self.in_flight[key].append((client, meta))
+                    self.coalesced += 1
+                    return
+                else:
+                    self.in_flight[key] = [(client, meta)]
+            if reply is None:
+                self.forwarded += 1
+
+        if reply is not None:
+            client.send_reply(reply, meta)
+            return
+
+        # the device sees a Meta Hash of our own so that replies to different clients cannot collide
+        upstream_message = JmpMessage()
+        upstream_hash = upstream_message.meta_hash
+        upstream_message.json = dict(request, Meta=dict(meta, Hash=upstream_hash))
+
+        try:
+            future = self.upstream.request(upstream_message, self.request_timeout)
+        except Exception as err:
+            logging.warning(f"gateway unable to forward {message_name} to {self.host}:{self.port} because {err}")
+            with self.lock:
+                waiters = self.in_flight.pop(key, []) if key is not None else [(client, meta)]
+                self.failures += 1
+            _send_error(waiters, f"unable to forward {message_name} to the device: {err}")
+            return
+        future.add_done_callback(lambda f: self._reply_received(f, client, meta, key))
+
+    def _reply_received(self, future, client, meta, key):
+        if future.cancelled():
+            return
+        err = future.exception()
+        reply = future.result().json if err is None else None
+
+        with self.lock:
+            if key is None:
+                waiters = [(client, meta)]
+            else:
+                waiters = self.in_flight.pop(key, [])
+                # a refusal is only the answer for now.  the next client asks the device again
+                if reply is not None and "Error" != reply.get("Message"):
+                    self.cache[key] = (reply, time.monotonic() + self.cache_ttl)
+                    self.cache.move_to_end(key)
+                    while len(self.cache) > self.max_cache_entries:
+                        self.cache.popitem(last=False)
+            if isinstance(err, concurrent.futures.TimeoutError):
+                self.timeouts += 1
+            elif err is not None:
+                self.failures += 1
+
+        if err is not None:
+            logging.warning(f"gateway request to {self.host}:{self.port} failed because {err}")
+            # every client waiting on the request gets an answer so that none of them waits for its own timeout
+            _send_error(waiters, f"the device did not reply: {err}")
+            return
+
+        for waiter, waiter_meta in waiters:
+            waiter.send_reply(reply, waiter_meta)
+
+
+def _send_error(waiters, text):
+    """
+    sends an Error reply to each (client, meta) waiter
+    """
+    for waiter, waiter_meta in waiters:
+        waiter.send_json({"Message": "Error", "Text": text, "Meta": waiter_meta})
+
+
+def _raw_message(json_obj):
+    jmp_message = object.__new__(JmpMessage)
+    jmp_message.json = json_obj
+    return jmp_message
+
+
+class _GatewayClient(object):
+    def __init__(self, gateway, sock):
+        """
+        a client connected to the gateway.  replies and broadcasts are queued on a FrameWriter so that a slow
+        client cannot hold up the others
+        """
+        self.gateway = gateway
+        self.socket = sock
+        self.frame_writer = FrameWriter(self)
+        self.authenticated = False
+        self.nonce = os.urandom(8).hex()
+
+    def close(self):
+        self.authenticated = False
+        self.frame_writer.stop()
+        sock = self.socket
+        self.socket = None
+        if sock is not None:
+            try:
+                # shutdown wakes the client thread that is blocked in recv
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def write(self, frame):
+        if self.socket is not None:
+            self.frame_writer.write(frame)
+
+    def send_json(self, json_obj):
+        self.write(encode_frame(self.gateway.codec.dumps(json_obj)))
+
+    def send_reply(self, reply, meta):
+        """
+        sends a reply from the device with the Meta the client sent
+        """
+        self.send_json(dict(reply, Meta=meta))
+
+    def _send_failed(self, err, what):
+        logging.debug(f"gateway unable to send {what} to a client because {err}")
+        self.close()
+
+    def run(self):
+        decoder = FrameDecoder()
+        try:
+            while self.socket is not None:
+                data = self.socket.recv(1024 * 64)
+                if not data:
+                    break
+                for payload in decoder.feed(data):
+                    self._handle(self.gateway.codec.loads(payload))
+        except (OSError, ValueError, FrameDecodeError) as err:
+            logging.debug(f"gateway client closed because {err}")
+        finally:
+            self.gateway._remove_client(self)
+            self.close()
+
+    def _handle(self, request):
+        if self.authenticated:
+            self.gateway._forward(self, request)
+            return
+
+        # clients log in to the gateway the same way they log in to a JNIOR
+        meta = request.get("Meta", {})
+        digest = request.get("Auth-Digest")
+        gateway = self.gateway
+        if digest is not None and digest == compute_auth_digest(gateway.client_username, gateway.client_password,
+                                                                self.nonce):
+            self.authenticated = True
+            self.send_json({"Message": "Authenticated", "Meta": meta})
+            gateway._client_authenticated(self)
+        else:
+            self.nonce = os.urandom(8).hex()
+            self.send_json({"Message": "Error", "Text": "401 Unauthorized", "Nonce": self.nonce, "Meta": meta})
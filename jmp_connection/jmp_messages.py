@@ -1,11 +1,60 @@
 import copy
-import hashlib
 import json
-import uuid
+import os
+
+
+def compute_auth_digest(username, password, nonce):
+    """
+    :return: the Auth-Digest for a login, username:md5(username:nonce:password)
+    """
+    import hashlib
+    md5_hash = hashlib.md5(bytes(f"{username}:{nonce}:{password}", 'utf'))
+    digest = str(md5_hash.hexdigest())
+    return username + ":" + digest
+
+
+# maps the JMP Message name to the class that represents it
+MESSAGE_TYPES = {}
+
+
+def register_message_type(message_name):
+    """
+    class decorator that registers a JmpMessage subclass for a JMP Message name so that received messages with
+    that name are created as that class
+
+    :param message_name: the value of the Message field
+    """
+    def register(cls):
+        cls.message_name = message_name
+        MESSAGE_TYPES[message_name] = cls
+        return cls
+    return register
+
+
+def get_message_class(message_name):
+    """
+    :return: the class registered for the Message name or JmpMessage
+    """
+    return MESSAGE_TYPES.get(message_name, JmpMessage)
+
+
+def create_message(json_obj):
+    """
+    creates the registered message object for a received message without calling its constructor
+
+    :param json_obj: the parsed message
+    :return: a JmpMessage or the registered subclass
+    """
+    jmp_message = object.__new__(MESSAGE_TYPES.get(json_obj.get("Message"), JmpMessage))
+    jmp_message.json = json_obj
+    return jmp_message
 
 
 class JmpMessage(object):
+    __slots__ = ("json",)
+
     EMPTY = {}
+    message_name = None
 
     def __init__(self, message=None):
         if message is None:
@@ -13,7 +62,7 @@ class JmpMessage(object):
 
         self.json = {
             "Message": message,
-            "Meta": {"Hash": str(uuid.uuid4())[:8]}
+            "Meta": {"Hash": os.urandom(4).hex()}
         }
 
     def dup(self, jmp_message):
@@ -33,6 +82,11 @@ class JmpMessage(object):
     def meta(self):
         return self.json["Meta"] if "Meta" in self.json else None
 
+    @property
+    def meta_hash(self):
+        meta = self.meta
+        return meta.get("Hash") if meta is not None else None
+
     def from_json(self, json):
         self.json = json
 
@@ -41,21 +95,22 @@ class JmpMessage(object):
 
 
 class LoginMessage(JmpMessage):
+    __slots__ = ()
+
     def __init__(self, username, password, nonce):
         JmpMessage.__init__(self)
 
-        md5_hash = hashlib.md5(bytes(f"{username}:{nonce}:{password}", 'utf'))
-        digest = str(md5_hash.hexdigest())
-        digest = username + ":" + digest
-
-        self.json["Auth-Digest"] = digest
+        self.json["Auth-Digest"] = compute_auth_digest(username, password, nonce)
 
     @property
     def auth_digest(self):
         return self.json["Auth-Digest"]
 
 
+@register_message_type("Monitor")
 class MonitorMessage(JmpMessage):
+    __slots__ = ()
+
     def __init__(self):
         JmpMessage.__init__(self)
 
@@ -85,6 +140,8 @@ class MonitorMessage(JmpMessage):
 
 
 class ControlOutputMessage(JmpMessage):
+    __slots__ = ()
+
     def __init__(self, command, channel):
         JmpMessage.__init__(self, "Control")
         self.json["Command"] = command
@@ -92,19 +149,42 @@ class ControlOutputMessage(JmpMessage):
 
 
 class CloseMessage(ControlOutputMessage):
+    __slots__ = ()
+
     def __init__(self, channel, duration=None):
         ControlOutputMessage.__init__(self, "Close", channel)
         if duration is not None:
             self.json["Duration"] = duration
 
 
+class OpenMessage(ControlOutputMessage):
+    __slots__ = ()
+
+    def __init__(self, channel, duration=None):
+        ControlOutputMessage.__init__(self, "Open", channel)
+        if duration is not None:
+            self.json["Duration"] = duration
+
+
+class ToggleMessage(ControlOutputMessage):
+    __slots__ = ()
+
+    def __init__(self, channel):
+        ControlOutputMessage.__init__(self, "Toggle", channel)
+
+
 class FileListMessage(JmpMessage):
+    __slots__ = ()
+
     def __init__(self, folder="/"):
         JmpMessage.__init__(self, "File List")
         self.json["Folder"] = folder
 
 
+@register_message_type("File List Response")
 class FileListResponseMessage(JmpMessage):
+    __slots__ = ()
+
     def __init__(self):
         JmpMessage.__init__(self)
 
@@ -120,10 +200,16 @@ class FileListResponseMessage(JmpMessage):
 
     @property
     def contents(self):
+        """
+        :return: a list with a dict for each entry in the folder.  Name is the entry name, Type is "Folder" or
+            "File", Size is the file size in bytes and Modified is the modification time in milliseconds
+        """
         return self.json["Content"]
 
 
 class FileReadMessage(JmpMessage):
+    __slots__ = ()
+
     def __init__(self, filename, offset=None, limit=1024*16):
         JmpMessage.__init__(self, "File Read")
 
@@ -135,7 +221,10 @@ class FileReadMessage(JmpMessage):
             self.json["Offset"] = offset
 
 
+@register_message_type("File Read Response")
 class FileReadResponseMessage(JmpMessage):
+    __slots__ = ()
+
     def __init__(self):
         JmpMessage.__init__(self)
 
@@ -177,12 +266,17 @@ class FileReadResponseMessage(JmpMessage):
 
 
 class RegistryReadMessage(JmpMessage):
+    __slots__ = ()
+
     def __init__(self, keys=[]):
         JmpMessage.__init__(self, "Registry Read")
         self.json["Keys"] = keys
 
 
+@register_message_type("Registry Read Response")
 class RegistryResponseMessage(JmpMessage):
+    __slots__ = ()
+
     def __init__(self):
         JmpMessage.__init__(self)
 
@@ -192,6 +286,8 @@ class RegistryResponseMessage(JmpMessage):
 
 
 class PostMessage(JmpMessage):
+    __slots__ = ()
+
     def __init__(self, number, content_json):
         JmpMessage.__init__(self, "Post Message")
         self.json["Number"] = number
@@ -11,6 +11,9 @@ class JniorEvent(object):
         self.__event_handlers.remove(handler)
         return self
 
+    def __len__(self):
+        return len(self.__event_handlers)
+
     def __call__(self, *args, **kwargs):
         for event_handler in self.__event_handlers:
             event_handler(*args, **kwargs)
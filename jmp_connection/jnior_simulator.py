@@ -0,0 +1,326 @@
+import base64
+import json
+import logging
+import os
+import socket
+import ssl
+import threading
+import time
+
+from jmp_connection.frame_decoder import FrameDecoder, FrameDecodeError, encode_frame
+from jmp_connection.jmp_messages import compute_auth_digest
+
+"""
+A loopback JNIOR that speaks JMP.  It implements the nonce / Auth-Digest login, Monitor pushes, Control, File Read,
+File List, Registry Read and Post Message so that connections can be tested and benchmarked without a device.
+"""
+
+
+class JniorSimulator(object):
+    def __init__(self, host="127.0.0.1", port=0, username="jnior", password="jnior", files=None, registry=None,
+                 inputs=8, outputs=8, monitor_interval=None, model="JNIOR Simulator", serial_number=0,
+                 certfile=None, keyfile=None, starttls_ack=True):
+        """
+        A simulated JNIOR.  Call start() to begin accepting connections.
+
+        :param host: the address to listen on
+        :param port: the port to listen on.  0 picks a free port, see get_address()
+        :param username: the login username
+        :param password: the login password
+        :param files: a dict of path to bytes served by File Read and File List
+        :param registry: a dict of key to value served by Registry Read
+        :param inputs: the number of digital inputs
+        :param outputs: the number of relay outputs
+        :param monitor_interval: seconds between unsolicited Monitor pushes.  None only pushes on a change
+        :param model: the Model reported in Monitor messages
+        :param serial_number: the Serial Number reported in Monitor messages
+        :param certfile: the certificate for STARTTLS.  STARTTLS is refused without one
+        :param keyfile: the private key of the certificate
+        :param starttls_ack: whether [STARTTLS] is echoed before the handshake, as an acknowledging device would
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.files = files if files is not None else {}
+        self.registry = registry if registry is not None else {}
+        self.monitor_interval = monitor_interval
+        self.model = model
+        self.serial_number = serial_number
+        self.starttls_ack = starttls_ack
+        self.ssl_context = None
+        if certfile is not None:
+            self.ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            self.ssl_context.load_cert_chain(certfile, keyfile)
+
+        self.lock = threading.Lock()
+        self.input_states = [0] * inputs
+        self.input_counts = [0] * inputs
+        self.output_states = [0] * outputs
+
+        self.server_socket = None
+        self.clients = set()
+        self.running = False
+
+        # what the simulator has seen.  used by tests to check the traffic
+        self.posted_messages = []
+        self.received_count = 0
+
+        # when set the logged in clients are ignored, like a device that has stopped responding
+        self.silent = False
+
+    def start(self):
+        """
+        starts listening.  returns once the socket is bound
+
+        :return: the (host, port) the simulator is listening on
+        """
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(1024)
+        self.port = self.server_socket.getsockname()[1]
+        self.running = True
+
+        threading.Thread(target=self._accept_loop, daemon=True, name="jnior-simulator-accept").start()
+        if self.monitor_interval is not None:
+            threading.Thread(target=self._monitor_loop, daemon=True, name="jnior-simulator-monitor").start()
+        return self.get_address()
+
+    def stop(self):
+        self.running = False
+        if self.server_socket is not None:
+            try:
+                # shutdown wakes the accept thread
+                self.server_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.server_socket.close()
+            self.server_socket = None
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            client.close()
+
+    def get_address(self):
+        return self.host, self.port
+
+    def set_input(self, channel, state):
+        """
+        changes an input and pushes a Monitor message to every authenticated client
+
+        :param channel: the 1 based input channel
+        :param state: 0 or 1
+        """
+        with self.lock:
+            if self.input_states[channel - 1] != state:
+                self.input_states[channel - 1] = state
+                if state:
+                    self.input_counts[channel - 1] += 1
+        self.broadcast_monitor()
+
+    def set_output(self, channel, state):
+        with self.lock:
+            self.output_states[channel - 1] = state
+        self.broadcast_monitor()
+
+    def monitor_json(self):
+        with self.lock:
+            return {
+                "Message": "Monitor",
+                "Model": self.model,
+                "Serial Number": self.serial_number,
+                "Version": "simulator",
+                "Timestamp": int(time.time() * 1000),
+                "Inputs": {str(i + 1): {"State": state, "Count": self.input_counts[i]}
+                           for i, state in enumerate(self.input_states)},
+                "Outputs": {str(i + 1): {"State": state} for i, state in enumerate(self.output_states)},
+                "Meta": {},
+            }
+
+    def broadcast_monitor(self):
+        if self.silent:
+            return
+        frame = encode_frame(json.dumps(self.monitor_json()))
+        with self.lock:
+            clients = [client for client in self.clients if client.authenticated]
+        for client in clients:
+            client.send_frame(frame)
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                sock, _ = self.server_socket.accept()
+            except OSError:
+                break
+            # replies are small and sent back to back.  without this they wait on Nagle and the delayed ACK
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = _SimulatedClient(self, sock)
+            with self.lock:
+                self.clients.add(client)
+            threading.Thread(target=client.run, daemon=True, name="jnior-simulator-client").start()
+
+    def _monitor_loop(self):
+        while self.running:
+            time.sleep(self.monitor_interval)
+            self.broadcast_monitor()
+
+    def _remove_client(self, client):
+        with self.lock:
+            self.clients.discard(client)
+
+    def _control(self, command, channel, duration):
+        with self.lock:
+            if channel < 1 or channel > len(self.output_states):
+                return False
+            previous = self.output_states[channel - 1]
+            if "Close" == command:
+                self.output_states[channel - 1] = 1
+            elif "Open" == command:
+                self.output_states[channel - 1] = 0
+            elif "Toggle" == command:
+                self.output_states[channel - 1] = 0 if previous else 1
+            else:
+                return False
+
+        if duration:
+            # a pulse puts the output back after the duration
+            timer = threading.Timer(duration / 1000.0, self.set_output, args=[channel, previous])
+            timer.daemon = True
+            timer.start()
+        self.broadcast_monitor()
+        return True
+
+    def _file_list(self, folder):
+        if not folder.endswith('/'):
+            folder += '/'
+        content = {}
+        for path, data in self.files.items():
+            if not path.startswith(folder):
+                continue
+            rest = path[len(folder):]
+            if '/' in rest:
+                name = rest.split('/')[0]
+                content[name] = {"Name": name, "Type": "Folder"}
+            else:
+                content[rest] = {"Name": rest, "Type": "File", "Size": len(data), "Modified": 0}
+        return list(content.values())
+
+
+class _SimulatedClient(object):
+    def __init__(self, simulator, sock):
+        """
+        one connection to the simulator
+        """
+        self.simulator = simulator
+        self.socket = sock
+        self.send_lock = threading.Lock()
+        self.authenticated = False
+        self.nonce = os.urandom(8).hex()
+
+    def close(self):
+        try:
+            # shutdown wakes the client thread that is blocked in recv
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+
+    def send_frame(self, frame):
+        try:
+            with self.send_lock:
+                self.socket.sendall(frame)
+        except OSError:
+            self.close()
+
+    def send_json(self, json_obj):
+        self.send_frame(encode_frame(json.dumps(json_obj)))
+
+    def run(self):
+        decoder = FrameDecoder()
+        try:
+            while True:
+                data = self.socket.recv(1024 * 64)
+                if not data:
+                    break
+                if data.startswith(b'[STARTTLS]') and self.simulator.ssl_context is not None:
+                    self._start_tls()
+                    continue
+                for payload in decoder.feed(data):
+                    self.simulator.received_count += 1
+                    self._handle(json.loads(payload))
+        except (OSError, ValueError, FrameDecodeError) as err:
+            logging.debug(f"simulator client closed because {err}")
+        finally:
+            self.simulator._remove_client(self)
+            self.close()
+
+    def _start_tls(self):
+        if self.simulator.starttls_ack:
+            self.socket.sendall(b'[STARTTLS]')
+        self.socket = self.simulator.ssl_context.wrap_socket(self.socket, server_side=True)
+
+    def _handle(self, request):
+        meta = request.get("Meta", {})
+
+        if not self.authenticated:
+            digest = request.get("Auth-Digest")
+            if digest is not None and digest == compute_auth_digest(self.simulator.username,
+                                                                    self.simulator.password, self.nonce):
+                self.authenticated = True
+                self.send_json({"Message": "Authenticated", "Administrator": True, "Meta": meta})
+                self.send_json(self.simulator.monitor_json())
+            else:
+                self.nonce = os.urandom(8).hex()
+                self.send_json({"Message": "Error", "Text": "401 Unauthorized", "Nonce": self.nonce,
+                                "Meta": meta})
+            return
+
+        if self.simulator.silent:
+            return
+
+        message = request.get("Message")
+        if "Control" == message:
+            # like a JNIOR the only answer to a command that was carried out is the Monitor message it causes
+            if not self.simulator._control(request.get("Command"), request.get("Channel", 0),
+                                           request.get("Duration")):
+                self.send_json({"Message": "Error", "Text": f"unable to {request.get('Command')} output "
+                                                            f"{request.get('Channel')}", "Meta": meta})
+
+        elif "File Read" == message:
+            data = self.simulator.files.get(request.get("File"))
+            if data is None:
+                self.send_json({"Message": "File Read Response", "File": request.get("File"),
+                                "Status": "File Not Found", "Meta": meta})
+                return
+            offset = request.get("Offset", 0)
+            chunk = data[offset:offset + request.get("Limit", 1024 * 16)]
+            self.send_json({"Message": "File Read Response", "File": request.get("File"), "Status": "Succeed",
+                            "Size": len(data), "Offset": offset, "NumRead": len(chunk),
+                            "Data": base64.b64encode(chunk).decode('ascii'), "Meta": meta})
+
+        elif "File List" == message:
+            folder = request.get("Folder", "/")
+            content = self.simulator._file_list(folder)
+            if not content and "/" != folder:
+                # a folder is only known through the files in it
+                self.send_json({"Message": "Error", "Text": f"{folder} not found", "Meta": meta})
+                return
+            self.send_json({"Message": "File List Response", "Folder": folder, "Content": content,
+                            "BytesFree": 1024 * 1024, "Meta": meta})
+
+        elif "Registry Read" == message:
+            keys = request.get("Keys", [])
+            self.send_json({"Message": "Registry Read Response",
+                            "Keys": {key: self.simulator.registry.get(key) for key in keys}, "Meta": meta})
+
+        elif "Post Message" == message:
+            self.simulator.posted_messages.append((request.get("Number"), request.get("Content")))
+            self.send_json({"Message": "Post Message Response", "Status": "Succeed", "Meta": meta})
+
+        elif "" == message:
+            # an empty message is a cheap round trip
+            self.send_json({"Message": "", "Meta": meta})
+
+        else:
+            self.send_json({"Message": "Error", "Text": f"unknown message {message}", "Meta": meta})
@@ -0,0 +1,209 @@
+import json
+import re
+
+from jmp_connection.jmp_messages import JmpMessage, get_message_class
+
+"""
+JSON encoding and decoding for JMP messages.  The stdlib json module is used by default.  orjson or ujson can be
+selected when they are installed.  A lazy mode routes a message by its Message name and Meta Hash, which are found
+without parsing, and only parses the whole message when the json is first used.
+"""
+
+# orjson and ujson are imported the first time a codec other than the stdlib one is asked for.  orjson alone pulls
+# in uuid, datetime and zoneinfo which would slow down every program that only uses the default
+orjson = None
+ujson = None
+_optional_loaded = False
+
+
+def _load_optional_codecs():
+    global orjson, ujson, _optional_loaded
+    if _optional_loaded:
+        return
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+    try:
+        import ujson
+    except ImportError:
+        ujson = None
+    _optional_loaded = True
+
+
+# used to route a message without parsing it
+MESSAGE_NAME_PATTERN = re.compile(rb'"Message"\s*:\s*"([^"]*)"')
+# the Hash inside the Meta object.  a "Hash" key elsewhere, like in the body of a message, is not the Meta Hash
+META_HASH_PATTERN = re.compile(rb'"Meta"\s*:\s*\{[^}]*"Hash"\s*:\s*"([^"]*)"')
+HASH_KEY_PATTERN = re.compile(rb'"Hash"\s*:')
+
+
+def peek_message_name(payload):
+    """
+    :param payload: the bytes of a JMP message
+    :return: the Message name or None
+    """
+    match = MESSAGE_NAME_PATTERN.search(payload)
+    return match.group(1).decode('ascii', 'replace') if match else None
+
+
+def peek_meta_hash(payload, codec=None):
+    """
+    :param payload: the bytes of a JMP message
+    :param codec: the codec used to parse the message when the Meta Hash cannot be found without parsing, like when
+        the Meta object holds a nested object before the Hash
+    :return: the Meta Hash or None
+    """
+    match = META_HASH_PATTERN.search(payload)
+    if match:
+        return match.group(1).decode('ascii', 'replace')
+    # a message without a Hash key anywhere has no Meta Hash.  that is the common case and it is not parsed
+    if not HASH_KEY_PATTERN.search(payload):
+        return None
+    try:
+        obj = (codec if codec is not None else JsonCodec()).loads(bytes(payload))
+    except ValueError:
+        return None
+    meta = obj.get("Meta") if isinstance(obj, dict) else None
+    meta_hash = meta.get("Hash") if isinstance(meta, dict) else None
+    return meta_hash if isinstance(meta_hash, str) else None
+
+
+class JsonCodec(object):
+    name = "json"
+
+    def loads(self, payload):
+        """
+        :param payload: bytes or str
+        :return: the decoded object
+        """
+        return json.loads(payload)
+
+    def dumps(self, obj):
+        """
+        :param obj: the object to encode
+        :return: the ascii encoded bytes
+        """
+        return json.dumps(obj).encode('ascii')
+
+
+class OrjsonCodec(JsonCodec):
+    name = "orjson"
+
+    def loads(self, payload):
+        return orjson.loads(payload)
+
+    def dumps(self, obj):
+        payload = orjson.dumps(obj)
+        # the JNIOR expects ascii.  orjson always writes utf-8 so fall back for the rare non-ascii message
+        return payload if payload.isascii() else JsonCodec.dumps(self, obj)
+
+
+class UjsonCodec(JsonCodec):
+    name = "ujson"
+
+    def loads(self, payload):
+        return ujson.loads(payload)
+
+    def dumps(self, obj):
+        return ujson.dumps(obj, ensure_ascii=True).encode('ascii')
+
+
+def get_codec(name=None):
+    """
+    returns a codec by name
+
+    :param name: "json" for the stdlib, "orjson", "ujson" or "auto" for the fastest one that is installed.  None
+        is the same as "json"
+    :return: a JsonCodec
+    """
+    if name is None or "json" == name:
+        return JsonCodec()
+    _load_optional_codecs()
+    if "auto" == name:
+        if orjson is not None:
+            return OrjsonCodec()
+        if ujson is not None:
+            return UjsonCodec()
+        return JsonCodec()
+    if "orjson" == name:
+        if orjson is None:
+            raise Exception("orjson is not installed")
+        return OrjsonCodec()
+    if "ujson" == name:
+        if ujson is None:
+            raise Exception("ujson is not installed")
+        return UjsonCodec()
+    raise Exception(f"unknown json codec {name}")
+
+
+class LazyJmpMessage(JmpMessage):
+    __slots__ = ("payload", "codec", "_json", "_message", "_meta_hash")
+
+    def __init__(self, payload, codec=None, message=None):
+        """
+        A received message that is parsed the first time its json is used.  The Message name and Meta Hash are
+        available without parsing.
+
+        :param payload: the bytes of the message
+        :param codec: the codec used to parse the message
+        :param message: the Message name if it is already known
+        """
+        self.payload = payload
+        self.codec = codec if codec is not None else JsonCodec()
+        self._json = None
+        self._message = message
+        self._meta_hash = None
+
+    @property
+    def json(self):
+        if self._json is None:
+            self._json = self.codec.loads(self.payload)
+            self.payload = None
+        return self._json
+
+    @json.setter
+    def json(self, value):
+        self._json = value
+        self.payload = None
+
+    def is_parsed(self):
+        return self._json is not None
+
+    @property
+    def message(self):
+        if self._json is not None:
+            return self._json["Message"]
+        if self._message is None:
+            self._message = peek_message_name(self.payload)
+        return self._message
+
+    @property
+    def meta_hash(self):
+        if self._json is not None:
+            return JmpMessage.meta_hash.fget(self)
+        if self._meta_hash is None:
+            self._meta_hash = peek_meta_hash(self.payload, self.codec)
+        return self._meta_hash
+
+
+# the lazy version of each registered message class
+_lazy_classes = {JmpMessage: LazyJmpMessage}
+
+
+def create_lazy_message(payload, codec=None):
+    """
+    creates a lazy message of the class registered for the Message name.  a lazy MonitorMessage still has the
+    MonitorMessage properties and parses the payload the first time one of them is used
+
+    :param payload: the bytes of the message
+    :param codec: the codec used to parse the message
+    :return: a LazyJmpMessage
+    """
+    message_name = peek_message_name(payload)
+    cls = get_message_class(message_name)
+    lazy_cls = _lazy_classes.get(cls)
+    if lazy_cls is None:
+        lazy_cls = type(f"Lazy{cls.__name__}", (LazyJmpMessage, cls), {"__slots__": ()})
+        _lazy_classes[cls] = lazy_cls
+    return lazy_cls(payload, codec, message_name)
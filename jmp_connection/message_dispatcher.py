@@ -0,0 +1,229 @@
+import collections
+import logging
+import threading
+import time
+import traceback
+
+"""
+Runs message handlers on a fixed pool of worker threads.  A connection submits each decoded frame to the dispatcher
+instead of starting a thread per message.  The queues are bounded so that a slow handler pushes back on the reader.
+"""
+
+# how messages are ordered relative to each other
+ORDER_NONE = "none"
+ORDER_CONNECTION = "connection"
+ORDER_MESSAGE_TYPE = "message_type"
+
+# what to do when a queue is full
+FULL_BLOCK = "block"
+FULL_DROP_OLDEST = "drop_oldest"
+FULL_DISCONNECT = "disconnect"
+
+
+class DispatchQueueFull(Exception):
+    """
+    raised by submit when the queue is full and the policy is FULL_DISCONNECT
+    """
+    pass
+
+
+class _Lane(object):
+    def __init__(self, max_size):
+        """
+        a bounded queue of work items.  a lane is served by one worker when ordering is required or by every
+        worker when it is not.
+        """
+        self.max_size = max_size
+        self.items = collections.deque()
+        self.condition = threading.Condition()
+
+
+class MessageDispatcher(object):
+    def __init__(self, workers=4, queue_size=1024, ordering=ORDER_CONNECTION, full_policy=FULL_BLOCK):
+        """
+        A fixed size worker pool for message handlers.  One dispatcher can be shared by many connections.
+
+        :param workers: the number of worker threads
+        :param queue_size: the most items that may wait in each queue
+        :param ordering: ORDER_CONNECTION keeps the messages from a connection in the order they were received,
+            ORDER_MESSAGE_TYPE keeps the messages of each type from a connection in order and ORDER_NONE lets any
+            worker take the next message
+        :param full_policy: FULL_BLOCK makes the reader wait, FULL_DROP_OLDEST discards the oldest waiting message
+            and FULL_DISCONNECT raises DispatchQueueFull so that the reader closes the connection
+        """
+        if ordering not in (ORDER_NONE, ORDER_CONNECTION, ORDER_MESSAGE_TYPE):
+            raise Exception(f"unknown ordering {ordering}")
+        if full_policy not in (FULL_BLOCK, FULL_DROP_OLDEST, FULL_DISCONNECT):
+            raise Exception(f"unknown full policy {full_policy}")
+
+        self.worker_count = workers
+        self.queue_size = queue_size
+        self.ordering = ordering
+        self.full_policy = full_policy
+
+        # without ordering every worker pulls from a single shared lane
+        lane_count = 1 if ORDER_NONE == ordering else workers
+        self.lanes = [_Lane(queue_size) for _ in range(lane_count)]
+
+        self.workers = []
+        # the workers that were shut down.  they may still be finishing a handler when the pool is started again
+        self.retired_workers = []
+        self.running = False
+        # a worker from an earlier start() exits when it sees that the generation has changed
+        self.generation = 0
+        self.lock = threading.Lock()
+
+        # statistics
+        self.submitted = 0
+        self.dropped = 0
+        self.completed = 0
+        self.errors = 0
+        self.max_queue_depth = 0
+        self.handler_time_total = 0.0
+        self.handler_time_max = 0.0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+
+    def start(self):
+        """
+        starts the worker threads.  called automatically by the first submit
+        """
+        with self.lock:
+            if self.running:
+                return
+            self.running = True
+            self.generation += 1
+            retired_workers = self.retired_workers
+            self.retired_workers = []
+            for i in range(self.worker_count):
+                lane = self.lanes[i % len(self.lanes)]
+                previous = retired_workers[i] if i < len(retired_workers) else None
+                worker = threading.Thread(target=self._work, args=[lane, self.generation, previous], daemon=True,
+                                          name=f"jmp-dispatch-{i}")
+                worker.start()
+                self.workers.append(worker)
+
+    def shutdown(self, wait=True):
+        """
+        stops the workers once the queued messages have been handled.  a later submit starts new workers
+
+        :param wait: whether to wait for the workers to exit
+        """
+        with self.lock:
+            self.running = False
+            workers = self.workers
+            self.workers = []
+            if workers:
+                self.retired_workers = workers
+        for lane in self.lanes:
+            with lane.condition:
+                lane.condition.notify_all()
+        if wait:
+            for worker in workers:
+                if worker is not threading.current_thread():
+                    worker.join()
+
+    def submit(self, handler, args=(), connection=None, message_type=None):
+        """
+        queues a handler call
+
+        :param handler: the callable to run on a worker
+        :param args: the arguments for the handler
+        :param connection: the connection the message was received on.  used for ordering
+        :param message_type: the JMP Message name.  only needed for ORDER_MESSAGE_TYPE
+        :return: True if the item was queued.  with FULL_DROP_OLDEST an older item may have been discarded
+        """
+        if not self.running:
+            self.start()
+
+        lane = self._select_lane(connection, message_type)
+        with lane.condition:
+            while len(lane.items) >= lane.max_size:
+                if FULL_BLOCK == self.full_policy:
+                    lane.condition.wait()
+                elif FULL_DROP_OLDEST == self.full_policy:
+                    lane.items.popleft()
+                    self.dropped += 1
+                else:
+                    self.dropped += 1
+                    raise DispatchQueueFull(f"dispatch queue is full ({lane.max_size} messages)")
+
+            lane.items.append((handler, args, time.perf_counter()))
+            self.submitted += 1
+            depth = len(lane.items)
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+            lane.condition.notify_all()
+        return True
+
+    def _select_lane(self, connection, message_type):
+        if 1 == len(self.lanes):
+            return self.lanes[0]
+        # object ids are aligned so the id alone would put every connection in the same lane.  hashing a tuple
+        # mixes the bits
+        key = (id(connection),) if ORDER_CONNECTION == self.ordering else (id(connection), message_type)
+        return self.lanes[hash(key) % len(self.lanes)]
+
+    def _work(self, lane, generation, previous):
+        if previous is not None and previous is not threading.current_thread():
+            # the worker this one replaces finishes the handler it is in first so that the lane stays in order
+            previous.join()
+
+        while True:
+            with lane.condition:
+                while not lane.items:
+                    if not self.running or generation != self.generation:
+                        return
+                    lane.condition.wait()
+                if generation != self.generation:
+                    return
+                handler, args, queued_time = lane.items.popleft()
+                # wake a reader that may be blocked on a full lane
+                lane.condition.notify_all()
+
+            start_time = time.perf_counter()
+            try:
+                handler(*args)
+            except Exception as err:
+                self.errors += 1
+                logging.error(f"message handler {handler} failed because {err}\n{traceback.format_exc()}")
+            end_time = time.perf_counter()
+
+            with self.lock:
+                self.completed += 1
+                handler_time = end_time - start_time
+                queue_wait = start_time - queued_time
+                self.handler_time_total += handler_time
+                self.queue_wait_total += queue_wait
+                if handler_time > self.handler_time_max:
+                    self.handler_time_max = handler_time
+                if queue_wait > self.queue_wait_max:
+                    self.queue_wait_max = queue_wait
+
+    def queue_depth(self):
+        """
+        :return: the number of messages waiting to be handled
+        """
+        return sum(len(lane.items) for lane in self.lanes)
+
+    def get_stats(self):
+        """
+        :return: a dict of the queue depth, drop counts and handler latency for this dispatcher
+        """
+        with self.lock:
+            completed = self.completed
+            return {
+                "workers": self.worker_count,
+                "ordering": self.ordering,
+                "full_policy": self.full_policy,
+                "queue_depth": self.queue_depth(),
+                "max_queue_depth": self.max_queue_depth,
+                "submitted": self.submitted,
+                "completed": completed,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "handler_time_avg": self.handler_time_total / completed if completed else 0.0,
+                "handler_time_max": self.handler_time_max,
+                "queue_wait_avg": self.queue_wait_total / completed if completed else 0.0,
+                "queue_wait_max": self.queue_wait_max,
+            }
@@ -0,0 +1,148 @@
+import bisect
+import json
+import threading
+
+"""
+Counters and histograms for the internals of a connection.  Metrics are off by default.  A connection only touches
+its metrics when enable_metrics() has been called so the hooks cost a single attribute check when they are disabled.
+"""
+
+# upper bounds in seconds.  they cover sub-millisecond decode times up to multi-second round trips
+DEFAULT_TIME_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram(object):
+    def __init__(self, buckets=DEFAULT_TIME_BUCKETS):
+        """
+        A fixed bucket histogram like a Prometheus histogram
+
+        :param buckets: the sorted upper bounds of the buckets.  an implicit +Inf bucket is added
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """
+        :return: the upper bound of the bucket that holds the given quantile
+        """
+        if 0 == self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "avg": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+
+class ConnectionMetrics(object):
+    COUNTERS = ("frames_in", "bytes_in", "frames_out", "bytes_out", "connects", "reconnects", "auth_failures",
+                "request_timeouts", "errors", "heartbeats_missed")
+    HISTOGRAMS = ("decode_time", "parse_time", "handler_time", "request_rtt", "auth_latency", "tls_handshake_time")
+
+    def __init__(self):
+        """
+        The metrics of one connection.  The counters are plain attributes that are incremented in place.
+        """
+        self.lock = threading.Lock()
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        for name in self.HISTOGRAMS:
+            setattr(self, name, Histogram())
+
+        # callables that return the current value of a gauge, like a queue depth
+        self.gauges = {}
+
+    def add_gauge(self, name, value_callable):
+        self.gauges[name] = value_callable
+
+    def to_dict(self):
+        """
+        :return: a dict of every counter, gauge and histogram summary
+        """
+        with self.lock:
+            result = {name: getattr(self, name) for name in self.COUNTERS}
+            for name, value_callable in self.gauges.items():
+                try:
+                    result[name] = value_callable()
+                except Exception:
+                    result[name] = None
+            for name in self.HISTOGRAMS:
+                result[name] = getattr(self, name).to_dict()
+        return result
+
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def export_json(connections):
+    """
+    :param connections: the JMPConnections to export.  connections without metrics are skipped
+    :return: a json string with the metrics of each connection keyed by host:port
+    """
+    return json.dumps({f"{connection.host}:{connection.port}": connection.metrics.to_dict()
+                       for connection in connections if connection.metrics is not None})
+
+
+def export_prometheus(connections, prefix="jmp"):
+    """
+    :param connections: the JMPConnections to export.  connections without metrics are skipped
+    :param prefix: the prefix for the metric names
+    :return: the metrics in the Prometheus text exposition format
+    """
+    connections = [connection for connection in connections if connection.metrics is not None]
+    lines = []
+
+    for name in ConnectionMetrics.COUNTERS:
+        lines.append(f"# TYPE {prefix}_{name}_total counter")
+        for connection in connections:
+            labels = _prometheus_labels({"host": connection.host, "port": connection.port})
+            lines.append(f"{prefix}_{name}_total{labels} {getattr(connection.metrics, name)}")
+
+    gauge_names = sorted({name for connection in connections for name in connection.metrics.gauges})
+    for name in gauge_names:
+        lines.append(f"# TYPE {prefix}_{name} gauge")
+        for connection in connections:
+            value_callable = connection.metrics.gauges.get(name)
+            if value_callable is not None:
+                labels = _prometheus_labels({"host": connection.host, "port": connection.port})
+                lines.append(f"{prefix}_{name}{labels} {value_callable()}")
+
+    for name in ConnectionMetrics.HISTOGRAMS:
+        lines.append(f"# TYPE {prefix}_{name}_seconds histogram")
+        for connection in connections:
+            histogram = getattr(connection.metrics, name)
+            labels = {"host": connection.host, "port": connection.port}
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                cumulative += count
+                bucket_labels = _prometheus_labels(dict(labels, le=bound))
+                lines.append(f"{prefix}_{name}_seconds_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{prefix}_{name}_seconds_sum{_prometheus_labels(labels)} {histogram.sum}")
+            lines.append(f"{prefix}_{name}_seconds_count{_prometheus_labels(labels)} {histogram.count}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,209 @@
+import collections
+import concurrent.futures
+import threading
+import time
+
+from jmp_connection.io_state import IOStateStore
+from jmp_connection.jmp_messages import JmpMessage
+
+"""
+Sends output commands to many devices at once and reports which devices carried them out.  A JNIOR does not reply to
+a Control message.  It pushes a Monitor message when an output changes, so a command is confirmed when the output
+state it asked for shows up in the Monitor messages of the device.  Every command is sent before anything is waited
+on, so the whole operation takes about as long as the slowest device.
+"""
+
+ACKNOWLEDGED = "acknowledged"
+TIMED_OUT = "timed out"
+FAILED = "failed"
+
+# the outcome for one device.  replies holds any message that came back with the Meta Hash of a command, like an
+# Error, in the order they arrived
+ControlResult = collections.namedtuple("ControlResult", ["status", "replies", "error", "elapsed"])
+
+
+def _copy_message(jmp_message):
+    """
+    copies a message with a new Meta Hash so that each device gets its own request
+    """
+    copy = object.__new__(type(jmp_message))
+    copy.json = dict(jmp_message.json, Meta={"Hash": JmpMessage().meta_hash})
+    return copy
+
+
+def _is_error(reply):
+    return "Error" == reply.json.get("Message") or reply.json.get("Status") not in (None, "Succeed")
+
+
+def _target_states(commands, store):
+    """
+    :return: a dict of channel to the state the commands leave the output in.  the state is None for a Toggle of an
+        output whose state is not known yet
+    """
+    targets = {}
+    for command in commands:
+        channel = command.json["Channel"]
+        action = command.json["Command"]
+        if "Close" == action:
+            targets[channel] = 1
+        elif "Open" == action:
+            targets[channel] = 0
+        else:
+            if channel in targets:
+                previous = targets[channel]
+            else:
+                previous = store.get_output(channel) if store.initialized else None
+            targets[channel] = None if previous is None else 1 - previous
+    return targets
+
+
+class _OutputWatch(object):
+    def __init__(self, connection, store, commands):
+        """
+        waits for the outputs of one device to reach the states its commands ask for
+        """
+        self.connection = connection
+        self.store = store
+        self.targets = _target_states(commands, store)
+
+        self.lock = threading.Lock()
+        # the channels that changed while we watched.  a Toggle of an unknown output is confirmed by any change
+        self.changed = set()
+        self.replies = []
+        self.error = None
+        self.confirmed = False
+        self.done_time = None
+        self.done = threading.Event()
+
+    def start(self):
+        self.store.on_output_change += self._output_changed
+        # added after the store's own handler so that the store is up to date when we look at it
+        self.connection.add_message_recv_handler(self._monitor_received, "Monitor")
+        # a command that does not change an output produces no Monitor message
+        self._check()
+
+    def stop(self):
+        self.store.on_output_change -= self._output_changed
+        self.connection.remove_message_recv_handler(self._monitor_received, "Monitor")
+
+    def _output_changed(self, store, channel, state):
+        with self.lock:
+            self.changed.add(channel)
+
+    def _monitor_received(self, connection, jmp_message):
+        self._check()
+
+    def _check(self):
+        if not self.store.initialized:
+            return
+        with self.lock:
+            for channel, target in self.targets.items():
+                if target is None:
+                    if channel not in self.changed:
+                        return
+                elif self.store.get_output(channel) != target:
+                    return
+            self.confirmed = True
+        self._finish()
+
+    def request_done(self, future):
+        """
+        done callback of the command requests.  a reply is only sent when the device refuses the command
+        """
+        if future.cancelled():
+            return
+        err = future.exception()
+        if isinstance(err, concurrent.futures.TimeoutError):
+            return
+        with self.lock:
+            if err is None:
+                reply = future.result()
+                self.replies.append(reply)
+                if not _is_error(reply):
+                    return
+                err = Exception(reply.json.get("Text") or reply.json.get("Status"))
+            if self.error is None:
+                self.error = err
+        self._finish()
+
+    def _finish(self):
+        with self.lock:
+            if self.done_time is None:
+                self.done_time = time.monotonic()
+        self.done.set()
+
+
+def control_outputs(connections, commands, deadline=5.0, stores=None):
+    """
+    sends the same commands to every connection in parallel and waits for the Monitor messages that show the
+    outputs in the commanded states
+
+        results = control_outputs(connections, [CloseMessage(1, 1000), OpenMessage(2)], deadline=2.0)
+        failed = [c.host for c, result in results.items() if ACKNOWLEDGED != result.status]
+
+    the state of an output is only known once the device has sent a Monitor message.  a command that leaves an output
+    as it was, like a Close of a closed output, can only be confirmed from an IOStateStore that was attached before
+    the device logged in.  pass those stores when commanding outputs that may already be in the requested state
+
+    :param connections: the authenticated JMPConnections to control
+    :param commands: a list of ControlOutputMessages, like CloseMessage, OpenMessage or ToggleMessage
+    :param deadline: seconds from now by which every device must have carried out the commands
+    :param stores: an optional dict of connection to the IOStateStore attached to it.  a connection without one is
+        watched with a temporary store
+    :return: a dict of connection to ControlResult.  the status is ACKNOWLEDGED when the Monitor messages show every
+    output in its commanded state, FAILED when the device was not connected, the connection was lost or the device
+    refused a command, and TIMED_OUT otherwise.  FAILED wins over TIMED_OUT
+    """
+    start_time = time.monotonic()
+    end_time = start_time + deadline
+
+    results = {}
+    # connection -> (watch, the futures for its commands, whether the store is temporary)
+    watches = {}
+    for connection in connections:
+        if not connection.is_connected() or not connection.is_authenticated():
+            results[connection] = ControlResult(FAILED, [], Exception("not connected"), 0.0)
+            continue
+
+        store = stores.get(connection) if stores is not None else None
+        temporary = store is None
+        if temporary:
+            store = IOStateStore()
+            store.attach(connection)
+        watch = _OutputWatch(connection, store, commands)
+        watch.start()
+        try:
+            # the only reply to a command is a refusal.  the timeout scheduler forgets the rest at the deadline
+            futures = [connection.request(_copy_message(command), end_time - time.monotonic())
+                       for command in commands]
+        except Exception as err:
+            futures = []
+            with watch.lock:
+                watch.error = err
+            watch._finish()
+        for future in futures:
+            future.add_done_callback(watch.request_done)
+        watches[connection] = (watch, futures, temporary)
+
+    for watch, _, _ in watches.values():
+        watch.done.wait(max(0.0, end_time - time.monotonic()))
+
+    for connection, (watch, futures, temporary) in watches.items():
+        watch.stop()
+        if temporary:
+            watch.store.detach()
+        for future in futures:
+            future.cancel()
+
+        with watch.lock:
+            if watch.error is not None:
+                status, error = FAILED, watch.error
+            elif watch.confirmed:
+                status, error = ACKNOWLEDGED, None
+            else:
+                status, error = TIMED_OUT, concurrent.futures.TimeoutError("the outputs did not reach the "
+                                                                           "commanded states before the deadline")
+            done_time = watch.done_time if watch.done_time is not None else time.monotonic()
+            results[connection] = ControlResult(status, list(watch.replies), error, done_time - start_time)
+
+    return results
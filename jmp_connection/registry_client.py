@@ -0,0 +1,195 @@
+import collections
+import concurrent.futures
+import threading
+import time
+
+from jmp_connection.jmp_messages import RegistryReadMessage
+
+"""
+A caching client for the JNIOR registry.  Values are kept for a time to live so that hot keys cost no round trip,
+and keys that are requested at about the same time are read from the device with one Registry Read.
+"""
+
+
+class RegistryReadError(Exception):
+    """
+    set on the reads of a batch when the JNIOR answers the Registry Read with an Error, for example when the login
+    may not read the registry
+    """
+    pass
+
+
+class RegistryClient(object):
+    def __init__(self, connection, ttl=60.0, max_entries=1024, batch_window=0.002, timeout=30.0):
+        """
+        A registry cache for one device.
+
+        :param connection: an authenticated JMPConnection
+        :param ttl: seconds a value stays in the cache.  None keeps values until they are evicted or invalidated
+        :param max_entries: the most keys to cache.  the least recently used key is evicted first
+        :param batch_window: seconds to wait for other keys to join a read before it is sent
+        :param timeout: seconds to wait for a Registry Read response
+        """
+        self.connection = connection
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.batch_window = batch_window
+        self.timeout = timeout
+
+        self.lock = threading.Lock()
+        # key -> (value, expire time)
+        self.cache = collections.OrderedDict()
+        # key -> the future of the read that will return it
+        self.in_flight = {}
+        # keys waiting to be sent in the next read and the future for that read
+        self.batch_keys = None
+        self.batch_future = None
+
+        # statistics
+        self.hits = 0
+        self.misses = 0
+        self.reads = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """
+        :param key: the registry key
+        :param default: returned when the key does not exist on the device
+        :return: the value of the key.  raises RegistryReadError when the device refuses the read
+        """
+        value = self.get_many([key])[key]
+        return default if value is None else value
+
+    def get_many(self, keys):
+        """
+        returns the values of several keys.  cached values are returned immediately and the rest are read from
+        the device, together with any other keys that are requested at the same time
+
+        :param keys: a list of registry keys
+        :return: a dict of key to value.  keys that do not exist have a value of None
+        """
+        results = {}
+        waiting = []
+        leader_future = None
+
+        with self.lock:
+            now = time.monotonic()
+            for key in keys:
+                entry = self.cache.get(key)
+                if entry is not None and (entry[1] is None or entry[1] > now):
+                    self.cache.move_to_end(key)
+                    results[key] = entry[0]
+                    self.hits += 1
+                    continue
+
+                self.misses += 1
+                future = self.in_flight.get(key)
+                if future is None:
+                    if self.batch_future is None:
+                        # we start the next read.  other callers add their keys to it while we wait
+                        self.batch_keys = []
+                        self.batch_future = concurrent.futures.Future()
+                        leader_future = self.batch_future
+                    self.batch_keys.append(key)
+                    future = self.batch_future
+                    self.in_flight[key] = future
+                waiting.append((key, future))
+
+        if leader_future is not None:
+            if 0 < self.batch_window:
+                time.sleep(self.batch_window)
+            self._send_batch()
+
+        for key, future in waiting:
+            results[key] = future.result(self.timeout).get(key)
+        return results
+
+    def _send_batch(self):
+        with self.lock:
+            keys = self.batch_keys
+            batch_future = self.batch_future
+            self.batch_keys = None
+            self.batch_future = None
+            self.reads += 1
+
+        try:
+            request_future = self.connection.request(RegistryReadMessage(keys), self.timeout)
+        except Exception as err:
+            self._batch_done(keys, batch_future, None, err)
+            return
+
+        def on_response(future):
+            try:
+                response = future.result()
+                if "Error" == response.message:
+                    # nothing is cached so that the keys are read again next time
+                    raise RegistryReadError(f"unable to read {keys}: {response.json.get('Text')}")
+                self._batch_done(keys, batch_future, response.json.get("Keys", {}), None)
+            except BaseException as err:
+                self._batch_done(keys, batch_future, None, err)
+
+        request_future.add_done_callback(on_response)
+
+    def _batch_done(self, keys, batch_future, values, err):
+        with self.lock:
+            for key in keys:
+                if self.in_flight.get(key) is batch_future:
+                    del self.in_flight[key]
+
+            if err is None:
+                expires = time.monotonic() + self.ttl if self.ttl is not None else None
+                for key in keys:
+                    self._store(key, values.get(key), expires)
+
+        if err is None:
+            batch_future.set_result(values)
+        else:
+            batch_future.set_exception(err)
+
+    def _store(self, key, value, expires):
+        self.cache[key] = (value, expires)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, key, value):
+        """
+        stores a value that is known to be current, for example after writing it to the device
+
+        :param key: the registry key
+        :param value: the value
+        """
+        with self.lock:
+            self._store(key, value, time.monotonic() + self.ttl if self.ttl is not None else None)
+
+    def invalidate(self, keys=None):
+        """
+        removes keys from the cache so that the next get reads them from the device
+
+        :param keys: a key or a list of keys.  None clears the whole cache
+        """
+        with self.lock:
+            if keys is None:
+                self.cache.clear()
+                return
+            if isinstance(keys, str):
+                keys = [keys]
+            for key in keys:
+                self.cache.pop(key, None)
+
+    def get_stats(self):
+        """
+        :return: a dict of the cache hit and miss counts
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "reads": self.reads,
+                "evictions": self.evictions,
+                "in_flight": len(self.in_flight),
+            }
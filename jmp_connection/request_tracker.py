@@ -0,0 +1,136 @@
+import concurrent.futures
+import heapq
+import itertools
+import threading
+import time
+
+"""
+Matches replies to the requests that caused them.  Every JmpMessage carries a Meta Hash and the JNIOR echoes the
+Meta object back in its reply, so a pending request is simply a future keyed by that hash.
+"""
+
+
+class RequestTimeout(concurrent.futures.TimeoutError):
+    """
+    set on a request future when no reply arrived in time
+    """
+    pass
+
+
+class _TimeoutScheduler(object):
+    def __init__(self):
+        """
+        a single daemon thread that expires request futures for every tracker in the process
+        """
+        self.heap = []
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def schedule(self, deadline, future, description):
+        with self.condition:
+            heapq.heappush(self.heap, (deadline, next(self.sequence), future, description))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True, name="jmp-request-timeouts")
+                self.thread.start()
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.heap:
+                    self.condition.wait()
+                deadline, _, future, description = self.heap[0]
+                remaining = deadline - time.monotonic()
+                if 0 < remaining:
+                    self.condition.wait(remaining)
+                    continue
+                heapq.heappop(self.heap)
+
+            if not future.done():
+                try:
+                    future.set_exception(RequestTimeout(f"no reply to {description}"))
+                except concurrent.futures.InvalidStateError:
+                    # the reply arrived or the request was cancelled while we were expiring it
+                    pass
+
+
+_scheduler = _TimeoutScheduler()
+
+
+class RequestTracker(object):
+    def __init__(self):
+        """
+        Holds the outstanding requests for a connection
+        """
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def register(self, meta_hash, timeout=None):
+        """
+        creates the future for a request that is about to be sent
+
+        :param meta_hash: the Meta Hash of the request
+        :param timeout: seconds to wait for the reply before failing the future with RequestTimeout.  None waits
+            until the connection closes
+        :return: a concurrent.futures.Future that resolves to the reply
+        """
+        future = concurrent.futures.Future()
+        with self.lock:
+            if meta_hash in self.pending:
+                raise Exception(f"a request with hash {meta_hash} is already pending")
+            self.pending[meta_hash] = future
+
+        # forget the request however it finishes.  this covers cancellation and timeouts
+        future.add_done_callback(lambda f: self._forget(meta_hash, f))
+
+        if timeout is not None:
+            _scheduler.schedule(time.monotonic() + timeout, future, f"request {meta_hash}")
+        return future
+
+    def _forget(self, meta_hash, future):
+        with self.lock:
+            if self.pending.get(meta_hash) is future:
+                del self.pending[meta_hash]
+
+    def has_pending(self):
+        return 0 < len(self.pending)
+
+    def is_pending(self, meta_hash):
+        return meta_hash in self.pending
+
+    def pending_count(self):
+        return len(self.pending)
+
+    def resolve(self, meta_hash, reply):
+        """
+        completes the request with the given hash
+
+        :param meta_hash: the Meta Hash found in the reply
+        :param reply: the reply message
+        :return: True if a pending request was completed
+        """
+        with self.lock:
+            future = self.pending.pop(meta_hash, None)
+        if future is None:
+            return False
+        try:
+            future.set_result(reply)
+        except concurrent.futures.InvalidStateError:
+            return False
+        return True
+
+    def fail_all(self, err):
+        """
+        fails every outstanding request.  called when the connection is lost
+
+        :param err: the exception to set on each future
+        """
+        with self.lock:
+            futures = list(self.pending.values())
+            self.pending.clear()
+        for future in futures:
+            try:
+                future.set_exception(err)
+            except concurrent.futures.InvalidStateError:
+                pass
@@ -1,57 +1,159 @@
-import io
+import sys
+
+
+def would_block(err):
+    """
+    :return: whether an exception from a non-blocking socket only means that it is not ready yet.  an SSLSocket
+        raises SSLWantReadError when part of a TLS record has arrived
+    """
+    if isinstance(err, BlockingIOError):
+        return True
+    # ssl is only loaded when a connection uses TLS
+    ssl = sys.modules.get("ssl")
+    return ssl is not None and isinstance(err, (ssl.SSLWantReadError, ssl.SSLWantWriteError))
 
 
 class SocketInputStream(object):
-    def __init__(self, socket):
+    def __init__(self, socket, buffer_size=1024 * 32, max_buffer_size=1024 * 1024 * 4, compact_threshold=None):
+        """
+        A receive buffer for a socket.  Data is received directly into a preallocated bytearray with recv_into.
+        Consumed data at the front of the buffer is reclaimed by moving the unread bytes down in place.  The buffer
+        will grow to hold a frame that is larger than its current size but never beyond max_buffer_size.
+
+        :param socket: the socket to receive from
+        :param buffer_size: the initial size of the buffer and the most that is requested per recv
+        :param max_buffer_size: the hard limit on the memory this stream may use
+        :param compact_threshold: how many consumed bytes can sit at the front of the buffer before it is
+            compacted.  defaults to half of the buffer_size
+        """
+        if max_buffer_size < buffer_size:
+            raise Exception("max_buffer_size must be at least buffer_size")
+
         self.socket = socket
-        self.incoming_stream = io.BytesIO()
-        self.next_read_pos = 0
-        self.end_of_stream_pos = 0
+        self.buffer = bytearray(buffer_size)
+        self.max_buffer_size = max_buffer_size
+        self.compact_threshold = compact_threshold if compact_threshold is not None else buffer_size // 2
+
+        # data between read_pos and write_pos has been received but not yet consumed
+        self.read_pos = 0
+        self.write_pos = 0
         self.closed = False
 
+        # statistics used to size the buffer
+        self.recv_count = 0
+        self.bytes_received = 0
+        self.compactions = 0
+        self.high_water_mark = 0
+        self.peak_buffer_size = buffer_size
+
     def data_available(self):
-        return self.incoming_stream.tell() < self.end_of_stream_pos
+        return self.read_pos < self.write_pos
+
+    def available(self):
+        """
+        :return: the number of bytes that have been received but not consumed
+        """
+        return self.write_pos - self.read_pos
 
     def read_available(self):
-        self._read()
+        return self.fill()
 
-    def read(self, count):
-        while self.incoming_stream.tell() + count > self.end_of_stream_pos:
-            self._read()
+    def fill(self):
+        """
+        receives as much data as will fit in the buffer.  blocks until some data is available.  a non-blocking
+        socket raises an exception that would_block() accepts instead
+
+        :return: the number of bytes received
+        """
+        self._make_room()
 
-        return self.incoming_stream.read(count)
+        with memoryview(self.buffer) as view:
+            count = self.socket.recv_into(view[self.write_pos:])
+        if 0 == count:
+            raise Exception("connection closed by the remote host")
 
-    def _read(self):
-        data = self.socket.recv(1024)
+        self.write_pos += count
+        self.recv_count += 1
+        self.bytes_received += count
+        if self.write_pos - self.read_pos > self.high_water_mark:
+            self.high_water_mark = self.write_pos - self.read_pos
 
-        if 0 < len(data):
-            # capture where is the stream we are currently reading from
-            self.next_read_pos = self.incoming_stream.tell()
+        return count
 
-            # we have read all that has been received.  we can reset our pointers
-            if self.next_read_pos == self.end_of_stream_pos:
-                self.next_read_pos = 0
-                self.end_of_stream_pos = 0
-                self.incoming_stream.truncate(0)
+    def consume(self, count):
+        """
+        marks the given number of bytes, starting at read_pos, as processed
 
-            # seek to the end of the stream and write the data that was just read
-            self.incoming_stream.seek(self.end_of_stream_pos)
-            self.incoming_stream.write(data)
+        :param count: the number of bytes to release
+        """
+        if count > self.available():
+            raise Exception("cannot consume more data than is available")
 
-            # capture the new end of the stream
-            self.end_of_stream_pos = self.incoming_stream.tell()
+        self.read_pos += count
+        if self.read_pos == self.write_pos:
+            # everything has been read.  we can start over at the front of the buffer for free
+            self.read_pos = 0
+            self.write_pos = 0
 
-            # seek back to the position where we were last reading from
-            self.incoming_stream.seek(self.next_read_pos)
+    def read(self, count):
+        """
+        blocks until count bytes are available and returns them
+
+        :param count: the number of bytes to read
+        :return: the bytes
+        """
+        while self.available() < count:
+            self.fill()
+
+        data = bytes(self.buffer[self.read_pos:self.read_pos + count])
+        self.consume(count)
+        return data
+
+    def _make_room(self):
+        if self.read_pos >= self.compact_threshold or self.write_pos == len(self.buffer):
+            self.compact()
+
+        if self.write_pos < len(self.buffer):
+            return
+
+        # the unread data fills the whole buffer so a single frame must be larger than the buffer
+        if len(self.buffer) >= self.max_buffer_size:
+            raise Exception(f"receive buffer limit of {self.max_buffer_size} bytes exceeded")
+
+        new_size = min(len(self.buffer) * 2, self.max_buffer_size)
+        self.buffer.extend(bytes(new_size - len(self.buffer)))
+        if new_size > self.peak_buffer_size:
+            self.peak_buffer_size = new_size
+
+    def compact(self):
+        """
+        moves the unread data to the front of the buffer
+        """
+        if 0 == self.read_pos:
+            return
+
+        remaining = self.write_pos - self.read_pos
+        self.buffer[0:remaining] = self.buffer[self.read_pos:self.write_pos]
+        self.read_pos = 0
+        self.write_pos = remaining
+        self.compactions += 1
+
+    def get_stats(self):
+        """
+        :return: a dict of the high-water marks and counters for this stream
+        """
+        return {
+            "buffer_size": len(self.buffer),
+            "max_buffer_size": self.max_buffer_size,
+            "peak_buffer_size": self.peak_buffer_size,
+            "high_water_mark": self.high_water_mark,
+            "recv_count": self.recv_count,
+            "bytes_received": self.bytes_received,
+            "compactions": self.compactions,
+        }
 
     def close(self):
         self.closed = True
 
     def is_closed(self):
         return self.closed
-
-    def tell(self):
-        return self.incoming_stream.tell()
-
-    def seek(self, offset, whence=0):
-        self.incoming_stream.seek(offset, whence)
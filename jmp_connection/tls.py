@@ -0,0 +1,137 @@
+import collections
+import logging
+import select
+import ssl
+import threading
+import time
+
+"""
+TLS settings shared by connections.  The SSLContext is built once and the TLS session of each device is kept so
+that a reconnect, or another connection to the same device, resumes the session instead of doing a full handshake.
+"""
+
+
+class TLSConfig(object):
+    def __init__(self, cafile=None, verify=False, minimum_version=ssl.TLSVersion.TLSv1_2, ack_timeout=0.2,
+                 max_sessions=256):
+        """
+        :param cafile: a file of CA certificates to verify the device with
+        :param verify: whether the device certificate is verified.  JNIORs ship with self signed certificates so
+        this is off by default
+        :param minimum_version: the oldest TLS version that is accepted
+        :param ack_timeout: the most seconds to wait for the device to acknowledge [STARTTLS].  the handshake
+        starts as soon as the acknowledgement arrives
+        :param max_sessions: the most TLS sessions to keep.  the least recently used is dropped first
+        """
+        self.cafile = cafile
+        self.verify = verify
+        self.minimum_version = minimum_version
+        self.ack_timeout = ack_timeout
+        self.max_sessions = max_sessions
+
+        self.lock = threading.Lock()
+        self.context = None
+        # (host, port) -> ssl.SSLSession
+        self.sessions = collections.OrderedDict()
+
+        # statistics
+        self.handshakes = 0
+        self.resumed = 0
+
+    def get_context(self):
+        """
+        :return: the SSLContext.  it is created the first time it is needed
+        """
+        with self.lock:
+            if self.context is None:
+                context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+                context.minimum_version = self.minimum_version
+                if self.verify:
+                    context.load_verify_locations(cafile=self.cafile) if self.cafile else \
+                        context.load_default_certs()
+                else:
+                    context.check_hostname = False
+                    context.verify_mode = ssl.CERT_NONE
+                self.context = context
+            return self.context
+
+    def get_session(self, host, port):
+        with self.lock:
+            session = self.sessions.get((host, port))
+            if session is not None:
+                self.sessions.move_to_end((host, port))
+            return session
+
+    def save_session(self, host, port, session):
+        """
+        keeps the TLS session of a device so that the next connection can resume it
+        """
+        if session is None:
+            return
+        with self.lock:
+            self.sessions[(host, port)] = session
+            self.sessions.move_to_end((host, port))
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+    def wait_for_ack(self, sock):
+        """
+        waits for the device to acknowledge [STARTTLS].  the device sends nothing else until our handshake starts
+        so whatever arrives is the acknowledgement and is discarded
+
+        :return: whether an acknowledgement arrived before ack_timeout
+        """
+        readable, _, _ = select.select([sock], [], [], self.ack_timeout)
+        if not readable:
+            return False
+        ack = sock.recv(4096)
+        if not ack:
+            raise Exception("connection closed while waiting for the STARTTLS acknowledgement")
+        logging.debug(f"STARTTLS acknowledged with {ack!r}")
+        return True
+
+    def wrap(self, sock, host, port):
+        """
+        performs the handshake on a socket whose [STARTTLS] has been acknowledged
+
+        :return: the SSLSocket and a dict with the handshake time and whether the session was resumed
+        """
+        session = self.get_session(host, port)
+        start_time = time.perf_counter()
+        ssl_socket = self.get_context().wrap_socket(sock, session=session)
+        handshake_time = time.perf_counter() - start_time
+
+        with self.lock:
+            self.handshakes += 1
+            if ssl_socket.session_reused:
+                self.resumed += 1
+        self.save_session(host, port, ssl_socket.session)
+
+        return ssl_socket, {
+            "handshake_time": handshake_time,
+            "session_reused": ssl_socket.session_reused,
+            "version": ssl_socket.version(),
+            "cipher": ssl_socket.cipher()[0],
+        }
+
+    def get_stats(self):
+        """
+        :return: a dict with the number of handshakes, how many resumed a session and the sessions kept
+        """
+        with self.lock:
+            return {"handshakes": self.handshakes, "resumed": self.resumed, "sessions": len(self.sessions)}
+
+
+_default_config = None
+_default_config_lock = threading.Lock()
+
+
+def get_default_tls_config():
+    """
+    :return: the TLSConfig used by connections that are not given one
+    """
+    global _default_config
+    with _default_config_lock:
+        if _default_config is None:
+            _default_config = TLSConfig()
+        return _default_config
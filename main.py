@@ -1,3 +1,4 @@
+import logging
 import time
 
 from jmp_connection.jmp_connection import JMPConnection
@@ -51,6 +52,10 @@ def message_recv_handler(jmp_connection2, jmp_message):
     print(f"jmp_connection: {jmp_connection2.get_host_info()} received {jmp_message.to_json()}")
 
 
+#
+# the connection logs through the logging module.  use logging.DEBUG to see every message that is sent and received
+logging.basicConfig(level=logging.INFO)
+
 #
 # define the JMP connection object
 jmp_connection = JMPConnection()
@@ -0,0 +1,49 @@
+import shutil
+import subprocess
+
+import pytest
+
+from jmp_connection.jmp_connection import JMPConnection
+from jmp_connection.jnior_simulator import JniorSimulator
+
+
+@pytest.fixture
+def simulator():
+    simulator = JniorSimulator(registry={"$Serial Number": "620010001"})
+    simulator.start()
+    yield simulator
+    simulator.stop()
+
+
+@pytest.fixture
+def certificate(tmp_path):
+    """
+    a self signed certificate and key for a TLS simulator
+    """
+    if shutil.which("openssl") is None:
+        pytest.skip("openssl is needed to make a certificate")
+    certfile = str(tmp_path / "cert.pem")
+    keyfile = str(tmp_path / "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", keyfile, "-out",
+                    certfile, "-days", "1", "-subj", "/CN=localhost"], check=True, capture_output=True)
+    return certfile, keyfile
+
+
+@pytest.fixture
+def connect(simulator):
+    """
+    a factory for logged in connections to the simulator.  they are closed at the end of the test
+    """
+    connections = []
+
+    def create(**options):
+        connection = JMPConnection(**options)
+        connection.set_credentials(simulator.username, simulator.password)
+        connections.append(connection)
+        assert connection.connect(*simulator.get_address())
+        assert connection.wait_for_authentication(5.0)
+        return connection
+
+    yield create
+    for connection in connections:
+        connection.close()
@@ -0,0 +1,66 @@
+import asyncio
+
+from jmp_connection.async_jmp_connection import AsyncJMPConnection
+from jmp_connection.jmp_messages import MonitorMessage, RegistryReadMessage
+
+
+async def _connect(simulator, password=None):
+    connection = AsyncJMPConnection()
+    connection.set_credentials(simulator.username, password if password is not None else simulator.password)
+    assert await connection.connect(*simulator.get_address())
+    return connection
+
+
+def test_login_and_request(simulator):
+    async def run():
+        connection = await _connect(simulator)
+        try:
+            assert await connection.wait_for_authentication(5.0)
+            reply = await connection.request(RegistryReadMessage(["$Serial Number"]), 5.0)
+            assert "Registry Read Response" == reply.message
+            assert "620010001" == reply.json["Keys"]["$Serial Number"]
+        finally:
+            await connection.close()
+        assert not connection.is_connected()
+
+    asyncio.run(run())
+
+
+def test_bad_password_is_reported(simulator):
+    async def run():
+        connection = AsyncJMPConnection()
+        results = []
+        connection.add_auth_handler(lambda c, authorized, **kwargs: results.append(authorized))
+        connection.set_credentials(simulator.username, "wrong")
+        assert await connection.connect(*simulator.get_address())
+        try:
+            assert not await connection.wait_for_authentication(0.5)
+            assert [False] == results
+        finally:
+            await connection.close()
+
+    asyncio.run(run())
+
+
+def test_receive_by_message_type(simulator):
+    async def run():
+        connection = await _connect(simulator)
+        monitors = []
+        connection.add_message_recv_handler(lambda c, jmp_message: monitors.append(jmp_message), MonitorMessage)
+        try:
+            assert await connection.wait_for_authentication(5.0)
+            # the Monitor that follows the login went to the general queue
+            assert isinstance(await connection.receive(timeout=5.0), MonitorMessage)
+            receiver = asyncio.ensure_future(connection.receive("Monitor", 5.0))
+            await asyncio.sleep(0)
+            simulator.set_input(1, 1)
+            jmp_message = await receiver
+            assert isinstance(jmp_message, MonitorMessage)
+            assert 1 == jmp_message.inputs["1"]["State"]
+            assert 2 == len(monitors)
+            # a message taken by a typed receiver is not queued as well
+            assert 0 == len(connection.receive_queue)
+        finally:
+            await connection.close()
+
+    asyncio.run(run())
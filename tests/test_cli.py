@@ -0,0 +1,39 @@
+import json
+
+from jmp_connection.cli import DEFAULT_PORT, load_inventory, main
+
+
+def test_text_inventory(tmp_path):
+    path = tmp_path / "devices.txt"
+    path.write_text("# lobby\n10.0.0.78\n\n10.0.0.79:9999 admin secret\n  # basement\n")
+    targets = load_inventory(str(path), username="jnior", password="jnior")
+    assert [("10.0.0.78", DEFAULT_PORT, "jnior", "jnior", f"10.0.0.78:{DEFAULT_PORT}"),
+            ("10.0.0.79", 9999, "admin", "secret", "10.0.0.79:9999")] == \
+        [(target.host, target.port, target.username, target.password, target.name) for target in targets]
+
+
+def test_json_inventory(tmp_path):
+    path = tmp_path / "devices.json"
+    path.write_text(json.dumps(["10.0.0.78:9300",
+                                {"host": "10.0.0.79", "port": 9400, "username": "admin", "name": "lobby"}]))
+    targets = load_inventory(str(path), default_port=9220, username="jnior", password="jnior")
+    assert [("10.0.0.78", 9300, "jnior", "jnior", "10.0.0.78:9300"),
+            ("10.0.0.79", 9400, "admin", "jnior", "lobby")] == \
+        [(target.host, target.port, target.username, target.password, target.name) for target in targets]
+
+
+def test_bad_inventory(tmp_path, capsys):
+    path = tmp_path / "devices.json"
+    path.write_text("[{\"port\": 9220}]")
+    assert 2 == main(["--inventory", str(path), "registry", "read", "$Serial Number"])
+    assert "unable to read the inventory" in capsys.readouterr().err
+
+
+def test_registry_read_against_every_host(simulator, capsys):
+    host, port = simulator.get_address()
+    hosts = f"{host}:{port},{host}:1"
+    assert 1 == main(["--hosts", hosts, "--timeout", "2", "registry", "read", "$Serial Number"])
+    results = {result["port"]: result for result in map(json.loads, capsys.readouterr().out.splitlines())}
+    assert results[port]["ok"]
+    assert {"$Serial Number": "620010001"} == results[port]["result"]
+    assert not results[1]["ok"]
@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+from jmp_connection.connection_pool import JMPConnectionPool, PoolExhausted
+
+
+@pytest.fixture
+def pool():
+    pool = JMPConnectionPool(max_size=2, connect_timeout=5.0)
+    yield pool
+    pool.close()
+
+
+def _acquire(pool, simulator, **options):
+    host, port = simulator.get_address()
+    return pool.acquire(host, port, simulator.username, simulator.password, **options)
+
+
+def test_released_connections_are_reused(simulator, pool):
+    connection = _acquire(pool, simulator)
+    assert connection.is_authenticated()
+    pool.release(connection)
+    assert connection is _acquire(pool, simulator)
+    stats = pool.get_stats()
+    assert (1, 1, 1, 0) == (stats["created"], stats["reused"], stats["in_use"], stats["idle"])
+
+
+def test_exhausted_pool(simulator, pool):
+    first = _acquire(pool, simulator)
+    _acquire(pool, simulator)
+    with pytest.raises(PoolExhausted):
+        _acquire(pool, simulator, timeout=0.05)
+
+    # a release hands the connection to a waiting acquire
+    threading.Timer(0.05, pool.release, [first]).start()
+    assert first is _acquire(pool, simulator, timeout=5.0)
+
+
+def test_refused_login_fails_fast(simulator, pool):
+    host, port = simulator.get_address()
+    with pytest.raises(Exception, match="refused"):
+        pool.acquire(host, port, simulator.username, "wrong")
+    assert 0 == pool.get_stats()["created"]
+
+
+def test_discard_and_unhealthy_connections(simulator):
+    pool = JMPConnectionPool(max_size=2, health_check=lambda connection: False)
+    try:
+        with pytest.raises(ValueError):
+            with pool.connection(*simulator.get_address(), simulator.username, simulator.password) as connection:
+                raise ValueError()
+        assert not connection.is_connected()
+
+        connection = _acquire(pool, simulator)
+        pool.release(connection)
+        # the health check refuses the idle connection so a new one is made
+        assert connection is not _acquire(pool, simulator)
+        assert 2 == pool.get_stats()["discarded"]
+    finally:
+        pool.close()
+
+
+def test_idle_connections_are_evicted(simulator):
+    pool = JMPConnectionPool(max_idle_time=0.0, eviction_interval=60.0)
+    try:
+        pool.warm(*simulator.get_address(), simulator.username, simulator.password, count=2)
+        assert 2 == pool.get_stats()["idle"]
+        assert 2 == pool.evict_idle()
+        assert 0 == pool.get_stats()["idle"]
+    finally:
+        pool.close()
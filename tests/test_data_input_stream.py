@@ -0,0 +1,69 @@
+import io
+import struct
+
+import pytest
+
+from jmp_connection.data_input_stream import DataInputStream
+
+DATA = struct.pack('>?bBhHiIqQfd', True, -2, 254, -3, 65533, -4, 4294967292, -5, 2 ** 64 - 5, 1.5, 2.25) + \
+    b'\x03abc' + b'\x00\x02hi' + b'\x00\x03\xc3\xa9a'
+
+
+def _check_values(stream):
+    assert [True, -2, 254, -3, 65533, -4, 4294967292, -5, 2 ** 64 - 5, 1.5, 2.25] == [
+        stream.read_boolean(), stream.read_byte(), stream.read_unsigned_byte(), stream.read_short(),
+        stream.read_unsigned_short(), stream.read_int(), stream.read_unsigned_int(), stream.read_long(),
+        stream.read_unsigned_long(), stream.read_float(), stream.read_double()]
+    assert "abc" == stream.read_string()
+    assert "hi" == stream.read_string2()
+    assert "éa" == stream.read_utf()
+    assert 0 == stream.get_remaining_length()
+
+
+@pytest.mark.parametrize("wrap", [bytes, bytearray, memoryview])
+def test_read_values_from_a_buffer(wrap):
+    _check_values(DataInputStream(wrap(DATA)))
+
+
+def test_read_values_from_a_mapped_file(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(b'skip' + DATA)
+    with open(path, "rb") as f:
+        f.read(4)
+        with DataInputStream(f) as stream:
+            assert stream.mmap is not None
+            _check_values(stream)
+
+
+def test_read_values_from_an_unmapped_file():
+    stream = DataInputStream(io.BytesIO(DATA))
+    assert stream.mmap is None
+    _check_values(stream)
+
+
+def test_read_arrays():
+    stream = DataInputStream(struct.pack('>3h2i2q2d', -1, 2, -3, 4, -5, 6, -7, 0.5, 1.5) + b'\x01\x02')
+    assert [-1, 2, -3] == list(stream.read_shorts(3))
+    assert [4, -5] == list(stream.read_ints(2))
+    assert [6, -7] == list(stream.read_longs(2))
+    assert [0.5, 1.5] == list(stream.read_doubles(2))
+    assert [1, 2] == list(stream.read_unsigned_bytes(2))
+
+
+def test_read_structs():
+    record = struct.Struct('>qH')
+    stream = DataInputStream(record.pack(1, 2) + record.pack(3, 4))
+    assert [(1, 2), (3, 4)] == stream.read_structs(record, 2)
+
+
+def test_reading_past_the_end():
+    stream = DataInputStream(b'\x00\x01\x02')
+    with pytest.raises(EOFError):
+        stream.read_int()
+    # a failed read does not move the position
+    assert 0 == stream.tell()
+    assert 3 == stream.skip_bytes(10)
+    with pytest.raises(EOFError):
+        stream.seek(4)
+    stream.seek(1)
+    assert b'\x01\x02' == stream.read_remaining()
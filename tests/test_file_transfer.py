@@ -0,0 +1,52 @@
+import io
+import os
+
+import pytest
+
+from jmp_connection.file_transfer import FileDownloader, FileTransferError, decode_file_data
+
+DATA = bytes(range(256)) * 200
+
+
+def test_download(simulator, connect, tmp_path):
+    simulator.files["/temp/data.bin"] = DATA
+    connection = connect()
+    dest = str(tmp_path / "data.bin")
+    stats = FileDownloader(connection, chunk_size=4096, max_chunk_size=4096).download("/temp/data.bin", dest)
+    with open(dest, "rb") as f:
+        assert DATA == f.read()
+    assert len(DATA) == stats["size"] == stats["bytes"]
+    assert not os.path.exists(dest + ".part")
+
+
+def test_short_reads_are_retried(simulator, connect):
+    simulator.files["/temp/data.bin"] = DATA
+
+    def half(response):
+        data = decode_file_data(response)
+        return data[:max(1, len(data) // 2)]
+
+    f = io.BytesIO()
+    stats = FileDownloader(connect(), chunk_size=4096, data_decoder=half).download("/temp/data.bin", f)
+    assert DATA == f.getvalue()
+    assert len(DATA) // 4096 < stats["requests"]
+
+
+def test_empty_read_before_the_end_fails(simulator, connect, tmp_path):
+    simulator.files["/temp/data.bin"] = DATA
+
+    def stop_after_first_chunk(response):
+        data = decode_file_data(response)
+        return data if 0 == response.json.get("Offset", 0) else b''
+
+    dest = str(tmp_path / "data.bin")
+    with pytest.raises(FileTransferError):
+        FileDownloader(connect(), chunk_size=4096, timeout=5.0,
+                       data_decoder=stop_after_first_chunk).download("/temp/data.bin", dest)
+    assert not os.path.exists(dest + ".part")
+    assert not os.path.exists(dest)
+
+
+def test_refused_read(connect):
+    with pytest.raises(FileTransferError):
+        FileDownloader(connect()).download("/temp/missing.bin", io.BytesIO())
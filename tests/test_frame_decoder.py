@@ -0,0 +1,45 @@
+import pytest
+
+from jmp_connection.frame_decoder import FrameDecodeError, FrameDecoder, encode_frame
+
+
+def test_encode_frame():
+    assert b'[2,{}]' == encode_frame("{}")
+    assert b'[2,{}]' == encode_frame(b"{}")
+
+
+def test_decode_every_complete_frame():
+    buffer = bytearray(encode_frame(b'{"a":1}') + encode_frame(b'{"b":2}') + b'[7,{"c"')
+    frames, consumed = FrameDecoder().decode(buffer)
+    assert [b'{"a":1}', b'{"b":2}'] == frames
+    # the partial frame is left in the buffer
+    assert b'[7,{"c"' == bytes(buffer[consumed:])
+
+
+def test_decode_without_copying():
+    buffer = bytearray(b'noise' + encode_frame(b'{"a":1}'))
+    frames, consumed = FrameDecoder().decode(memoryview(buffer), copy=False)
+    assert isinstance(frames[0], memoryview)
+    assert b'{"a":1}' == frames[0].tobytes()
+    assert len(buffer) == consumed
+
+
+def test_feed_in_single_bytes():
+    decoder = FrameDecoder()
+    data = encode_frame(b'{"Message":"Monitor"}') * 3
+    frames = []
+    for i in range(len(data)):
+        frames += decoder.feed(data[i:i + 1])
+    assert [b'{"Message":"Monitor"}'] * 3 == frames
+    assert 0 == len(decoder.pending)
+
+
+@pytest.mark.parametrize("data", [b'[12345678901234,{}]', b'[1x,{}]', b'[2,{}}'])
+def test_malformed_frames(data):
+    with pytest.raises(FrameDecodeError):
+        FrameDecoder().decode(data)
+
+
+def test_max_frame_size():
+    with pytest.raises(FrameDecodeError):
+        FrameDecoder(max_frame_size=4).decode(encode_frame(b'{"a":1}'))
@@ -0,0 +1,96 @@
+import json
+import struct
+import threading
+
+from jmp_connection.frame_recorder import FrameRecorder, FrameRecording, INBOUND, OUTBOUND, replay
+from jmp_connection.jmp_connection import JMPConnection
+from jmp_connection.message_dispatcher import MessageDispatcher
+from tests.util import wait_until
+
+
+def _monitor(i):
+    return json.dumps({"Message": "Monitor", "Sequence": i, "Meta": {}})
+
+
+def _record(path, count=10):
+    with FrameRecorder(path) as recorder:
+        for i in range(count):
+            recorder.record(INBOUND, _monitor(i), timestamp=1000.0 + i)
+            recorder.record(OUTBOUND, b'{"Message":""}', timestamp=1000.0 + i)
+
+
+def test_recording_round_trip(tmp_path):
+    path = str(tmp_path / "capture.jmprec")
+    _record(path)
+    with FrameRecording(path) as recording:
+        assert 20 == len(recording)
+        inbound = [bytes(frame.payload) for frame in recording.frames(direction=INBOUND)]
+        assert [_monitor(i).encode() for i in range(10)] == inbound
+        assert 4 == recording.find_time(1002.0)
+        assert 9.0 == recording.get_duration()
+        del inbound
+
+
+def test_log_without_index_is_walked(tmp_path):
+    path = str(tmp_path / "capture.jmprec")
+    _record(path)
+    open(path + ".idx", "wb").close()
+    with FrameRecording(path) as recording:
+        assert 20 == len(recording)
+
+
+def test_index_entry_past_the_end_is_rejected(tmp_path):
+    path = str(tmp_path / "capture.jmprec")
+    _record(path, 1)
+    # cut the last payload short.  the index still points at its record
+    with open(path, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 4)
+    with FrameRecording(path) as recording:
+        assert 1 == len(recording)
+        assert _monitor(0).encode() == bytes(recording[0].payload)
+
+
+def _dispatch_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith("jmp-dispatch")]
+
+
+def test_replay_through_a_temporary_connection(tmp_path):
+    path = str(tmp_path / "capture.jmprec")
+    _record(path, 100)
+    before = len(_dispatch_threads())
+    with FrameRecording(path) as recording:
+        stats = replay(recording)
+    assert 100 == stats["frames"]
+    assert wait_until(lambda: len(_dispatch_threads()) <= before)
+
+
+def test_replay_only_waits_for_its_own_frames(tmp_path):
+    path = str(tmp_path / "capture.jmprec")
+    _record(path, 50)
+    dispatcher = MessageDispatcher(workers=2)
+    release = threading.Event()
+    received = []
+    try:
+        connection = JMPConnection(dispatcher=dispatcher)
+        # unrelated traffic on the other lane of the shared dispatcher that is still waiting
+        other = next(key for key in range(100)
+                     if dispatcher._select_lane(key, None) is not dispatcher._select_lane(connection, None))
+        dispatcher.submit(release.wait, connection=other)
+        connection.add_message_recv_handler(lambda c, jmp_message: received.append(jmp_message.json["Sequence"]),
+                                            "Monitor")
+        with FrameRecording(path) as recording:
+            stats = replay(recording, connection)
+        assert 50 == stats["frames"]
+        assert list(range(50)) == received
+    finally:
+        release.set()
+        dispatcher.shutdown()
+
+
+def test_record_header_layout(tmp_path):
+    path = str(tmp_path / "capture.jmprec")
+    _record(path, 1)
+    with open(path, "rb") as f:
+        data = f.read()
+    timestamp, direction, length = struct.unpack_from("<dBI", data, 8)
+    assert (1000.0, INBOUND, len(_monitor(0))) == (timestamp, direction, length)
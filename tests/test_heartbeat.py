@@ -0,0 +1,60 @@
+import threading
+import time
+
+from jmp_connection.heartbeat import RttEstimator
+from tests.util import wait_until
+
+
+def test_rtt_estimator_follows_the_samples():
+    rtt = RttEstimator(min_timeout=0.0)
+    assert rtt.default_timeout == rtt.timeout()
+    rtt.observe(0.1)
+    assert 0.1 == rtt.srtt
+    assert abs(0.3 - rtt.timeout()) < 1e-9
+    for _ in range(50):
+        rtt.observe(0.2)
+    assert abs(0.2 - rtt.srtt) < 0.01
+    assert 0.1 == rtt.min
+
+
+def test_rtt_timeout_is_bounded():
+    rtt = RttEstimator(min_timeout=1.0, max_timeout=2.0)
+    rtt.observe(0.001)
+    assert 1.0 == rtt.timeout()
+    rtt.observe(100.0)
+    assert 2.0 == rtt.timeout()
+
+
+def test_heartbeats_keep_an_idle_connection(connect):
+    connection = connect(heartbeat_interval=0.1)
+    assert wait_until(lambda: 3 <= connection.rtt.samples)
+    assert connection.is_connected()
+    assert 0 == connection.missed_heartbeats
+
+
+def test_silent_device_is_detected(simulator, connect):
+    connection = connect(heartbeat_interval=0.1, heartbeat_misses=2)
+    assert wait_until(lambda: 1 <= connection.rtt.samples)
+    simulator.silent = True
+    start_time = time.monotonic()
+    assert wait_until(lambda: not connection.is_connected(), timeout=10.0)
+    # two heartbeats at the smallest adaptive timeout and an interval of silence before the first
+    assert time.monotonic() - start_time < 5.0
+
+
+def test_silence_right_after_login_is_detected(simulator, connect):
+    connection = connect(heartbeat_interval=0.3, heartbeat_misses=2)
+    simulator.silent = True
+    start_time = time.monotonic()
+    assert wait_until(lambda: not connection.is_connected(), timeout=10.0)
+    # without a measured round trip the heartbeat waits on the interval, not the 30 second default timeout
+    assert time.monotonic() - start_time < 5.0
+
+
+def test_lost_connection_is_not_torn_down_on_the_timeout_thread(simulator, connect):
+    connection = connect(heartbeat_interval=0.1, heartbeat_misses=1)
+    threads = []
+    connection.add_connection_handler(lambda c, connected, socket=None: threads.append(threading.current_thread()))
+    simulator.silent = True
+    assert wait_until(lambda: threads, timeout=10.0)
+    assert "jmp-request-timeouts" != threads[0].name
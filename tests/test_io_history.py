@@ -0,0 +1,56 @@
+import subprocess
+import sys
+
+from jmp_connection.io_history import COUNT, DUTY_CYCLE, INPUT, ON_TIME, OUTPUT, TRANSITIONS, IOHistory
+
+
+def _history():
+    history = IOHistory(capacity=16, count_channels=2)
+    # input 1 on from 100 to 110 and from 120 to 125, output 2 on from 105
+    history.record(0b0, 0b00, [0, 0], timestamp=100.0)
+    history.record(0b1, 0b00, [1, 0], timestamp=100.0)
+    history.record(0b1, 0b10, [1, 0], timestamp=105.0)
+    history.record(0b0, 0b10, [1, 0], timestamp=110.0)
+    history.record(0b1, 0b10, [2, 0], timestamp=120.0)
+    history.record(0b0, 0b10, [2, 0], timestamp=125.0)
+    return history
+
+
+def test_importing_the_fleet_does_not_import_numpy():
+    code = "import sys, jmp_connection.jmp_fleet; print('numpy' in sys.modules)"
+    output = subprocess.check_output([sys.executable, "-c", code], text=True)
+    assert "False" == output.strip()
+
+
+def test_window_queries():
+    history = _history()
+    assert 15.0 == history.on_time(INPUT, 1, end=130.0)
+    assert 0.5 == history.duty_cycle(INPUT, 1, end=130.0)
+    assert 4 == history.transition_count(INPUT, 1, end=130.0)
+    assert 1 == history.transition_count(OUTPUT, 2, end=130.0)
+    assert 25.0 == history.on_time(OUTPUT, 2, end=130.0)
+    assert 2 == history.count_delta(1, end=130.0)
+
+
+def test_aggregate_into_buckets():
+    history = _history()
+    starts, transitions = history.aggregate(INPUT, 1, 10.0, TRANSITIONS, end=130.0)
+    assert [100.0, 110.0, 120.0] == list(starts)
+    assert [1, 1, 2] == list(transitions)
+    _, on_times = history.aggregate(INPUT, 1, 10.0, ON_TIME, end=130.0)
+    assert [10.0, 0.0, 5.0] == [float(value) for value in on_times]
+    _, duty_cycles = history.aggregate(INPUT, 1, 10.0, DUTY_CYCLE, end=130.0)
+    assert [1.0, 0.0, 0.5] == [float(value) for value in duty_cycles]
+    _, counts = history.aggregate(INPUT, 1, 10.0, COUNT, end=130.0)
+    assert [1, 0, 1] == [int(value) for value in counts]
+
+
+def test_oldest_samples_are_overwritten():
+    history = IOHistory(capacity=4, count_channels=1)
+    for i in range(10):
+        history.record(i & 1, 0, [i], timestamp=float(i))
+    assert 4 == len(history)
+    assert 10 == history.recorded
+    # only the samples from 6 on are left
+    assert 3 == history.transition_count(INPUT, 1, end=10.0)
+    assert 3 == history.count_delta(1, end=10.0)
@@ -0,0 +1,69 @@
+from jmp_connection.io_history import INPUT, IOHistory
+from jmp_connection.io_state import IOStateRegistry, IOStateStore
+from tests.util import wait_until
+
+
+def _monitor(inputs, outputs=()):
+    return {
+        "Message": "Monitor",
+        "Inputs": {str(i + 1): {"State": state, "Count": count} for i, (state, count) in enumerate(inputs)},
+        "Outputs": [{"State": state} for state in outputs],
+    }
+
+
+def test_first_message_only_initializes():
+    store = IOStateStore()
+    changes = []
+    store.on_input_change += lambda s, channel, state, count: changes.append(channel)
+    assert (0, 0) == store.update(_monitor([(1, 5), (0, 0)], [0, 1]))
+    assert [] == changes
+    assert 1 == store.get_input(1)
+    assert 1 == store.get_output(2)
+    assert 5 == store.get_count(1)
+
+
+def test_only_changed_channels_fire():
+    store = IOStateStore()
+    inputs = []
+    outputs = []
+    store.on_input_change += lambda s, channel, state, count: inputs.append((channel, state, count))
+    store.on_output_change += lambda s, channel, state: outputs.append((channel, state))
+    store.update(_monitor([(0, 0), (0, 0), (0, 0)], [0, 0]))
+    assert (0b101, 0b10) == store.update(_monitor([(1, 1), (0, 0), (1, 1)], [0, 1]))
+    assert [(1, 1, 1), (3, 1, 1)] == inputs
+    assert [(2, 1)] == outputs
+
+
+def test_counter_change_without_a_state_change_is_reported():
+    store = IOStateStore()
+    inputs = []
+    store.on_input_change += lambda s, channel, state, count: inputs.append((channel, state, count))
+    store.update(_monitor([(0, 3)]))
+    # the input pulsed between two Monitor messages
+    store.update(_monitor([(0, 4)]))
+    assert [(1, 0, 4)] == inputs
+
+
+def test_changes_are_recorded_in_the_history():
+    history = IOHistory(capacity=8)
+    store = IOStateStore(history=history)
+    store.update(_monitor([(0, 0)]))
+    store.update(_monitor([(0, 0)]))
+    store.update(_monitor([(1, 1)]))
+    assert 2 == len(history)
+    assert 1 == history.transition_count(INPUT, 1)
+
+
+def test_registry_follows_a_connection(simulator, connect):
+    registry = IOStateRegistry()
+    connection = connect()
+    store = registry.attach(connection, name="device")
+    simulator.set_input(2, 1)
+    assert wait_until(lambda: 1 == store.get_input(2))
+    assert 0b10 == registry.snapshot()["device"][0]
+
+    registry.detach("device")
+    assert registry.get("device") is None
+    simulator.set_input(2, 0)
+    simulator.set_input(3, 1)
+    assert not wait_until(lambda: 1 == store.get_input(3), timeout=0.2)
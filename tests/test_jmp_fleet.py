@@ -0,0 +1,63 @@
+import os
+import socket
+
+import pytest
+
+from jmp_connection.jmp_fleet import JMPFleet
+from jmp_connection.jmp_messages import RegistryReadMessage
+from jmp_connection.jnior_simulator import JniorSimulator
+from jmp_connection.tls import TLSConfig
+
+
+@pytest.fixture
+def fleet():
+    fleet = JMPFleet(io_threads=1)
+    yield fleet
+    fleet.close()
+
+
+def _add(fleet, simulator, **options):
+    connection = fleet.add(*simulator.get_address(), username=simulator.username, password=simulator.password,
+                           **options)
+    assert connection.wait_for_authentication(5.0)
+    return connection
+
+
+def test_fleet_sockets_do_not_block(simulator, fleet):
+    connection = _add(fleet, simulator)
+    assert 0.0 == connection.socket.gettimeout()
+    futures = [connection.request(RegistryReadMessage([]), 5.0) for _ in range(100)]
+    for future in futures:
+        assert future.result(5.0) is not None
+
+
+def test_partial_tls_record_does_not_stall_the_io_thread(simulator, fleet, certificate):
+    tls_simulator = JniorSimulator(certfile=certificate[0], keyfile=certificate[1])
+    tls_simulator.start()
+    try:
+        _add(fleet, tls_simulator, use_tls=True, tls_config=TLSConfig())
+        healthy = _add(fleet, simulator)
+
+        # the header of a TLS record with only part of its body.  the device then stalls
+        with tls_simulator.lock:
+            client = next(iter(tls_simulator.clients))
+        raw = socket.socket(fileno=os.dup(client.socket.fileno()))
+        raw.sendall(b'\x17\x03\x03\x01\x00' + b'\0' * 16)
+        raw.close()
+
+        assert healthy.request(RegistryReadMessage([]), 5.0).result(5.0) is not None
+    finally:
+        tls_simulator.stop()
+
+
+def test_closed_socket_does_not_stop_the_io_thread(simulator, fleet):
+    closed = socket.socket()
+    closed.close()
+    io_thread = fleet.io_threads[0]
+    with io_thread.lock:
+        io_thread.pending.append((True, None, closed))
+    io_thread._wake()
+
+    connection = _add(fleet, simulator)
+    assert connection.request(RegistryReadMessage([]), 5.0).result(5.0) is not None
+    assert io_thread.thread.is_alive()
@@ -0,0 +1,76 @@
+import pytest
+
+from jmp_connection.jmp_connection import JMPConnection
+from jmp_connection.jmp_gateway import JMPGateway
+from jmp_connection.jmp_messages import FileListMessage, RegistryReadMessage
+from tests.util import wait_until
+
+
+@pytest.fixture
+def gateway(simulator):
+    gateway = JMPGateway(*simulator.get_address(), username=simulator.username, password=simulator.password,
+                         listen_port=0, request_timeout=0.3)
+    gateway.start()
+    assert gateway.upstream.wait_for_authentication(5.0)
+    yield gateway
+    gateway.stop()
+
+
+@pytest.fixture
+def gateway_client(gateway, simulator):
+    clients = []
+
+    def create():
+        client = JMPConnection()
+        client.set_credentials(simulator.username, simulator.password)
+        clients.append(client)
+        assert client.connect(*gateway.get_address())
+        assert client.wait_for_authentication(5.0)
+        return client
+
+    yield create
+    for client in clients:
+        client.close()
+
+
+def test_reads_are_forwarded_and_cached(simulator, gateway, gateway_client):
+    simulator.registry["$Model"] = "412"
+    client = gateway_client()
+    for _ in range(3):
+        reply = client.request(RegistryReadMessage(["$Model"]), 5.0).result()
+        assert {"$Model": "412"} == reply.json["Keys"]
+    assert 1 == gateway.get_stats()["forwarded"]
+    assert 2 == gateway.get_stats()["cache_hits"]
+
+
+def test_every_waiter_gets_an_error_when_the_device_times_out(simulator, gateway, gateway_client):
+    first = gateway_client()
+    second = gateway_client()
+    simulator.silent = True
+    futures = [client.request(RegistryReadMessage(["$Model"]), 5.0) for client in (first, second)]
+    for future in futures:
+        assert "Error" == future.result(5.0).message
+    assert wait_until(lambda: 1 == gateway.get_stats()["timeouts"])
+    assert 0 == gateway.get_stats()["failures"]
+
+
+def test_lost_device_is_a_failure(simulator, gateway, gateway_client):
+    client = gateway_client()
+    simulator.silent = True
+    future = client.request(RegistryReadMessage(["$Model"]), 5.0)
+    assert wait_until(lambda: gateway.upstream.request_tracker.has_pending())
+    gateway.upstream.close()
+    assert "Error" == future.result(5.0).message
+    assert 1 == gateway.get_stats()["failures"]
+    assert 0 == gateway.get_stats()["timeouts"]
+
+
+def test_error_replies_are_not_cached(simulator, gateway, gateway_client):
+    client = gateway_client()
+    for _ in range(2):
+        assert "Error" == client.request(FileListMessage("/missing/"), 5.0).result().message
+    assert 0 == gateway.get_stats()["cache_hits"]
+    assert 2 == gateway.get_stats()["forwarded"]
+
+    simulator.files["/missing/a.txt"] = b"a"
+    assert "File List Response" == client.request(FileListMessage("/missing/"), 5.0).result().message
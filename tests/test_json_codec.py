@@ -0,0 +1,50 @@
+import pytest
+
+from jmp_connection.jmp_messages import MonitorMessage, RegistryReadMessage
+from jmp_connection.json_codec import JsonCodec, LazyJmpMessage, create_lazy_message, get_codec, \
+    peek_message_name, peek_meta_hash
+
+
+def test_peek_message_name():
+    assert "Monitor" == peek_message_name(b'{"Message": "Monitor", "Inputs": {}}')
+    assert peek_message_name(b'{"Inputs": {}}') is None
+
+
+def test_peek_meta_hash_ignores_a_hash_outside_the_meta():
+    payload = b'{"Message":"File Read Response","Hash":"body","Meta":{"Hash":"abc"}}'
+    assert "abc" == peek_meta_hash(payload)
+    assert peek_meta_hash(b'{"Message":"Monitor","Hash":"body","Meta":{}}') is None
+    assert peek_meta_hash(b'{"Message":"Monitor"}') is None
+
+
+def test_peek_meta_hash_parses_when_the_meta_is_nested():
+    payload = b'{"Message":"Error","Meta":{"Trace":{"Id":1},"Hash":"abc"}}'
+    assert "abc" == peek_meta_hash(payload)
+    assert "abc" == peek_meta_hash(memoryview(payload))
+
+
+def test_unknown_codec():
+    assert isinstance(get_codec(), JsonCodec)
+    assert isinstance(get_codec("auto"), JsonCodec)
+    with pytest.raises(Exception):
+        get_codec("yaml")
+
+
+def test_lazy_message_routes_without_parsing():
+    jmp_message = create_lazy_message(b'{"Message":"Monitor","Meta":{"Hash":"abc"},"Model":"410"}')
+    assert isinstance(jmp_message, LazyJmpMessage)
+    assert isinstance(jmp_message, MonitorMessage)
+    assert "Monitor" == jmp_message.message
+    assert "abc" == jmp_message.meta_hash
+    assert not jmp_message.is_parsed()
+    assert "410" == jmp_message.model
+    assert jmp_message.is_parsed()
+
+
+def test_lazy_connection_resolves_requests(connect):
+    connection = connect(lazy_decode=True)
+    future = connection.request(RegistryReadMessage(["$Serial Number"]))
+    reply = future.result(5.0)
+    assert isinstance(reply, LazyJmpMessage)
+    assert "Registry Read Response" == reply.message
+    assert "Registry Read Response" == reply.json["Message"]
@@ -0,0 +1,126 @@
+import threading
+
+import pytest
+
+from jmp_connection.jmp_connection import JMPConnection
+from jmp_connection.message_dispatcher import DispatchQueueFull, FULL_DISCONNECT, FULL_DROP_OLDEST, \
+    MessageDispatcher, ORDER_CONNECTION
+from tests.util import wait_until
+
+
+def _dispatcher_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith("jmp-dispatch")]
+
+
+def test_connection_order_is_kept():
+    dispatcher = MessageDispatcher(workers=4, ordering=ORDER_CONNECTION)
+    received = {"a": [], "b": []}
+    try:
+        for i in range(500):
+            for name in received:
+                dispatcher.submit(received[name].append, [i], connection=name)
+        assert wait_until(lambda: 1000 == dispatcher.get_stats()["completed"])
+    finally:
+        dispatcher.shutdown()
+    assert received["a"] == list(range(500))
+    assert received["b"] == list(range(500))
+
+
+def test_drop_oldest_when_full():
+    release = threading.Event()
+    handled = []
+    dispatcher = MessageDispatcher(workers=1, queue_size=2, full_policy=FULL_DROP_OLDEST)
+    try:
+        dispatcher.submit(release.wait)
+        assert wait_until(lambda: 0 == dispatcher.queue_depth())
+        for i in range(4):
+            dispatcher.submit(handled.append, [i])
+        release.set()
+        assert wait_until(lambda: 3 == dispatcher.get_stats()["completed"])
+    finally:
+        release.set()
+        dispatcher.shutdown()
+    assert [2, 3] == handled
+    assert 2 == dispatcher.get_stats()["dropped"]
+
+
+def test_disconnect_when_full():
+    release = threading.Event()
+    dispatcher = MessageDispatcher(workers=1, queue_size=1, full_policy=FULL_DISCONNECT)
+    try:
+        dispatcher.submit(release.wait)
+        assert wait_until(lambda: 0 == dispatcher.queue_depth())
+        dispatcher.submit(lambda: None)
+        with pytest.raises(DispatchQueueFull):
+            dispatcher.submit(lambda: None)
+    finally:
+        release.set()
+        dispatcher.shutdown()
+
+
+def test_handler_error_does_not_stop_the_worker():
+    handled = []
+    dispatcher = MessageDispatcher(workers=1)
+    try:
+        dispatcher.submit(lambda: 1 / 0)
+        dispatcher.submit(handled.append, [1])
+        assert wait_until(lambda: [1] == handled)
+    finally:
+        dispatcher.shutdown()
+    assert 1 == dispatcher.get_stats()["errors"]
+
+
+def test_closed_connections_do_not_leak_workers(connect):
+    before = len(_dispatcher_threads())
+    for _ in range(20):
+        connect().close()
+    assert wait_until(lambda: len(_dispatcher_threads()) <= before)
+
+
+def test_shared_dispatcher_keeps_running(connect):
+    dispatcher = MessageDispatcher(workers=2)
+    try:
+        first = connect(dispatcher=dispatcher)
+        second = connect(dispatcher=dispatcher)
+        first.close()
+        assert dispatcher.running
+        assert second.request(second.heartbeat_message(), 5.0).result() is not None
+    finally:
+        dispatcher.shutdown()
+
+
+def test_connections_are_spread_over_the_lanes():
+    dispatcher = MessageDispatcher(workers=4, ordering=ORDER_CONNECTION)
+    connections = [JMPConnection(dispatcher=dispatcher) for _ in range(50)]
+    lanes = {id(dispatcher._select_lane(connection, None)) for connection in connections}
+    assert 4 == len(lanes)
+
+
+def test_restart_keeps_connection_order():
+    release = threading.Event()
+    handled = []
+    running = []
+
+    def handler(i):
+        running.append(i)
+        if 0 == i:
+            release.wait()
+        handled.append(i)
+        running.remove(i)
+        assert not running
+
+    dispatcher = MessageDispatcher(workers=1)
+    try:
+        dispatcher.submit(handler, [0], connection="a")
+        assert wait_until(lambda: [0] == running)
+        dispatcher.shutdown(wait=False)
+        for i in range(1, 50):
+            dispatcher.submit(handler, [i], connection="a")
+        assert [] == handled
+        release.set()
+        assert wait_until(lambda: 50 == len(handled))
+    finally:
+        release.set()
+        dispatcher.shutdown()
+    assert list(range(50)) == handled
+    assert 0 == dispatcher.get_stats()["errors"]
@@ -0,0 +1,46 @@
+import json
+
+from jmp_connection.jmp_messages import RegistryReadMessage
+from jmp_connection.metrics import Histogram, export_json, export_prometheus
+from tests.util import wait_until
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.05, 0.5, 2.0):
+        histogram.observe(value)
+    assert [2, 1, 1] == histogram.counts
+    assert 0.1 == histogram.quantile(0.5)
+    assert 2.0 == histogram.quantile(0.99)
+    assert 0.65 == histogram.to_dict()["avg"]
+
+
+def test_connection_metrics(connect):
+    connection = connect()
+    assert connection.metrics is None
+    metrics = connection.enable_metrics()
+    for _ in range(3):
+        connection.request(RegistryReadMessage(["$Serial Number"]), 5.0).result(5.0)
+    assert wait_until(lambda: 3 == metrics.request_rtt.count)
+    assert 3 <= metrics.frames_out
+    assert 3 <= metrics.frames_in
+    assert 0 < metrics.bytes_in
+    assert 0 == metrics.to_dict()["pending_requests"]
+
+
+def test_export(connect, simulator):
+    connection = connect()
+    connection.enable_metrics()
+    connection.request(RegistryReadMessage([]), 5.0).result(5.0)
+    # a connection without metrics is left out
+    other = connect()
+
+    host, port = simulator.get_address()
+    exported = json.loads(export_json([connection, other]))
+    assert [f"{host}:{port}"] == list(exported)
+    assert 1 <= exported[f"{host}:{port}"]["frames_out"]
+
+    text = export_prometheus([connection, other])
+    assert f'jmp_frames_out_total{{host="{host}",port="{port}"}}' in text
+    assert f'jmp_request_rtt_seconds_bucket{{host="{host}",port="{port}",le="+Inf"}}' in text
+    assert "# TYPE jmp_dispatch_queue_depth gauge" in text
@@ -0,0 +1,51 @@
+import pytest
+
+from jmp_connection.jmp_connection import JMPConnection
+from jmp_connection.jmp_messages import CloseMessage, ToggleMessage
+from jmp_connection.jnior_simulator import JniorSimulator
+from jmp_connection.output_control import ACKNOWLEDGED, FAILED, TIMED_OUT, control_outputs
+
+
+@pytest.fixture
+def second_simulator():
+    simulator = JniorSimulator()
+    simulator.start()
+    yield simulator
+    simulator.stop()
+
+
+def test_every_device_acknowledges(simulator, second_simulator, connect):
+    first = connect()
+    second = JMPConnection()
+    second.set_credentials(second_simulator.username, second_simulator.password)
+    assert second.connect(*second_simulator.get_address())
+    try:
+        assert second.wait_for_authentication(5.0)
+        results = control_outputs([first, second], [CloseMessage(1), ToggleMessage(2)], deadline=5.0)
+        assert [ACKNOWLEDGED, ACKNOWLEDGED] == [results[first].status, results[second].status]
+        assert [1, 1] == simulator.output_states[:2] == second_simulator.output_states[:2]
+        assert results[first].error is None
+    finally:
+        second.close()
+
+
+def test_refused_command_fails(connect):
+    connection = connect()
+    result = control_outputs([connection], [CloseMessage(99)], deadline=5.0)[connection]
+    assert FAILED == result.status
+    assert "Error" == result.replies[0].message
+
+
+def test_silent_device_times_out(simulator, connect):
+    connection = connect()
+    simulator.silent = True
+    # the output is open.  the Monitor from the login must not confirm the Close
+    result = control_outputs([connection], [CloseMessage(1)], deadline=0.2)[connection]
+    assert TIMED_OUT == result.status
+    assert 0.2 <= result.elapsed
+
+
+def test_disconnected_device_fails():
+    connection = JMPConnection()
+    result = control_outputs([connection], [CloseMessage(1)], deadline=0.2)[connection]
+    assert FAILED == result.status
@@ -0,0 +1,50 @@
+from jmp_connection.jmp_connection import REQUESTS_REPLAY
+from jmp_connection.jmp_messages import RegistryReadMessage
+from tests.util import wait_until
+
+
+def _drop_clients(simulator):
+    with simulator.lock:
+        clients = list(simulator.clients)
+    for client in clients:
+        client.close()
+
+
+def test_reconnects_and_logs_in_again(simulator, connect):
+    connection = connect(reconnect=True, reconnect_min_delay=0.05, reconnect_max_delay=0.2)
+    _drop_clients(simulator)
+    assert wait_until(lambda: 1 <= connection.reconnect_attempts and connection.is_authenticated())
+    assert connection.request(RegistryReadMessage([]), 5.0).result() is not None
+
+
+def test_pending_requests_are_replayed(simulator, connect):
+    simulator.registry["key"] = "value"
+    connection = connect(reconnect=True, reconnect_min_delay=0.05, reconnect_max_delay=0.2,
+                         request_policy=REQUESTS_REPLAY)
+    simulator.silent = True
+    future = connection.request(RegistryReadMessage(["key"]), 10.0)
+    simulator.silent = False
+    _drop_clients(simulator)
+    assert {"key": "value"} == future.result(5.0).json["Keys"]
+
+
+def test_pending_requests_fail_without_replay(simulator, connect):
+    connection = connect(reconnect=True, reconnect_min_delay=0.05, reconnect_max_delay=0.2)
+    simulator.silent = True
+    future = connection.request(RegistryReadMessage([]), 10.0)
+    _drop_clients(simulator)
+    assert future.exception(5.0) is not None
+
+
+def test_gives_up_after_max_attempts(simulator, connect):
+    connection = connect(reconnect=True, reconnect_min_delay=0.01, reconnect_max_delay=0.02,
+                         reconnect_max_attempts=2)
+    simulator.stop()
+    assert wait_until(lambda: 2 == connection.reconnect_attempts and not connection.reconnect_thread.is_alive())
+    assert not connection.is_connected()
+
+
+def test_reconnect_delay_is_bounded(connect):
+    connection = connect(reconnect_min_delay=0.5, reconnect_max_delay=4.0)
+    for attempt in range(20):
+        assert 0.5 <= connection._reconnect_delay(attempt) <= 4.0
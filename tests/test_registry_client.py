@@ -0,0 +1,43 @@
+import concurrent.futures
+
+import pytest
+
+from jmp_connection.jmp_messages import create_message
+from jmp_connection.registry_client import RegistryClient, RegistryReadError
+
+
+class _ReplyingConnection(object):
+    def __init__(self, reply_json):
+        """
+        answers every request with the same reply
+        """
+        self.reply_json = reply_json
+        self.requests = []
+
+    def request(self, jmp_message, timeout=None):
+        self.requests.append(jmp_message)
+        future = concurrent.futures.Future()
+        future.set_result(create_message(dict(self.reply_json)))
+        return future
+
+
+def test_values_are_cached(simulator, connect):
+    simulator.registry["$Model"] = "412"
+    client = RegistryClient(connect(), batch_window=0)
+    assert "412" == client.get("$Model")
+    assert "missing" == client.get("$Nothing", "missing")
+    simulator.registry["$Model"] = "410"
+    assert "412" == client.get("$Model")
+    assert 2 == client.get_stats()["reads"]
+
+
+def test_error_reply_is_raised_and_not_cached():
+    connection = _ReplyingConnection({"Message": "Error", "Text": "403 Forbidden"})
+    client = RegistryClient(connection, batch_window=0)
+    with pytest.raises(RegistryReadError):
+        client.get("$Model")
+    assert 0 == client.get_stats()["entries"]
+
+    connection.reply_json = {"Message": "Registry Read Response", "Keys": {"$Model": "412"}}
+    assert "412" == client.get("$Model")
+    assert 2 == len(connection.requests)
@@ -0,0 +1,65 @@
+import concurrent.futures
+
+import pytest
+
+from jmp_connection.jmp_messages import RegistryReadMessage
+from jmp_connection.request_tracker import RequestTimeout, RequestTracker
+
+
+def test_resolve_completes_the_matching_future():
+    tracker = RequestTracker()
+    first = tracker.register("a")
+    second = tracker.register("b")
+    assert tracker.resolve("b", "reply b")
+    assert not first.done()
+    assert "reply b" == second.result(0)
+    assert not tracker.resolve("b", "again")
+    assert 1 == tracker.pending_count()
+
+
+def test_duplicate_hash_is_refused():
+    tracker = RequestTracker()
+    tracker.register("a")
+    with pytest.raises(Exception):
+        tracker.register("a")
+
+
+def test_timeout_fails_the_future():
+    tracker = RequestTracker()
+    future = tracker.register("a", timeout=0.05)
+    with pytest.raises(RequestTimeout):
+        future.result(2.0)
+    assert not tracker.is_pending("a")
+
+
+def test_cancel_forgets_the_request():
+    tracker = RequestTracker()
+    future = tracker.register("a")
+    future.cancel()
+    assert not tracker.has_pending()
+
+
+def test_concurrent_requests_get_their_own_replies(simulator, connect):
+    simulator.registry.update({f"key{i}": f"value{i}" for i in range(100)})
+    connection = connect()
+    futures = {i: connection.request(RegistryReadMessage([f"key{i}"]), 5.0) for i in range(100)}
+    for i, future in futures.items():
+        assert {f"key{i}": f"value{i}"} == future.result(5.0).json["Keys"]
+    assert 0 == connection.request_tracker.pending_count()
+
+
+def test_unanswered_request_times_out(simulator, connect):
+    connection = connect()
+    simulator.silent = True
+    with pytest.raises(RequestTimeout):
+        connection.request(RegistryReadMessage([]), 0.2).result(2.0)
+
+
+def test_close_fails_outstanding_requests(simulator, connect):
+    connection = connect()
+    simulator.silent = True
+    future = connection.request(RegistryReadMessage([]), None)
+    connection.close()
+    with pytest.raises(Exception) as info:
+        future.result(2.0)
+    assert not isinstance(info.value, concurrent.futures.TimeoutError)
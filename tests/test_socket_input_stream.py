@@ -0,0 +1,63 @@
+import socket
+
+import pytest
+
+from jmp_connection.socket_input_stream import SocketInputStream, would_block
+
+
+@pytest.fixture
+def pair():
+    a, b = socket.socketpair()
+    yield a, b
+    a.close()
+    b.close()
+
+
+def test_read_across_receives(pair):
+    sender, receiver = pair
+    stream = SocketInputStream(receiver, buffer_size=16, compact_threshold=8)
+    for i in range(10):
+        sender.sendall(bytes([i]) * 5)
+        assert bytes([i]) * 5 == stream.read(5)
+    assert 0 == stream.available()
+    assert 16 == stream.get_stats()["buffer_size"]
+
+
+def test_unread_data_is_compacted(pair):
+    sender, receiver = pair
+    stream = SocketInputStream(receiver, buffer_size=16, compact_threshold=4)
+    sender.sendall(b'0123456789')
+    assert b'012345' == stream.read(6)
+    sender.sendall(b'abcdefghij')
+    assert b'6789abcdefghij' == stream.read(14)
+    assert 1 <= stream.compactions
+
+
+def test_buffer_grows_for_a_large_frame_up_to_the_limit(pair):
+    sender, receiver = pair
+    stream = SocketInputStream(receiver, buffer_size=16, max_buffer_size=64)
+    sender.sendall(bytes(48))
+    assert bytes(48) == stream.read(48)
+    assert 64 == stream.get_stats()["peak_buffer_size"]
+
+    sender.sendall(bytes(80))
+    with pytest.raises(Exception, match="limit"):
+        stream.read(80)
+
+
+def test_closed_by_the_remote_host(pair):
+    sender, receiver = pair
+    stream = SocketInputStream(receiver)
+    sender.close()
+    with pytest.raises(Exception, match="closed"):
+        stream.fill()
+
+
+def test_non_blocking_fill(pair):
+    _, receiver = pair
+    receiver.setblocking(False)
+    stream = SocketInputStream(receiver)
+    with pytest.raises(Exception) as info:
+        stream.fill()
+    assert would_block(info.value)
+    assert not would_block(ValueError())
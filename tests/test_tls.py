@@ -0,0 +1,63 @@
+import pytest
+
+from jmp_connection.jmp_connection import JMPConnection
+from jmp_connection.jmp_messages import RegistryReadMessage
+from jmp_connection.jnior_simulator import JniorSimulator
+from jmp_connection.tls import TLSConfig
+
+
+@pytest.fixture
+def tls_simulator(certificate):
+    simulator = JniorSimulator(certfile=certificate[0], keyfile=certificate[1])
+    simulator.start()
+    yield simulator
+    simulator.stop()
+
+
+def _connect(simulator, tls_config):
+    connection = JMPConnection(use_tls=True, tls_config=tls_config)
+    connection.set_credentials(simulator.username, simulator.password)
+    assert connection.connect(*simulator.get_address())
+    assert connection.wait_for_authentication(5.0)
+    return connection
+
+
+def test_reconnect_resumes_the_tls_session(tls_simulator):
+    tls_config = TLSConfig()
+    connection = _connect(tls_simulator, tls_config)
+    try:
+        assert not connection.get_tls_stats()["session_reused"]
+        assert connection.get_tls_stats()["acknowledged"]
+        assert connection.request(RegistryReadMessage([]), 5.0).result(5.0) is not None
+    finally:
+        connection.close()
+
+    connection = _connect(tls_simulator, tls_config)
+    try:
+        assert connection.get_tls_stats()["session_reused"]
+    finally:
+        connection.close()
+    assert {"handshakes": 2, "resumed": 1, "sessions": 1} == tls_config.get_stats()
+
+
+def test_least_recently_used_session_is_dropped():
+    tls_config = TLSConfig(max_sessions=2)
+    tls_config.save_session("a", 9220, "session a")
+    tls_config.save_session("b", 9220, "session b")
+    assert "session a" == tls_config.get_session("a", 9220)
+    tls_config.save_session("c", 9220, "session c")
+    assert tls_config.get_session("b", 9220) is None
+    assert "session a" == tls_config.get_session("a", 9220)
+
+
+def test_missing_acknowledgement_does_not_wait(certificate):
+    simulator = JniorSimulator(certfile=certificate[0], keyfile=certificate[1], starttls_ack=False)
+    simulator.start()
+    try:
+        connection = _connect(simulator, TLSConfig(ack_timeout=0.05))
+        try:
+            assert not connection.get_tls_stats()["acknowledged"]
+        finally:
+            connection.close()
+    finally:
+        simulator.stop()
@@ -0,0 +1,15 @@
+import time
+
+
+def wait_until(predicate, timeout=5.0, interval=0.01):
+    """
+    polls predicate until it returns True or the timeout passes
+
+    :return: whether the predicate returned True
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(interval)
+    return predicate()